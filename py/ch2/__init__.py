@@ -1,7 +1,7 @@
+from importlib import import_module
 from logging import getLogger, NullHandler
 from sys import version_info, exit
 
-from .commands.sparkline import sparkline
 from .common.args import NamespaceWithVariables
 from .common.global_ import set_global_dev
 from .common.md import Markdown
@@ -15,22 +15,6 @@ from .commands.args import COMMAND, make_parser, PROGNAME, HELP, DEV, DIARY, FIT
     PACKAGE_FIT_PROFILE, ACTIVITIES, NO_OP, DATABASE, CONSTANTS, SHOW_SCHEDULE, MONITOR, GARMIN, \
     UNLOCK, DUMP, FIX_FIT, CH2_VERSION, JUPYTER, KIT, WEB, IMPORT, THUMBNAIL, CHECK, SEARCH, VALIDATE, \
     DB_VERSION, UPLOAD, PROCESS, DELETE, SPARKLINE
-from .commands.process import process
-from .commands.upload import upload
-from .commands.constants import constants
-from .commands.delete import delete
-from .commands.validate import validate
-from .commands.db import db
-from .commands.fit import fit
-from .commands.fix_fit import fix_fit
-from .commands.help import help
-from .commands.import_ import import_
-from .commands.kit import kit
-from .commands.package_fit_profile import package_fit_profile
-from .commands.search import search
-from .commands.show_schedule import show_schedule
-from .commands.thumbnail import thumbnail
-from .commands.web import web
 from .lib.log import make_log_from_args
 from .sql.database import SystemConstant
 from .lib.cprofile import profile
@@ -49,25 +33,52 @@ at the command line.
     pass
 
 
-COMMANDS = {CONSTANTS: constants,
-            DB: db,
-            DELETE: delete,
-            FIT: fit,
-            FIX_FIT: fix_fit,
-            HELP: help,
-            IMPORT: import_,
-            KIT: kit,
-            NO_OP: no_op,
-            PACKAGE_FIT_PROFILE: package_fit_profile,
-            PROCESS: process,
-            SEARCH: search,
-            SHOW_SCHEDULE: show_schedule,
-            SPARKLINE: sparkline,
-            THUMBNAIL: thumbnail,
-            UPLOAD: upload,
-            VALIDATE: validate,
-            WEB: web
-            }
+class Commands(dict):
+    '''
+    Map command names to functions, importing the module that implements a command only when it is used
+    (so that, for example, a worker process does not import the web server, jupyter and bokeh).
+    '''
+
+    def __getitem__(self, name):
+        module, function = super().__getitem__(name)
+        if module is None:
+            return globals()[function]
+        return getattr(import_module(module, __name__), function)
+
+    def by_function(self, function):
+        for name, (_, value) in self.items():
+            if value == function:
+                return self[name]
+        raise KeyError(function)
+
+
+COMMANDS = Commands({CONSTANTS: ('.commands.constants', 'constants'),
+                     DB: ('.commands.db', 'db'),
+                     DELETE: ('.commands.delete', 'delete'),
+                     FIT: ('.commands.fit', 'fit'),
+                     FIX_FIT: ('.commands.fix_fit', 'fix_fit'),
+                     HELP: ('.commands.help', 'help'),
+                     IMPORT: ('.commands.import_', 'import_'),
+                     KIT: ('.commands.kit', 'kit'),
+                     NO_OP: (None, 'no_op'),
+                     PACKAGE_FIT_PROFILE: ('.commands.package_fit_profile', 'package_fit_profile'),
+                     PROCESS: ('.commands.process', 'process'),
+                     SEARCH: ('.commands.search', 'search'),
+                     SHOW_SCHEDULE: ('.commands.show_schedule', 'show_schedule'),
+                     SPARKLINE: ('.commands.sparkline', 'sparkline'),
+                     THUMBNAIL: ('.commands.thumbnail', 'thumbnail'),
+                     UPLOAD: ('.commands.upload', 'upload'),
+                     VALIDATE: ('.commands.validate', 'validate'),
+                     WEB: ('.commands.web', 'web')
+                     })
+
+
+def __getattr__(name):
+    # commands used to be imported here directly (eg from ch2 import constants)
+    try:
+        return COMMANDS.by_function(name)
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def args_and_command():
@@ -24,6 +24,15 @@ Delete statistics and then calculate new values.
     > ch2 --dev calculate --like '%Activity%' --force 2020-01-01 -Kn_cpu=1
 
 Calculate activity statistics from 2020 onwards in a single process for debugging.
+
+    > ch2 process -Kpool=true
+
+Use long-lived worker processes (one pool per pipeline) rather than a new command for each batch.
+
+    > ch2 process -Kcache=False
+
+Other -K values are passed to every pipeline (including worker processes), unless the pipeline's
+own configuration sets the same name.
     '''
     args = config.args
     if bool(args[WORKER]) != bool(args[ARG]):
@@ -7,11 +7,11 @@ from ..commands.args import KIT, PATH, DATA, UPLOAD, PROCESS, CPROFILE
 from ..common.date import time_to_local_time, Y, YMDTHMS
 from ..common.io import touch, clean_path, data_hash
 from ..common.log import log_current_exception
+from ..fit.probe import probe_fit
 from ..lib.io import split_fit_path
 from ..lib.log import Record
 from ..lib.utils import timing
 from ..pipeline.process import run_pipeline
-from ..pipeline.read.utils import AbortImportButMarkScanned
 from ..sql import KitItem, FileHash, PipelineType
 
 log = getLogger(__name__)
@@ -119,21 +119,23 @@ def check_file(s, file):
 
 
 def parse_fit_data(file, items=None):
-    from ch2.pipeline.read.monitor import MonitorReader
-    from ch2.pipeline.read.activity import ActivityReader
     try:
         # add TIME and TYPE and EXTRA (and maybe SPORT) given (fit) DATA and NAME
-        try:
-            records = MonitorReader.parse_records(file[DATA])
-            file[TIME] = MonitorReader.read_first_timestamp(file[NAME], records)
+        # this only decodes the few messages needed (the data are parsed fully when processed)
+        probe = probe_fit(file[DATA])
+        if probe.is_monitor:
+            file[TIME] = probe.monitor_time
             file[TYPE] = MONITOR
             # don't use '-' here or it will be treated as kit in path matching
             file[EXTRA] = ':' + file[HASH][0:5]
             log.debug(f'File {file[NAME]} contains monitor data')
-        except AbortImportButMarkScanned:
-            records = ActivityReader.parse_records(file[DATA])
-            file[TIME] = ActivityReader.read_first_timestamp(file[NAME], records)
-            file[SPORT] = ActivityReader.read_sport(file[NAME], records)
+        else:
+            if probe.activity_time is None:
+                raise Exception(f'No event or record entry in {file[NAME]}')
+            if probe.sport is None:
+                raise Exception(f'No sport or session entry in {file[NAME]}')
+            file[TIME] = probe.activity_time
+            file[SPORT] = probe.sport.lower()
             file[TYPE] = ACTIVITY
             file[EXTRA] = '-' + ','.join(items) if items else ''
             log.debug(f'File {file[NAME]} contains activity data')
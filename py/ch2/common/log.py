@@ -1,4 +1,4 @@
-from logging import getLogger, Formatter, DEBUG, StreamHandler
+from logging import getLogger, Formatter, DEBUG, StreamHandler, Logger
 from logging.handlers import RotatingFileHandler
 from sys import exc_info
 from traceback import format_tb
@@ -36,6 +36,31 @@ def configure_log(name, path, verbosity, levels=None):
                 log.addHandler(STDERR_HANDLER)
 
 
+def redirect_log(path, verbosity=0):
+    '''
+    Send logging (configured by configure_log) to a new file - used by forked workers, which would
+    otherwise share the parent's file (and stderr, unless verbosity is given).
+    '''
+
+    global STDERR_HANDLER
+
+    replacements = {}  # the same handler is shared by several loggers
+    loggers = [getLogger()] + [logger for logger in Logger.manager.loggerDict.values() if isinstance(logger, Logger)]
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            if isinstance(handler, RotatingFileHandler):
+                if handler not in replacements:
+                    replacements[handler] = RotatingFileHandler(path, maxBytes=1e6, backupCount=10)
+                    replacements[handler].setLevel(handler.level)
+                    replacements[handler].setFormatter(handler.formatter)
+                logger.removeHandler(handler)
+                logger.addHandler(replacements[handler])
+            elif handler is STDERR_HANDLER and not verbosity:
+                logger.removeHandler(handler)
+    if not verbosity:
+        STDERR_HANDLER = None
+
+
 def set_log_color(color):
 
     if STDERR_HANDLER and color:
@@ -37,7 +37,7 @@ from ..pipeline.read.garmin import GARMIN_USER, GARMIN_PASSWORD
 from ..pipeline.read.monitor import MonitorReader
 from ..sql import DiaryTopicJournal, StatisticJournalType, ActivityTopicField, ActivityTopic, PipelineType
 from ..sql.types import short_cls
-from ..srtm.file import SRTM1_DIR_CNAME
+from ..srtm.file import SRTM1_DIR_CNAME, SRTM1_CACHE_CNAME, DEFAULT_CACHE_SIZE
 
 log = getLogger(__name__)
 
@@ -231,6 +231,15 @@ If the directory or files are missing the raw GPS elevation will be used.
 This is noted as a warning in the logs (along with the name of the missing file).
 ''',
                      single=True, statistic_journal_type=StatisticJournalType.TEXT)
+        add_constant(s, SRTM1_CACHE_CNAME, DEFAULT_CACHE_SIZE,
+                     description='''
+Number of tiles kept in the SRTM1 cache.
+
+Zipped hgt files are decompressed into a cache sub-directory (each tile uses about 25MB).
+The least recently used tiles are deleted when the cache is full.
+Saved splines (if used) are counted separately and limited to a few, since each uses about 104MB.
+''',
+                     single=True, statistic_journal_type=StatisticJournalType.INTEGER)
         add_constant(s, GARMIN_USER, None,
                      description='''
 User for Garmin.
@@ -1,11 +1,12 @@
 
+from json import dumps, loads
 from logging import getLogger
 
 import numpy as np
 import pandas as pd
 from math import atan2, cos, sin, sqrt, pi
 
-from .frame import linear_resample, median_dt, present, linear_resample_time
+from .frame import median_dt, present, linear_resample_time
 from ..lib.data import safe_dict
 from ..names import N
 
@@ -13,6 +14,8 @@ from ..names import N
 log = getLogger(__name__)
 
 MAX_MINUTES = (5, 10, 30, 60, 90, 120, 180)
+MIN, MED = 'min', 'med'
+CURVE_STEPS = 8  # lengths per doubling in a duration curve
 
 
 def round_km():
@@ -42,21 +45,46 @@ def copy_times(ajournal):
 
 @safe_dict
 def times_for_distance(df, delta=0.01):  # all units of km
-    stats, km = {}, round_km()
-    tmp = pd.DataFrame({N.TIME: df.index}, index=df[N.DISTANCE])
-    tmp = tmp[~tmp.index.duplicated(keep='last')]
-    t4d = pd.DataFrame({N.TIME: (tmp[N.TIME] - tmp[N.TIME].iloc[0]).astype(np.int64) / 1e9},
-                       index=df[N.DISTANCE])
-    lt4d = linear_resample(t4d, d=delta)
-    for target in km:
-        n = target / delta
-        dlt4d = lt4d.diff(periods=n).dropna()
-        if present(dlt4d, N.TIME):
-            stats[N.MIN_KM_TIME % target] = dlt4d[N.TIME].min()
-            stats[N.MED_KM_TIME % target] = dlt4d[N.TIME].median()
+    stats = {}
+    for target, row in best_times_for_distance(df, delta=delta).iterrows():
+        stats[N.MIN_KM_TIME % target] = row[MIN]
+        stats[N.MED_KM_TIME % target] = row[MED]
     return stats
 
 
+def best_times_for_distance(df, targets=None, delta=0.01):  # all units of km
+    '''
+    the shortest and median times to cover each target distance (default round_km()), along with the
+    start and finish of the fastest segment.
+
+    time is interpolated onto a regular grid of distance (step delta) so that each target is a fixed
+    number of steps and all segments come from differences of a single array.
+    '''
+    targets = list(targets or round_km())
+    rows = {}
+    df = df.dropna(subset=[N.DISTANCE])
+    if len(df):
+        origin = df.index.min()
+        time = (df.index.values.astype(np.int64) - origin.value) / 1e9
+        # a repeated distance takes the time when it was last seen
+        time = pd.Series(time, index=df[N.DISTANCE].values.astype(float)).groupby(level=0).last()
+        distance, time = time.index.values, time.values
+        start, finish = int(distance[0] / delta) * delta, (1 + int(distance[-1] / delta)) * delta
+        grid = np.arange(start, finish, delta)
+        times = np.interp(grid, distance, time, left=np.nan, right=np.nan)
+        for target in targets:
+            n = int(round(target / delta))
+            if 0 < n < len(times):
+                diff = times[n:] - times[:-n]
+                valid = ~np.isnan(diff)
+                if valid.any():
+                    i = np.nanargmin(diff)
+                    rows[target] = {MIN: diff[i], MED: np.median(diff[valid]),
+                                    N.START: origin + pd.Timedelta(seconds=times[i]),
+                                    N.FINISH: origin + pd.Timedelta(seconds=times[i + n])}
+    return pd.DataFrame.from_dict(rows, orient='index', columns=[MIN, MED, N.START, N.FINISH])
+
+
 @safe_dict
 def hrz_stats(df):
     stats, zones = {}, range(1, 8)
@@ -72,56 +100,140 @@ def hrz_stats(df):
 
 
 @safe_dict
-def max_mean_stats(df, params=((N.POWER_ESTIMATE, N.MAX_MEAN_PE_M),),delta=10, zero=0):
-    stats, mins = {}, MAX_MINUTES
+def max_mean_stats(df, params=((N.POWER_ESTIMATE, N.MAX_MEAN_PE_M),), delta=10, zero=0, curves=None):
+    '''
+    the highest mean over each of MAX_MINUTES.
+
+    if curves maps a param name to a statistic name then the best mean over curve_lengths()
+    (the 'duration curve') is also returned, as text (see curve_to_text).
+    '''
+    stats, mins, curves = {}, MAX_MINUTES, curves or {}
     ldf = linear_resample_time(df, dt=delta, with_timespan=True, keep_nan=True)
     for name, template in params:
         if name in ldf.columns:
             ldf.loc[ldf[N.TIMESPAN_ID].isnull(), [name]] = zero
-            cumsum = ldf[name].cumsum()
-            for target in mins:
-                n = (target * 60) // delta
-                diff = cumsum.diff(periods=n).dropna()
-                if present(diff, name):
-                    stats[template % target] = diff.max() / n
+            values = ldf[name].values.astype(float)
+            lengths = [(target * 60) // delta for target in mins]
+            if name in curves:
+                lengths += curve_lengths(len(values) - 1)
+            best = dict(zip(lengths, max_mean_curve(values, lengths)))
+            for target, length in zip(mins, lengths):
+                if not np.isnan(best[length]):
+                    stats[template % target] = best[length]
+            if name in curves:
+                stats[curves[name]] = curve_to_text(best, delta)
         else:
             log.warning(f'Missing {name}')
     return stats
 
 
+def max_mean_curve(values, lengths):
+    '''
+    the highest mean over a window of each length (in samples), from differences of the cumulative sum.
+
+    as for pandas, NaN counts as zero inside a window but not at either end of the difference.
+    the result is NaN if there is no valid window.
+    '''
+    # cumsum as pandas (NaN at missing values, which are otherwise skipped)
+    cumsum = np.nancumsum(values)
+    cumsum[np.isnan(values)] = np.nan
+    best = np.full(len(lengths), np.nan)
+    for i, n in enumerate(lengths):
+        if 0 < n < len(cumsum):
+            diff = cumsum[n:] - cumsum[:-n]
+            diff = diff[~np.isnan(diff)]
+            if len(diff):
+                best[i] = diff.max() / n
+    return best
+
+
 @safe_dict
-def max_med_stats(df, params=((N.HEART_RATE, N.MAX_MED_HR_M),), mins=None, delta=10, gap=0.01):
-    stats, mins = {}, mins or MAX_MINUTES
+def max_med_stats(df, params=((N.HEART_RATE, N.MAX_MED_HR_M),), mins=None, delta=10, gap=0.01, curves=None):
+    '''
+    the highest median over each of mins (default MAX_MINUTES).
+
+    pauses longer than gap (a fraction of the target time) split the data.  if curves maps a param name
+    to a statistic name then the best median over curve_lengths() is also returned, as for max_mean_stats.
+    '''
+    stats, mins, curves = {}, mins or MAX_MINUTES, curves or {}
     ldf_all = linear_resample_time(df, dt=delta, with_timespan=False, add_time=False)
-    ldf_all.interpolate('nearest')
-    ldf_tstamp = ldf_all.loc[ldf_all[N.TIMESPAN_ID].isin(df[N.TIMESPAN_ID].unique())].copy()
-    ldf_tstamp.loc[:, 'gap'] = ldf_tstamp.index.astype(np.int64) / 1e9
-    ldf_tstamp.loc[:, 'gap'] = ldf_tstamp['gap'].diff()
-    log.debug(f'Largest gap is {ldf_tstamp["gap"].max()}s')
-    for target in mins:
-        n = target * 60 // delta
-        log.debug(f'Target {target}m is {n} samples (delta {delta}s)')
-        splits, remain = [], ldf_all.copy()
-        max_gap = max(gap * target * 60, 1.5 * delta)
-        for after in ldf_tstamp.index[ldf_tstamp['gap'] > max_gap].tolist():
-            before = ldf_tstamp.index[ldf_tstamp.index.get_loc(after)-1]
-            splits.append(remain.loc[:before])
-            remain = remain.loc[after:]
-        splits.append(remain)
-        log.debug(f'Split data into {len(splits)} sections for {target}m with max gap of {max_gap}s')
-        for name, template in params:
-            stat_name = template % target
-            for split in splits:
-                split['med'] = split[name].rolling(n).median()
-                if present(split, 'med'):
-                    max_med = split['med'].dropna().max()
-                    if stat_name in stats:
-                        stats[stat_name] = max(stats[stat_name], max_med)
-                    else:
-                        stats[stat_name] = max_med
+    pauses = pause_lengths(ldf_all, ldf_all[N.TIMESPAN_ID].isin(df[N.TIMESPAN_ID].unique()).values)
+    log.debug(f'Largest gap is {pauses.max() if len(pauses) else 0}s')
+    for name, template in params:
+        values = ldf_all[name].values.astype(float)
+        lengths, seconds = [target * 60 // delta for target in mins], [target * 60 for target in mins]
+        if name in curves:
+            curve = curve_lengths(len(values))
+            lengths += curve
+            seconds += [length * delta for length in curve]
+        best = max_med_curve(values, pauses, lengths, [max(gap * s, 1.5 * delta) for s in seconds])
+        for target, value in zip(mins, best):
+            if not np.isnan(value):
+                stats[template % target] = value
+        if name in curves:
+            stats[curves[name]] = curve_to_text(dict(zip(lengths[len(mins):], best[len(mins):])), delta)
     return stats
 
 
+def curve_lengths(n, steps=CURVE_STEPS):
+    '''
+    window lengths (in samples) from 1 to n, spaced logarithmically (steps per doubling, but never
+    closer than one sample), so that the cost of a curve grows as n log(n) rather than n^2.
+    '''
+    if n < 1: return []
+    lengths = np.unique(np.round(2 ** (np.arange(int(steps * np.log2(n)) + 1) / steps)).astype(int))
+    lengths = [int(length) for length in lengths if length < n]
+    return lengths + [n]
+
+
+def pause_lengths(ldf, active):
+    '''
+    for each row in the (regularly sampled) ldf, the length in seconds of the pause it is part of
+    (zero for active rows, and for rows before or after all activity).
+    '''
+    times = ldf.index.astype(np.int64) / 1e9
+    pauses = np.zeros(len(ldf))
+    positions = np.nonzero(active)[0]
+    for before, after in zip(positions, positions[1:]):
+        if after > before + 1:
+            pauses[before+1:after] = times[after] - times[before]
+    return pauses
+
+
+def max_med_curve(values, pauses, lengths, max_gaps):
+    '''
+    the highest median over a window of each length (in samples).
+
+    windows that include a pause longer than the corresponding max_gap, or a NaN, are ignored.
+    the rolling median is pandas' skiplist implementation, over the whole array at once.
+    '''
+    best = np.full(len(lengths), np.nan)
+    for i, (n, max_gap) in enumerate(zip(lengths, max_gaps)):
+        if 0 < n <= len(values):
+            split = np.where(pauses > max_gap, np.nan, values)
+            med = pd.Series(split).rolling(n).median().values
+            med = med[~np.isnan(med)]
+            if len(med):
+                best[i] = med.max()
+    return best
+
+
+def curve_to_text(best, delta):
+    '''
+    encode a curve {length in samples: best value} as json, dropping lengths with no value.
+    '''
+    return dumps({str(int(length * delta)): float(value)
+                  for length, value in sorted(best.items()) if not np.isnan(value)})
+
+
+def text_to_curve(text):
+    '''
+    decode a curve as a series indexed by window length in seconds.
+    '''
+    curve = loads(text)
+    return pd.Series(list(curve.values()), index=[int(seconds) for seconds in curve.keys()], dtype=float)
+
+
 @safe_dict
 def direction_stats(df):
     stats = {}
@@ -0,0 +1,80 @@
+from glob import glob
+from logging import getLogger
+from os import getpid, replace, unlink
+from os.path import join, exists, basename
+
+import numpy as np
+import pandas as pd
+
+log = getLogger(__name__)
+
+ACTIVITY_CACHE = 'activity-cache'
+
+
+class ActivityCache:
+
+    '''
+    Per-activity statistic values, stored as numpy files so that the calculators that read the same
+    activity (elevation, power, impulse, activity, ...) only need to go to the database once.
+
+    Each file holds the (times, values) for one statistic name and activity journal, and is keyed by
+    the time of the Timestamp for the statistic's owner and that activity.  So when the owner
+    re-calculates (or the data are deleted) the Timestamp changes and the old file is no longer used.
+
+    Files for deleted activities are removed by prune() (called after the activity statistics are
+    calculated).  The directory ({base}/{version}/activity-cache) can also be deleted at any time.
+    '''
+
+    def __init__(self, dir):
+        self.__dir = dir
+
+    def __path(self, activity_journal_id, statistic_name_id, time):
+        return join(self.__dir, f'{activity_journal_id}-{statistic_name_id}-{int(time.timestamp() * 1e6)}.npz')
+
+    def read(self, activity_journal_id, statistic_name_id, time):
+        '''
+        (times, values) or None if not present.
+        '''
+        path = self.__path(activity_journal_id, statistic_name_id, time)
+        if exists(path):
+            try:
+                with np.load(path) as data:
+                    return pd.to_datetime(data['times'], utc=True), data['values']
+            except Exception as e:
+                log.warning(f'Could not read {path}: {e}')
+
+    def write(self, activity_journal_id, statistic_name_id, time, times, values):
+        '''
+        store (numeric) values, replacing any earlier version.
+        '''
+        values = np.asarray(values)
+        if values.dtype.kind not in 'iufb':
+            return
+        path = self.__path(activity_journal_id, statistic_name_id, time)
+        for old in glob(join(self.__dir, f'{activity_journal_id}-{statistic_name_id}-*.npz')):
+            if old != path:
+                self.__unlink(old)
+        # written to a temporary file (not matched by the glob above) so that readers never see partial data
+        tmp = f'{path}.{getpid()}.tmp'
+        with open(tmp, 'wb') as out:
+            np.savez(out, times=pd.to_datetime(times, utc=True).values.astype(np.int64), values=values)
+        replace(tmp, path)
+
+    def prune(self, activity_journal_ids):
+        '''
+        delete files for activity journals that are not in the given ids.
+        '''
+        activity_journal_ids = set(activity_journal_ids)
+        paths = [path for path in glob(join(self.__dir, '*.npz'))
+                 if int(basename(path).split('-')[0]) not in activity_journal_ids]
+        if paths:
+            log.info(f'Deleting {len(paths)} cached values for old activities')
+            for path in paths:
+                self.__unlink(path)
+
+    @staticmethod
+    def __unlink(path):
+        try:
+            unlink(path)
+        except FileNotFoundError:
+            pass  # another process got there first
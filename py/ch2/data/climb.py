@@ -3,10 +3,10 @@ from functools import cmp_to_key
 from itertools import groupby
 from logging import getLogger
 
+import numpy as np
 from sqlalchemy import or_
 
-from .frame import linear_resample, present
-from ..common.math import is_nan
+from .frame import linear_resample
 from ..lib.data import nearest_index, get_index_loc, safe_yield
 from ..names import Names as N
 from ..sql import StatisticName, StatisticJournal, Source, ActivityJournal
@@ -14,7 +14,6 @@ from ..sql.tables.sector import SectorJournal
 
 log = getLogger(__name__)
 
-SCORE = 'Score'
 GRADIENT = 'Gradient'
 
 # a climb of 80m is roughly equivalent to a score of 8000 on strava's weird approach -
@@ -105,17 +104,30 @@ def first_or_none(generator):
 
 
 def biggest_reversal(df):
-    max_elevation, max_indices, d = 0, (None, None), df.index[1] - df.index[0]
-    for offset in range(1, len(df)-1):
-        df[N._delta(N.ELEVATION)] = df[N.ELEVATION].diff(-offset)
-        if present(df, N._delta(N.ELEVATION)):
-            d_elevation = df[N._delta(N.ELEVATION)].dropna().max()
-            if d_elevation > max_elevation:
-                max_elevation = d_elevation
-                hi = df.loc[df[N._delta(N.ELEVATION)] == max_elevation].index[0]  # break ties
-                lo = df.index[get_index_loc(df, hi) + offset]
-                max_indices = (lo, hi)
-    return max_elevation, max_indices[0], max_indices[1]
+    # returns (drop, dlo, dhi) for the largest fall in elevation (where dhi is before dlo)
+    # a single scan: the best start for each end is the (latest) highest point before it.
+    # ties are broken as before - shortest, then earliest - and the first to last point is excluded.
+    elevation = df[N.ELEVATION].values.astype(float)
+    n = len(elevation)
+    if n < 3:
+        return 0, None, None
+    highest = np.maximum.accumulate(elevation)
+    positions = np.arange(n)
+    latest = np.maximum.accumulate(np.where(elevation == highest, positions, 0))
+    starts, ends = latest[:-1].copy(), positions[1:]
+    drops = highest[:-1] - elevation[1:]
+    # the final point cannot pair with the first (largest offset was len - 2)
+    before_last = elevation[1:-1]
+    starts[-1] = 1 + (len(before_last) - 1 - np.argmax(before_last[::-1]))
+    drops[-1] = elevation[starts[-1]] - elevation[-1]
+    max_drop = np.nanmax(drops)
+    if not max_drop > 0:
+        return 0, None, None
+    best = np.flatnonzero(drops == max_drop)
+    offsets = ends[best] - starts[best]
+    best = best[offsets == offsets.min()]
+    i = best[np.argmin(starts[best])]
+    return max_drop, df.index[ends[i]], df.index[starts[i]]
 
 
 def biggest_climb(df, params=Climb(), grid=10):
@@ -136,24 +148,32 @@ def biggest_climb(df, params=Climb(), grid=10):
 def search(df, params=Climb(), grid=False):
     # returns (score, dlo, dhi)
     # use distance (indices) rather than ilocs because we're subdividing the data
+    # for each offset (longest first) the gain between all pairs of points is a single numpy
+    # operation; offsets that cannot improve on the best score so far are skipped.
+    elevation = df[N.ELEVATION].values.astype(float)
     max_score, max_indices, d = 0, (None, None), df.index[1] - df.index[0]
-    for offset in range(len(df)-1, 0, -1):
-        df[N._delta(N.ELEVATION)] = df[N.ELEVATION].diff(offset)
+    if len(elevation) < 2:
+        return max_score, None, None
+    max_gain = np.nanmax(elevation) - np.nanmin(elevation)
+    for offset in range(len(elevation)-1, 0, -1):
         d_distance = d * offset
         min_elevation = max(params.min_elevation, params.min_gradient * d_distance / PERCENT)
-        if df[N._delta(N.ELEVATION)].max() > min_elevation:  # avoid some work
-            # factor of 1000 below to convert km to m
-            df[SCORE] = df[N._delta(N.ELEVATION)] / ((1000 * d_distance) ** params.phi)
-            score = df.loc[df[N._delta(N.ELEVATION)] > min_elevation, SCORE].max()
-            if not is_nan(score) and score > max_score:
+        scale = (1000 * d_distance) ** params.phi  # factor of 1000 to convert km to m
+        if max_gain <= min_elevation or max_gain / scale <= max_score:
+            continue
+        gain = elevation[offset:] - elevation[:-offset]
+        valid = gain > min_elevation
+        if valid.any():
+            scores = gain / scale
+            score = scores[valid].max()
+            if score > max_score:
                 max_score = score
-                hi = df.loc[df[SCORE] == max_score].index[0]  # arbitrarily pick one if tied (error here w item())
-                lo = df.index[get_index_loc(df, hi) - offset]
+                ihi = np.flatnonzero(scores == max_score)[0] + offset  # arbitrarily pick first if tied
+                lo, hi = df.index[ihi - offset], df.index[ihi]
                 if not grid:
                     # step inwards one location from each end
                     # (so that we have some 'extra' to aid with intersections)
-                    lo = df.index[get_index_loc(df, hi) - (offset-1)]
-                    hi = df.index[get_index_loc(df, hi) - 1]
+                    lo, hi = df.index[ihi - (offset-1)], df.index[ihi - 1]
                 max_indices = (lo, hi)
     return max_score, max_indices[0], max_indices[1]
 
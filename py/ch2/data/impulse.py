@@ -21,31 +21,34 @@ def hr_zone(heart_rate_df, fthr_df, pc_fthr_zones=BC_ZONES, heart_rate=N.HEART_R
     fthrs = fthrs + [(to_time('2100'), None)]
     fthrs = [(a[0], b[0], a[1]) for a, b in zip(fthrs, fthrs[1:])]
     heart_rate_df[hr_zone] = np.nan
-    for start, finish, fthr in fthrs:  # start is inclusive
-        start, finish = pd.to_datetime(start, utc=True), pd.to_datetime(finish, utc=True)
-        zones = [x * fthr / 100.0 for x in pc_fthr_zones]
-        for zone, upper in enumerate(zones + [None], start=1):
-            if zone == 1:
-                # we don't try to distinguish zones below 1
-                heart_rate_df.loc[(heart_rate_df.index >= start) & (heart_rate_df.index < finish) &
-                                  (heart_rate_df[heart_rate] <= upper),
-                                  [hr_zone]] = zone
-            elif not upper:
-                # or above 5
-                heart_rate_df.loc[(heart_rate_df.index >= start) & (heart_rate_df.index < finish) &
-                                  (heart_rate_df[heart_rate] > lower),
-                                  [hr_zone]] = zone
-            else:
-                hrz = ((heart_rate_df.loc[(heart_rate_df.index >= start) & (heart_rate_df.index < finish) &
-                                          (heart_rate_df[heart_rate] > lower) & (heart_rate_df[heart_rate] <= upper),
-                                          [heart_rate]] - lower) / (upper - lower)) + zone
-                # .values below from
-                # https://stackoverflow.com/questions/12307099/modifying-a-subset-of-rows-in-a-pandas-dataframe
-                # i do not understand why it is needed...
-                heart_rate_df.loc[(heart_rate_df.index >= start) & (heart_rate_df.index < finish) &
-                                  (heart_rate_df[heart_rate] > lower) & (heart_rate_df[heart_rate] <= upper),
-                                  [hr_zone]] = hrz.values
-            lower = upper
+    # periods with finish <= start match no samples so can be ignored; the rest are disjoint
+    fthrs = [(pd.to_datetime(start, utc=True), pd.to_datetime(finish, utc=True), fthr)
+             for start, finish, fthr in fthrs]
+    fthrs = sorted((start, finish, fthr) for start, finish, fthr in fthrs if start < finish)
+    times = pd.to_datetime(heart_rate_df.index, utc=True).values
+    starts = np.array([start.to_datetime64() for start, _, _ in fthrs], dtype='datetime64[ns]')
+    periods = np.searchsorted(starts, times, side='right') - 1
+    hr = heart_rate_df[heart_rate].values.astype(float)
+    zones = np.full(len(hr), np.nan)
+    for period, (start, finish, fthr) in enumerate(fthrs):  # start is inclusive
+        selected = (periods == period) & (times < finish.to_datetime64()) & ~np.isnan(hr)
+        zones[selected] = zone_of(hr[selected], [x * fthr / 100.0 for x in pc_fthr_zones])
+    heart_rate_df[hr_zone] = zones
+
+
+def zone_of(heart_rate, zones):
+    '''
+    fractional zone for each (non-NaN) heart rate given the upper limits of each zone.
+
+    zones run from 1 to len(zones) + 1 and we don't try to distinguish values below 1 or above the top zone.
+    '''
+    zones = np.array(zones)
+    upper = np.searchsorted(zones, heart_rate, side='left')
+    result = upper + 1.0
+    inside = (upper > 0) & (upper < len(zones))
+    lower = zones[upper[inside] - 1]
+    result[inside] = (heart_rate[inside] - lower) / (zones[upper[inside]] - lower) + (upper[inside] + 1)
+    return result
 
 
 @safe_return(lambda: pd.DataFrame(columns=[N.HR_IMPULSE_10]))
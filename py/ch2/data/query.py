@@ -4,7 +4,7 @@ from logging import getLogger
 import numpy as np
 import pandas as pd
 import pytz
-from sqlalchemy import asc, desc, distinct
+from sqlalchemy import asc, desc
 from sqlalchemy.orm import aliased
 
 from ..common.date import YMD
@@ -15,17 +15,21 @@ from ..data import session, present
 from ..lib import time_to_local_time
 from ..lib.utils import timing
 from ..names import Names as N, like, MED_WINDOW, SPACE
-from ..sql import StatisticName, ActivityGroup, StatisticJournal, ActivityTimespan, ActivityJournal, Source
+from ..sql import StatisticName, ActivityGroup, StatisticJournal, ActivityTimespan, ActivityJournal, Source, \
+    Timestamp
 from ..sql.tables.statistic import STATISTIC_JOURNAL_CLASSES
 from ..sql.types import short_cls
 
 log = getLogger(__name__)
 
+# columns in the (time, name, value) triples read before pivoting
+NAME_ID, VALUE, SOURCE_ID, GROUP_ID = 'name_id', 'value', 'source_id', 'group_id'
+
 
 class Statistics:
 
     def __init__(self, s, start=None, finish=None, sources=None, with_timespan=False, with_source=False,
-                 activity_journal=None, activity_group=None, bookmarks=None, warn_over=1):
+                 activity_journal=None, activity_group=None, bookmarks=None, warn_over=1, cache=None):
         '''
         Specify any general constraints when constructing the object, then request particular statistics
         using by_name and by_group.
@@ -34,6 +38,9 @@ class Statistics:
 
         The final dataframe can be retrieved directly via df or, via with_, additional processing can
         be made to rename columns, add statistics, etc.
+
+        If cache (an ActivityCache) is given then values for a single activity journal are read from
+        (and saved to) that where possible.
         '''
         self.__s = s
         self.__start = start
@@ -47,7 +54,9 @@ class Statistics:
         self.__with_source = with_source
         self.__activity_group = activity_group
         self.__warn_over = warn_over
+        self.__cache = cache
         self.__statistic_names = {}
+        self.__requests = []
         self.__df = None
         if bookmarks: raise Exception('TODO')
 
@@ -77,53 +86,126 @@ class Statistics:
             log_current_exception(traceback=False)
             log.warning(f'Could not match {owner_name}.{name} (like={like})')
 
-    def __columns(self, type_class, label):
-        columns = [type_class.time.label(N.INDEX), type_class.value.label(label)]
-        if self.__with_source:
-            columns += [type_class.source_id.label(N._src(label))]
+    def __columns(self, type_class, grouped):
+        columns = [type_class.time.label(N.INDEX), type_class.statistic_name_id.label(NAME_ID),
+                   type_class.value.label(VALUE), type_class.source_id.label(SOURCE_ID)]
+        if grouped:
+            columns += [Source.activity_group_id.label(GROUP_ID)]
         return columns
 
     def by_name(self, owner, *names, like=False):
         for name in names:
             for statistic_name, type_class in self.__name_and_type(name, owner, like):
-                label = statistic_name.name
-                log.info(f'Retrieving {label}')
-                q = self.__s.query(*self.__columns(type_class, label)). \
-                    filter(type_class.statistic_name_id == statistic_name.id)
-                q = self.__constrain_journal(q).order_by(N.INDEX)
-                with timing(f'Slow query for {label}?\n{q}', self.__warn_over):
-                    df = read_query(q, index=N.INDEX)
-                self.__merge(df)
+                self.__requests.append((statistic_name, type_class, False))
         return self
 
     def by_group(self, owner, *names, like=False):
         for name in names:
             for statistic_name, type_class in self.__name_and_type(name, owner, like):
-                q_group_ids = self.__s.query(distinct(Source.activity_group_id)). \
-                    join(StatisticJournal, StatisticJournal.source_id == Source.id). \
-                    filter(StatisticJournal.statistic_name_id == statistic_name.id)
-                q_group_ids = self.__constrain_journal(q_group_ids)
-                with timing(f'Slow query for group ids\n{q_group_ids}?', self.__warn_over):
-                    activity_group_ids = q_group_ids.all()
-                for row in activity_group_ids:
-                    activity_group_id = row[0]
-                    if activity_group_id:
-                        activity_group = self.__s.query(ActivityGroup). \
-                            filter(ActivityGroup.id == activity_group_id).one()
-                        label = statistic_name.name + ':' + activity_group.name
-                    else:
-                        label = statistic_name.name
-                    log.info(f'Retrieving {label}')
-                    q = self.__s.query(*self.__columns(type_class, label)). \
-                        filter(type_class.statistic_name_id == statistic_name.id). \
-                        join(Source, type_class.source_id == Source.id). \
-                        filter(Source.activity_group_id == activity_group_id)
-                    q = self.__constrain_journal(q).order_by(N.INDEX)
-                    with timing(f'Slow query for {label}?\n{q}', self.__warn_over):
-                        df = read_query(q, index=N.INDEX)
-                    self.__merge(df)
+                self.__requests.append((statistic_name, type_class, True))
         return self
 
+    def __read(self):
+        '''
+        Retrieve all requested names together - one query per journal type -
+        and then pivot the (time, name, value) triples into columns.  Names already in the cache
+        (if any) are not queried.
+        '''
+        requests, self.__requests = self.__requests, []
+        cached, times = self.__read_cache(requests)
+        remaining = [request for request in requests if request[2] or request[0].id not in cached]
+        columns = self.__query(remaining) if remaining else {}
+        ordered = []
+        for statistic_name, _, group in requests:
+            if statistic_name.id in cached and not group:
+                ordered.append((statistic_name.name,) + cached[statistic_name.id])
+            else:
+                ordered += columns[(statistic_name.id, group)]
+                if statistic_name.owner in times and not group:
+                    self.__write_cache(statistic_name, times[statistic_name.owner], *ordered[-1][1:])
+        with timing('Slow pivot?', self.__warn_over):
+            self.__merge(pivot(ordered))
+
+    def __query(self, requests):
+        grouped = any(group for _, _, group in requests)
+        triples = {}
+        for type_class in set(type_class for _, type_class, _ in requests):
+            ids = sorted(set(statistic_name.id for statistic_name, other, _ in requests if other == type_class))
+            log.info(f'Retrieving {", ".join(self.__names(ids))}')
+            q = self.__s.query(*self.__columns(type_class, grouped)). \
+                filter(type_class.statistic_name_id.in_(ids))
+            if grouped:
+                q = q.join(Source, type_class.source_id == Source.id)
+            q = self.__constrain_journal(q)
+            with timing(f'Slow query for {type_class}?\n{q}', self.__warn_over):
+                triples[type_class] = read_query(q)
+        columns = {}
+        group_names = self.__group_names(triples) if grouped else {}
+        for statistic_name, type_class, group in requests:
+            df = triples[type_class]
+            df = df.loc[df[NAME_ID] == statistic_name.id]
+            columns[(statistic_name.id, group)] = []
+            if group:
+                for group_id, group_df in df.groupby(df[GROUP_ID].fillna(0).astype(int), sort=True):
+                    label = statistic_name.name
+                    if group_id: label += ':' + group_names[group_id]
+                    columns[(statistic_name.id, group)] += self.__column(label, group_df)
+            else:
+                columns[(statistic_name.id, group)] += self.__column(statistic_name.name, df)
+        return columns
+
+    def __cached_journal(self):
+        if self.__cache and len(self.__sources) == 1 and isinstance(self.__sources[0], ActivityJournal) and \
+                not (self.__start or self.__finish or self.__with_source):
+            return self.__sources[0]
+
+    def __read_cache(self, requests):
+        '''
+        cached (times, values) by statistic name id, and the Timestamp times (by owner) that key the cache.
+        '''
+        cached, times = {}, {}
+        ajournal = self.__cached_journal()
+        if ajournal:
+            owners = set(statistic_name.owner for statistic_name, _, _ in requests)
+            times = dict(self.__s.query(Timestamp.owner, Timestamp.time).
+                         filter(Timestamp.source_id == ajournal.id, Timestamp.owner.in_(owners)).all())
+            for statistic_name, _, group in requests:
+                if statistic_name.owner in times and not group:
+                    try:
+                        column = self.__cache.read(ajournal.id, statistic_name.id, times[statistic_name.owner])
+                    except Exception as e:
+                        log.warning(f'Could not read {statistic_name.name} from cache: {e}')
+                        column = None
+                    if column is not None:
+                        cached[statistic_name.id] = column
+            if cached:
+                log.debug(f'Read {", ".join(self.__names(cached.keys()))} from cache')
+        return cached, times
+
+    def __write_cache(self, statistic_name, time, times, values):
+        # the cache is only an optimisation, so a failure here should not break the read
+        try:
+            self.__cache.write(self.__cached_journal().id, statistic_name.id, time, times, values)
+        except Exception as e:
+            log.warning(f'Could not write {statistic_name.name} to cache: {e}')
+
+    def __names(self, ids):
+        names = dict((statistic_name.id, statistic_name.name) for statistic_name in self.__statistic_names.values())
+        return [names[id] for id in ids]
+
+    def __group_names(self, triples):
+        group_ids = set()
+        for df in triples.values():
+            group_ids.update(int(id) for id in df[GROUP_ID].dropna().unique())
+        return dict(self.__s.query(ActivityGroup.id, ActivityGroup.name).
+                    filter(ActivityGroup.id.in_(group_ids)).all()) if group_ids else {}
+
+    def __column(self, label, df):
+        columns = [(label, df[N.INDEX].values, df[VALUE].values)]
+        if self.__with_source:
+            columns += [(N._src(label), df[N.INDEX].values, df[SOURCE_ID].values)]
+        return columns
+
     def __constrain_journal(self, q):
         if self.__start: q = q.filter(StatisticJournal.time >= self.__start)
         if self.__finish: q = q.filter(StatisticJournal.time < self.__finish)
@@ -144,14 +226,15 @@ class Statistics:
                 self.__df = self.__df.join(df, how='outer')
 
     def __add_timespan(self):
-        self.__df[N.TIMESPAN_ID] = np.nan
-        for id, start, finish in self.__s.query(ActivityTimespan.id,
-                                                ActivityTimespan.start, ActivityTimespan.finish). \
-                filter(ActivityTimespan.activity_journal_id.in_([source.id for source in self.__sources])):
-            self.__df.loc[start:finish, [N.TIMESPAN_ID]] = id
+        timespans = self.__s.query(ActivityTimespan.start, ActivityTimespan.finish, ActivityTimespan.id). \
+            filter(ActivityTimespan.activity_journal_id.in_([source.id for source in self.__sources])). \
+            order_by(ActivityTimespan.start).all()
+        self.__df[N.TIMESPAN_ID] = timespan_ids(self.__df.index, *zip(*timespans)) if timespans else np.nan
 
     @property
     def df(self):
+        if self.__requests:
+            self.__read()
         if self.__df is None:
             log.warning('Have no data!')
             self.__df = pd.DataFrame()  # if everything failed, allow code to continue with no data
@@ -165,6 +248,51 @@ class Statistics:
         return Data(self.df, self.__statistic_names)
 
 
+def pivot(columns):
+    '''
+    Build a dataframe from (label, times, values), with the union of all times as index.
+
+    Integer columns stay integer when they have a value at every time.  A repeated time within a
+    column keeps only the last value (with a warning).
+    '''
+    columns = [(label, pd.to_datetime(times, utc=True).values, values) for label, times, values in columns]
+    times = np.unique(np.concatenate([times for _, times, _ in columns])) if columns else []
+    index = pd.DatetimeIndex(times, name=N.INDEX).tz_localize(pytz.UTC)
+    df = pd.DataFrame(index=index)
+    for label, times, values in columns:
+        positions = np.searchsorted(index.values, times)
+        values = np.asarray(values)
+        n_unique = len(np.unique(positions))
+        if n_unique < len(positions):
+            log.warning(f'Dropping {len(positions) - n_unique} repeated times for {label}')
+        if n_unique == len(index) and values.dtype.kind in 'iub':
+            column = np.empty(len(index), dtype=values.dtype)
+        elif values.dtype.kind in 'fiub':
+            column = np.full(len(index), np.nan)
+        else:
+            column = np.full(len(index), None, dtype=object)
+        column[positions] = values
+        df[label] = column
+    return df
+
+
+def timespan_ids(index, starts, finishes, ids):
+    '''
+    The id of the timespan (sorted by start, inclusive at both ends) that contains each time in the
+    index (or NaN).
+    '''
+    result = np.full(len(index), np.nan)
+    if len(index):
+        times = pd.to_datetime(index, utc=True).values
+        starts = pd.to_datetime(list(starts), utc=True).values
+        finishes = pd.to_datetime(list(finishes), utc=True).values
+        i = np.searchsorted(starts, times, side='right') - 1
+        inside = i >= 0
+        inside[inside] = times[inside] <= finishes[i[inside]]
+        result[inside] = np.asarray(ids)[i[inside]]
+    return result
+
+
 class Data:
 
     def __init__(self, df, statistic_names):
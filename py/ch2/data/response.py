@@ -4,6 +4,7 @@ import re
 from logging import getLogger
 
 import numpy as np
+import pandas as pd
 from math import exp
 from pandas import DataFrame, Series
 from scipy import optimize
@@ -34,6 +35,31 @@ def sum_to_hour(source, column):
     return data
 
 
+def sum_to_hour_from(source, column, start):
+    '''
+    As sum_to_hour, but the initial (zero) entry is at start (on the hour), using data at or after start.
+    Hours are [h, h+1) labelled h+1, so a value exactly at start contributes to the following entry.
+    '''
+    data = source.loc[source.index >= start, [column]].resample('1h', label='right').sum()
+    index = pd.date_range(start, data.index[-1], freq='1h')
+    data = data.reindex(index, fill_value=0.0)
+    data.iloc[0] = 0.0
+    data.rename(columns={column: IMPULSE_3600}, inplace=True)
+    return data
+
+
+def continue_response(data, period, initial):
+    '''
+    Extend a response, given the value at the first time in data (period in hours).
+    The decay only depends on the previous value, so this matches calc_response over the whole range.
+    '''
+    response = data.rename(columns={IMPULSE_3600: RESPONSE})  # copy
+    decay, alpha = decay_params(period)
+    response.at[response.index[0], RESPONSE] = initial * alpha
+    inplace_decay(response, RESPONSE, period)
+    return response[RESPONSE]
+
+
 def calc_response(data, params):
     # data is a DataFrame mainly because that's what inplace_decay takes
     response = data.rename(columns={IMPULSE_3600: RESPONSE})  # copy
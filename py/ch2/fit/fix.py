@@ -176,7 +176,7 @@ def process_checksum(data, state):
         # don't use memoryview here as it gets spread into state and token
         offset = len(FileHeader(data))
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             offset += len(token)
         if len(data) - offset < 2:
             n = offset + 2 - len(data)
@@ -235,7 +235,7 @@ def set_start(data, types, messages, start):
     with memoryview(data) as view:
         offset = len(FileHeader(view))
         while len(view) - offset > 2:
-            token = token_factory(view[offset:], state)
+            token = token_factory(view, state, offset=offset)
             token.repair_timestamp(state)
             offset += len(token)
 
@@ -255,7 +255,7 @@ def validate_data(data, state, warn=False, force=True):
         file_header.validate(data, log)
         offset = len(file_header)
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             if first_t and state.timestamp:
                 log.info('First timestamp: %s' % state.timestamp)
                 first_t = False
@@ -266,7 +266,7 @@ def validate_data(data, state, warn=False, force=True):
         log.info('Last timestamp:  %s' % state.timestamp)
         if state.timestamp > dt.datetime.now(tz=pytz.UTC):
             log.warning('Timestamp in future')
-        checksum = Checksum(data[offset:])
+        checksum = Checksum(data, offset=offset)
         checksum.validate(data, log)
         log.info('OK')
     except Exception as e:
@@ -300,11 +300,11 @@ def offset_tokens(state, data, offset=0, warn=False, force=True):
     '''
     try:
         if not offset:
-            file_header = FileHeader(data[offset:])
+            file_header = FileHeader(data, offset=offset)
             offset = len(file_header)
             yield offset, file_header
         while len(data) - offset > 2:
-            token = token_factory(data[offset:], state)
+            token = token_factory(data, state, offset=offset)
             record = token.parse_token(warn=warn)
             if force:
                 record.force()
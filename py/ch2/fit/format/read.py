@@ -9,23 +9,30 @@ log = getLogger(__name__)
 
 
 def parse_data(data, types, messages, no_validate=False, max_delta_t=None):
+    '''
+    Tokenize the data (bytes, bytearray, mmap or memoryview).
+
+    All tokens are read from a single memoryview using explicit offsets, so no data are copied
+    (the tokens themselves contain views into the original data).
+    '''
 
     state = State(types, messages, max_delta_t=max_delta_t)
+    view = memoryview(data)
 
     def generator():
         offset = 0
         try:
-            file_header = FileHeader(data[offset:])
+            file_header = FileHeader(view)
             yield offset, file_header
             offset = len(file_header)
-            file_header.validate(data, log, quiet=no_validate)
-            while len(data) - offset > 2:
-                token = token_factory(data[offset:], state)
+            file_header.validate(view, log, quiet=no_validate)
+            while len(view) - offset > 2:
+                token = token_factory(view, state, offset=offset)
                 yield offset, token
                 offset += len(token)
-            checksum = Checksum(data[offset:])
+            checksum = Checksum(view, offset=offset)
             yield offset, checksum
-            checksum.validate(data, log, quiet=no_validate)
+            checksum.validate(view, log, quiet=no_validate)
         except Exception as e:
             log.warning('"%s" at offset %d' % (e, offset))
             dump(data, offset)
@@ -3,10 +3,10 @@ from abc import abstractmethod
 from collections import defaultdict, Counter
 from logging import getLogger
 from re import sub
-from struct import unpack, pack
+from struct import unpack, unpack_from, pack, Struct
 
 from .records import LazyRecord, merge_duplicates
-from ..profile.fields import TypedField, TIMESTAMP_GLOBAL_TYPE, DynamicField, CompositeField
+from ..profile.fields import TypedField, TIMESTAMP_GLOBAL_TYPE, DynamicField, CompositeField, CompiledField
 from ..profile.types import timestamp_to_time, time_to_timestamp
 from ...names import U
 from ...lib.data import WarnDict, tohex
@@ -126,15 +126,15 @@ class FileHeader(ValidateToken):
     Contains extra functionality to allow modification when fixing FIT files.
     '''
 
-    def __init__(self, data):
-        super().__init__('HDR', False, data[:data[0]])
-        self.header_size = data[0]
-        self.protocol_version = data[1]
-        self.profile_version = unpack('<H', data[2:4])[0]
-        self.data_size = unpack('<I', data[4:8])[0]
-        self.data_type = b''.join(unpack('4c', data[8:12]))
+    def __init__(self, data, offset=0):
+        super().__init__('HDR', False, data[offset:offset+data[offset]])
+        self.header_size = data[offset]
+        self.protocol_version = data[offset+1]
+        self.profile_version = unpack_from('<H', data, offset+2)[0]
+        self.data_size = unpack_from('<I', data, offset+4)[0]
+        self.data_type = b''.join(unpack_from('4c', data, offset+8))
         if len(self) > 13:
-            self.checksum = unpack('<H', data[12:14])[0]
+            self.checksum = unpack_from('<H', data, offset+12)[0]
             self.has_checksum = self.checksum != 0
         else:
             self.has_checksum = False
@@ -217,21 +217,21 @@ class Defined(Token):
 
     __slots__ = ('definition', 'timestamp', '_accumulators')
 
-    def __init__(self, tag, data, state, local_message_type):
+    def __init__(self, tag, data, state, local_message_type, offset=0):
         self.definition = state.definitions[local_message_type]
         if self.definition.timestamp_field:
-            self.__parse_timestamp(data, state)
+            self.__parse_timestamp(data, state, offset)
         self.timestamp = state.timestamp
         self._accumulators = state.accumulators
-        if len(data) < self.definition.size:
+        if len(data) - offset < self.definition.size:
             raise Exception('Insufficient data for %s (%d/%d)' %
-                            (self.definition.identity, len(data), self.definition.size))
-        super().__init__(tag, True, data[0:self.definition.size])
+                            (self.definition.identity, len(data) - offset, self.definition.size))
+        super().__init__(tag, True, data[offset:offset+self.definition.size])
 
-    def __parse_timestamp(self, data, state):
+    def __parse_timestamp(self, data, state, offset):
         field = self.definition.timestamp_field
-        times = field.field.type.parse_type(data[field.start:field.finish], 1, self.definition.endian, state.timestamp,
-                                            check_bad=False)
+        times = field.field.type.parse_type(data[offset+field.start:offset+field.finish], 1, self.definition.endian,
+                                            state.timestamp, check_bad=False)
         if times:
             state.timestamp = times[0]
         else:
@@ -265,8 +265,8 @@ class Defined(Token):
 
 class DeveloperField(Defined):
 
-    def __init__(self, data, state):
-        super().__init__('FLD', data, state, data[0] & 0x0f)
+    def __init__(self, data, state, offset=0):
+        super().__init__('FLD', data, state, data[offset] & 0x0f, offset=offset)
         self.__parse_field_definition(state)
         self.is_user = False
 
@@ -288,22 +288,22 @@ class Data(Defined):
 
     __slots__ = ()
 
-    def __init__(self, data, state):
-        super().__init__('DTA', data, state, data[0] & 0x0f)
+    def __init__(self, data, state, offset=0):
+        super().__init__('DTA', data, state, data[offset] & 0x0f, offset=offset)
 
 
 class CompressedTimestamp(Defined):
 
     __slots__ = ()
 
-    def __init__(self, data, state):
-        offset = data[0] & 0x1f
+    def __init__(self, data, state, offset=0):
+        delta = data[offset] & 0x1f
         if not state.timestamp:
             raise Exception('Compressed timestamp with no preceding absolute timestamp')
         timestamp = time_to_timestamp(state.timestamp)
-        rollover = offset < timestamp & 0x1f
-        state.timestamp = timestamp_to_time((timestamp & 0xffffffe0) + offset + (0x20 if rollover else 0))
-        super().__init__('DTT', data, state, (data[0] & 0x60) >> 5)
+        rollover = delta < timestamp & 0x1f
+        state.timestamp = timestamp_to_time((timestamp & 0xffffffe0) + delta + (0x20 if rollover else 0))
+        super().__init__('DTT', data, state, (data[offset] & 0x60) >> 5, offset=offset)
 
     def parse_token(self, raw_time=False, **options):
         timestamp = time_to_timestamp(self.timestamp) if raw_time else self.timestamp
@@ -344,6 +344,7 @@ class Field:
         # set by definition later
         self.start = 0
         self.finish = 0
+        self.compiled = None
 
 
 class Definition(Token):
@@ -354,28 +355,32 @@ class Definition(Token):
 
     This definition is stored in the state so that when that message type is found it can be used to
     parse the data.
+
+    Where possible, fields are compiled into a single struct so that a single call to unpack_from
+    decodes all the simple fields in the data (other fields are parsed individually, as before).
     '''
 
-    def __init__(self, data, state, overhead=6, tag='DFN'):
-        self.local_message_type = data[0] & 0x0f
+    def __init__(self, data, state, overhead=6, tag='DFN', offset=0):
+        self.local_message_type = data[offset] & 0x0f
         self.is_user = False
         self.references = set()
         self.timestamp_field = None
-        self.endian = data[2] & 0x01
-        self.global_message_no = unpack('<>'[self.endian]+'H', data[3:5])[0]
+        self.endian = data[offset+2] & 0x01
+        self.global_message_no = unpack_from('<>'[self.endian]+'H', data, offset+3)[0]
         self.message = state.messages.number_to_message(self.global_message_no)
         self.identity = Identity(self.message.name, state.definition_counter)
-        self.fields = self.__process_fields(self._make_fields(data, state), state)
+        self.fields = self.__process_fields(self._make_fields(data, state, offset), state)
+        self.struct = self.__compile_fields(self.fields)
         self.accumulators = state.accumulators
-        super().__init__(tag, False, data[0:overhead+3*len(self.fields)])
+        super().__init__(tag, False, data[offset:offset+overhead+3*len(self.fields)])
         state.definitions[self.local_message_type] = self
 
-    def _make_fields(self, data, state):
-        yield from self.__fields(data, state.types)
+    def _make_fields(self, data, state, offset):
+        yield from self.__fields(data, state.types, offset)
 
-    def __fields(self, data, types):
-        for i in range(data[5]):
-            yield self.__field(data[6 + i * 3:6 + (i + 1) * 3], self.message, types)
+    def __fields(self, data, types, offset):
+        for i in range(data[offset+5]):
+            yield self.__field(data[offset + 6 + i * 3:offset + 6 + (i + 1) * 3], self.message, types)
 
     def __field(self, data, message, types):
         number, size, base = data
@@ -402,6 +407,28 @@ class Definition(Token):
         self.size = offset
         return tuple(self.__sorted(fields))
 
+    def __compile_fields(self, fields):
+        format, index, position = '<>'[self.endian], 0, 0
+        # fields may be repeated (unknown fields share a name) and so may not cover all the data
+        fields = dict((id(field), field) for field in fields).values()
+        for field in sorted(fields, key=lambda field: field.start):
+            if field.start > position:
+                format += '%dx' % (field.start - position)
+            position = field.finish
+            if field.field:
+                field.compiled = field.field.compile_field(index, field.count, field.start, field.finish)
+            else:
+                field.compiled = CompiledField.from_type(field.base_type, '@%d:%d' % (field.start, field.finish),
+                                                         None, 1, 0, index, field.count, field.start,
+                                                         field.finish, options=False)
+            if field.compiled:
+                format += '%d%s' % (field.count, field.compiled.type.format)
+                index += field.count
+            else:
+                format += '%dx' % field.size
+        if index:
+            return Struct(format)
+
     def __provided_by(self, field):
         yield field.name
         if isinstance(field.field, CompositeField):
@@ -458,8 +485,8 @@ class Definition(Token):
     def parse_token(self, raw_data=False, **options):
         data = {'local_message_type': ((self.data[0:1],
                                         str(self.local_message_type)), '') if raw_data else self.local_message_type,
-                'reserved': self.data[1:2],
-                'architecture': self.data[2:3],
+                'reserved': bytes(self.data[1:2]),
+                'architecture': bytes(self.data[2:3]),
                 'message_number': ((self.data[3:5], self.message.name), '') if raw_data else self.global_message_no,
                 'no_of_fields': self.data[5:6] if raw_data else self.data[5]}
         if not raw_data:
@@ -474,16 +501,16 @@ class Definition(Token):
 
 class DeveloperDefinition(Definition):
 
-    def __init__(self, data, state):
-        super().__init__(data, state, overhead=7, tag='DFX')
+    def __init__(self, data, state, offset=0):
+        super().__init__(data, state, overhead=7, tag='DFX', offset=offset)
 
-    def _make_fields(self, data, state):
-        yield from super()._make_fields(data, state)
-        for field_data in self.__field_data(data):
+    def _make_fields(self, data, state, offset):
+        yield from super()._make_fields(data, state, offset)
+        for field_data in self.__field_data(data, offset):
             yield self.__field(field_data, state.dev_fields)
 
-    def __field_data(self, data):
-        offset = data[5] * 3 + 7
+    def __field_data(self, data, offset=0):
+        offset += data[offset+5] * 3 + 7
         n_dev_fields = data[offset-1]
         for i in range(n_dev_fields):
             yield data[offset + i * 3:offset + (i + 1) * 3]
@@ -520,8 +547,8 @@ class Checksum(ValidateToken):
             checksum = checksum ^ tmp ^ CRC[(byte >> 4) & 0xf]
         return checksum
 
-    def __init__(self, data):
-        super().__init__('CRC', False, data)
+    def __init__(self, data, offset=0):
+        super().__init__('CRC', False, data[offset:])
         self.checksum = unpack('<H', self.data)[0]
 
     def validate(self, all_data, log, quiet=False):
@@ -540,22 +567,29 @@ class Checksum(ValidateToken):
         return self._fake_record('checksum', checksum=self.data[0:2] if raw_data else self.checksum)
 
 
-def token_factory(data, state):
-    header = data[0]
+def token_factory(data, state, offset=0):
+    '''
+    Construct the token that starts at the given offset.
+
+    Tokens keep a slice of the data they contain.  When data is a memoryview over the entire file
+    those slices are views, and passing an explicit offset (rather than data[offset:]) avoids copying
+    the remainder of the file for each token.
+    '''
+    header = data[offset]
     if header & 0x80:
-        return CompressedTimestamp(data, state)
+        return CompressedTimestamp(data, state, offset=offset)
     else:
         if header & 0x40:
             if header & 0x20:
-                return DeveloperDefinition(data, state)
+                return DeveloperDefinition(data, state, offset=offset)
             else:
-                return Definition(data, state)
+                return Definition(data, state, offset=offset)
         else:
             if header & 0x10:
                 log.debug('Reserved bit set')
-            token = Data(data, state)
+            token = Data(data, state, offset=offset)
             if token.definition.global_message_no == FIELD_DESCRIPTION:
-                return DeveloperField(data, state)
+                return DeveloperField(data, state, offset=offset)
             else:
                 return token
 
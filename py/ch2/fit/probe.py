@@ -0,0 +1,69 @@
+from collections import namedtuple
+from logging import getLogger
+
+from .format.read import parse_data
+from .profile.profile import read_profile
+from ..lib import to_time
+
+log = getLogger(__name__)
+
+FILE_ID, SPORT, SESSION, MONITORING_INFO, EVENT, RECORD = 'file_id', 'sport', 'session', 'monitoring_info', 'event', 'record'
+EPOCH = to_time(0.0)
+
+
+class Probe(namedtuple('BaseProbe', 'file_type, monitor_time, activity_time, sport')):
+    '''
+    The information needed to classify and name a FIT file (see commands.upload).
+
+    file_type - the type from the file_id message (eg 'activity').
+    monitor_time - the timestamp of the first monitoring_info message (None if not a monitor file).
+    activity_time - the timestamp of the first event or record message.
+    sport - from the first sport message or, if missing, the first session.
+    '''
+
+    __slots__ = ()
+
+    @property
+    def is_monitor(self):
+        return self.monitor_time is not None
+
+
+def probe_fit(data, warn=False, profile_path=None):
+    '''
+    Tokenize the data to construct a Probe, decoding as few messages as possible.
+
+    "First" is in time order (as when all records are parsed and sorted by timestamp; records without a
+    timestamp sort first and ties keep file order).  So all tokens are read, but only the first file_id
+    and the earliest sport and session messages are decoded.
+    '''
+
+    types, messages = read_profile(warn=warn, profile_path=profile_path)
+    state, tokens = parse_data(data, types, messages)
+    file_type, first = None, {}
+
+    for _, token in tokens:
+        if not token.is_user: continue
+        name = token.definition.message.name
+        if name in (EVENT, RECORD): name = RECORD
+        if name == FILE_ID:
+            if file_type is None: file_type = read_value(token, 'type', warn=warn)
+        elif name in (MONITORING_INFO, RECORD, SPORT, SESSION):
+            if name not in first or sort_key(token) < sort_key(first[name]):
+                first[name] = token
+
+    monitor_time = first[MONITORING_INFO].timestamp if MONITORING_INFO in first else None
+    if monitor_time is not None: log.debug(f'Found {MONITORING_INFO} at {monitor_time}')
+    activity_time = first[RECORD].timestamp if RECORD in first else None
+    sport = read_value(first[SPORT], SPORT, warn=warn) if SPORT in first else None
+    if sport is None and SESSION in first: sport = read_value(first[SESSION], SPORT, warn=warn)
+    return Probe(file_type, monitor_time, activity_time, sport)
+
+
+def sort_key(token):
+    return token.timestamp if token.timestamp else EPOCH
+
+
+def read_value(token, name, warn=False):
+    for field, (values, units) in token.parse_token(warn=warn).data:
+        if field == name and values is not None:
+            return values[0]
@@ -35,6 +35,13 @@ class ScaledField(Named):
         '''
         pass
 
+    def compile_field(self, index, count, start, finish):
+        '''
+        Return a CompiledField if the field can be decoded from a struct spanning the entire message,
+        otherwise None (and the field is parsed via parse_field).
+        '''
+        return None
+
 
 class TypedField(ScaledField):
 
@@ -49,6 +56,60 @@ class TypedField(ScaledField):
     def parse_field(self, data, count, endian, timestamp, references, message, **options):
         yield from self._parse_and_scale(self.type, data, count, endian, timestamp, **options)
 
+    def compile_field(self, index, count, start, finish):
+        if self._accumulate: return None
+        return CompiledField.from_type(self.type, self.name, self._units, self._scale, self._offset,
+                                       index, count, start, finish)
+
+
+class CompiledField:
+    '''
+    Decode a field from the values unpacked by a single struct for the entire message.
+
+    This duplicates the logic in StructSupport._unpack and Mapping.parse_type for the common cases
+    (accumulated fields, and scaled fields with multiple values, are not compiled).
+    '''
+
+    def __init__(self, type, name, units, scale, offset, index, count, start, finish, options=True):
+        self.type = type
+        self.name = name
+        self.units = units
+        self.scale = scale
+        self.offset = offset
+        self.index = index
+        self.count = count
+        self.start = start
+        self.finish = finish
+        self.options = options  # if false, options are ignored (as for unknown fields)
+        self.raw = type.unscaled or (scale == 1 and offset == 0)
+
+    @classmethod
+    def from_type(cls, type, name, units, scale, offset, index, count, start, finish, options=True):
+        compiled = type.compile_type()
+        if compiled and count and compiled.n_bytes * count == finish - start:
+            scale = scale if scale else 1
+            offset = offset if offset else 0
+            if count == 1 or compiled.unscaled or (scale == 1 and offset == 0):
+                return cls(compiled, name, units, scale, offset, index, count, start, finish, options=options)
+
+    def __is_bad(self, data, values):
+        if isinstance(self.type.bad, int):
+            return all(value == self.type.bad for value in values)
+        else:
+            return data[self.start:self.finish] == self.type.bad * self.count
+
+    def parse_compiled(self, data, values, check_bad=True, map_values=True, **options):
+        values = values[self.index:self.index+self.count]
+        if not self.options:
+            check_bad, map_values = True, True
+        if check_bad and self.__is_bad(data, values):
+            return self.name, (None, self.units)
+        if not self.raw:
+            values = (values[0] / self.scale - self.offset,)
+        if map_values and self.type.mapping:
+            values = tuple(self.type.mapping.safe_internal_to_profile(value) for value in values)
+        return self.name, (values, self.units)
+
 
 class RowField(TypedField):
 
@@ -110,6 +171,9 @@ class CompositeField(Zip, TypedField):
         for _, field in self._components:
             field.register_accumulator(accumulators)
 
+    def compile_field(self, index, count, start, finish):
+        return None
+
     def parse_field(self, data, count, endian, timestamp, references, message,
                     rtn_composite=False, check_bad=True, n_bits=None, **options):
         if check_bad and self.type.is_bad(data, count, endian):
@@ -146,6 +210,9 @@ class DynamicField(Zip, RowField):
             else:
                 break
 
+    def compile_field(self, index, count, start, finish):
+        return None
+
     def post(self, message, types):
         # fill in values for when mapping is not used
         for (name, value), field in list(self.__dynamic_lookup.items()):
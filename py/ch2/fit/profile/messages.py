@@ -50,7 +50,17 @@ class Message(Named):
             if name in defn.references and value[0] is not None:
                 references[name] = value
             yield name, value
+        # a single unpack for all compiled fields
+        values = defn.struct.unpack_from(data) if defn.struct else None
+        accumulators = options.get('accumulators')
         for field in defn.fields:
+            # accumulators can be registered by later definitions, so must be checked here
+            if field.compiled and not (accumulators and field.field and field.name in accumulators):
+                name, value = field.compiled.parse_compiled(data, values, **options)
+                if name in defn.references and value[0] is not None:
+                    references[name] = value
+                yield name, value
+                continue
             bytes = data[field.start:field.finish]
             if field.field:
                 for name, value in self._parse_field(
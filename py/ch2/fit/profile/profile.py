@@ -1,11 +1,9 @@
 
+from importlib.resources import files
 from logging import getLogger
 from os.path import join, dirname
 from pickle import load, dump
 
-import openpyxl as xls
-from pkg_resources import resource_stream
-
 from .messages import Messages
 from .support import NullableLog
 from .types import Types
@@ -17,6 +15,7 @@ PROFILE = []
 
 
 def read_external_profile(path, warn=False):
+    import openpyxl as xls  # only needed here, and slow to import
     nlog = NullableLog(log)
     wb = xls.load_workbook(path)
     types = Types(nlog, wb['Types'], warn=warn)
@@ -28,9 +27,8 @@ def read_internal_profile():
     if not PROFILE:
         log.debug('Unpickling profile')
         try:
-            input = resource_stream(__name__, PROFILE_NAME)
-            PROFILE.append(load(input))
-            input.close()
+            with files(__package__).joinpath(PROFILE_NAME).open('rb') as input:
+                PROFILE.append(load(input))
         except FileNotFoundError:
             log.warning('There was a problem reading the pickled profile.')
             log.warning('If you installed via pip then please create an issue at')
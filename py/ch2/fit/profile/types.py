@@ -13,6 +13,20 @@ from ...lib.data import WarnDict, WarnList
 LITTLE, BIG = 0, 1
 
 
+class CompiledType(namedtuple('BaseCompiledType', 'format, n_bytes, bad, unscaled, mapping')):
+    '''
+    What is needed to decode a type as part of a single struct that spans an entire message
+    (see Definition).
+
+    format - the struct format character.
+    bad - the bad value (an integer, or bytes for floats since NaNs cannot be compared after unpacking).
+    unscaled - true if scale and offset are ignored (enums).
+    mapping - a Mapping to apply to the unpacked values (or None).
+    '''
+
+    __slots__ = ()
+
+
 class AbstractType(Named):
     '''
     Root class for any kind of type in the system.
@@ -26,6 +40,12 @@ class AbstractType(Named):
     def is_bad(self, bytes, count, endian):
         return False
 
+    def compile_type(self):
+        '''
+        Return a CompiledType if values can be unpacked directly by a struct, otherwise None.
+        '''
+        return None
+
     @abstractmethod
     def profile_to_internal(self, cell_contents):
         raise NotImplementedError('%s: %s' % (self.__class__.__name__, self.name))
@@ -227,6 +247,11 @@ class AutoInteger(StructSupport):
     def pack_type(self, values, count, endian):
         return self._pack(values, self.__formats, count, endian)
 
+    def compile_type(self):
+        format = self.__formats[LITTLE][-1]
+        bad = unpack('<' + format, self.__bad[LITTLE])[0]
+        return CompiledType(format, self.n_bytes, bad, self.name == 'enum', None)
+
 
 class AliasInteger(AutoInteger):
     '''
@@ -268,6 +293,9 @@ class Date(AliasInteger):
     def pack_type(self, values, count, endian):
         return super().pack_type([time_to_timestamp(value) for value in values], count, endian)
 
+    def compile_type(self):
+        return None
+
 
 class Date16(AliasInteger):
 
@@ -316,6 +344,9 @@ class Date16(AliasInteger):
             times = tuple(self.convert(time, timestamp, tzinfo=self.__tzinfo) for time in times)
         return times
 
+    def compile_type(self):
+        return None
+
 
 class AutoFloat(StructSupport):
 
@@ -341,6 +372,10 @@ class AutoFloat(StructSupport):
     def parse_type(self, data, count, endian, timestamp, check_bad=True, **options):
         return self._unpack(data, self.__formats, self.__bad, count, endian, check_bad=check_bad, **options)
 
+    def compile_type(self):
+        # all bits set, so independent of endian
+        return CompiledType(self.__formats[LITTLE][-1], self.n_bytes, bytes(self.__bad[LITTLE]), False, None)
+
 
 class Mapping(AbstractType):
 
@@ -377,6 +412,11 @@ class Mapping(AbstractType):
             values = tuple(self.safe_internal_to_profile(value) for value in values)
         return values
 
+    def compile_type(self):
+        compiled = self.base_type.compile_type()
+        if compiled:
+            return compiled._replace(mapping=self)
+
     def __add_mapping(self, row):
         profile = row.value_name
         internal = self.base_type.profile_to_internal(row.value)
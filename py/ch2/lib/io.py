@@ -1,9 +1,12 @@
 
 import re
 from logging import getLogger
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from os import stat
 
 from sqlalchemy import desc
+from sqlalchemy.orm import contains_eager
 
 from ..common.date import to_time
 from ..common.io import file_hash
@@ -13,22 +16,24 @@ from ..sql.tables.file import FileScan, FileHash
 log = getLogger(__name__)
 
 
-def modified_file_scans(s, paths, owner):
+def modified_file_scans(s, paths, owner, hash_all=False, n_threads=None):
+    '''
+    Files are only hashed if their size or modification time differ from the last scan (or if
+    hash_all is set).  Existing scans are read in a single query and hashing is done in parallel.
+    '''
 
     modified = []
+    by_path, by_hash = existing_file_scans(s, owner)
+    stats = dict((path, stat(path)) for path in paths)
+    hashes = hash_changed(stats, by_path, hash_all=hash_all, n_threads=n_threads)
 
-    for path in paths:
+    for path, stats_path in stats.items():
 
         # log.debug(f'Scanning {path}')
-        last_modified = to_time(stat(path).st_mtime)
-        hash = file_hash(path)
-        file_scan_from_hash = s.query(FileScan).\
-            join(FileHash).\
-            filter(FileHash.hash == hash,
-                   FileScan.owner == owner).one_or_none()
-        file_scan_from_path = s.query(FileScan). \
-            filter(FileScan.path == path,
-                   FileScan.owner == owner).one_or_none()
+        last_modified = to_time(stats_path.st_mtime)
+        file_scan_from_path = by_path.get(path, None)
+        hash = hashes[path] if path in hashes else file_scan_from_path.file_hash.hash
+        file_scan_from_hash = by_hash.get(hash, None)
 
         # get last scan and make sure it's up-to-date
         if file_scan_from_path:
@@ -37,12 +42,15 @@ def modified_file_scans(s, paths, owner):
                             f'{file_scan_from_path.last_scan}')
                 file_scan_from_path.file_hash = FileHash.get_or_add(s, hash)
                 file_scan_from_path.last_scan = TIME_ZERO
+                by_hash[hash] = file_scan_from_path
         elif file_scan_from_hash:
             log.warning(f'File at {path} already exists at {file_scan_from_hash} - skipping')
             continue
         else:
             file_scan_from_path = FileScan.add(s, path, owner, hash)
+            by_path[path], by_hash[hash] = file_scan_from_path, file_scan_from_path
             s.flush()  # want this to appear in queries below
+        file_scan_from_path.size, file_scan_from_path.modified = stats_path.st_size, last_modified
 
         # only look at hash if we are going to process anyway
         if last_modified > file_scan_from_path.last_scan:
@@ -69,6 +77,33 @@ def modified_file_scans(s, paths, owner):
     return modified
 
 
+def existing_file_scans(s, owner):
+    '''
+    All scans for the owner, indexed by path and by hash.
+    '''
+    by_path, by_hash = {}, {}
+    for file_scan in s.query(FileScan).join(FileHash).options(contains_eager(FileScan.file_hash)). \
+            filter(FileScan.owner == owner).all():
+        by_path[file_scan.path] = file_scan
+        by_hash[file_scan.file_hash.hash] = file_scan
+    return by_path, by_hash
+
+
+def hash_changed(stats, by_path, hash_all=False, n_threads=None):
+    '''
+    Hash (in parallel) the files whose size or modification time differ from the previous scan.
+    '''
+    paths = [path for path, stats_path in stats.items()
+             if hash_all or path not in by_path or
+             by_path[path].size != stats_path.st_size or by_path[path].modified != to_time(stats_path.st_mtime)]
+    if paths:
+        log.debug(f'Hashing {len(paths)} of {len(stats)} files')
+        with ThreadPool(n_threads or cpu_count()) as pool:
+            return dict(zip(paths, pool.map(file_hash, paths)))
+    else:
+        return {}
+
+
 def split_fit_path(path):
     # returns glob and kit
     pattern = re.compile(r'(.*\d\d\d\d-\d\d-\d\d.*)-([\w,]+).fit')
@@ -77,5 +112,3 @@ def split_fit_path(path):
         return match.group(1) + '*.fit', match.group(2)
     else:
         return path[:-4] + '*' + path[-4:], None
-
-
@@ -127,6 +127,7 @@ class Titles(TitlesBase):
     GROUP = 'Group'
     HEADING = 'Heading'
     HEART_RATE = 'Heart Rate'
+    HR_CURVE = 'HR Curve'
     HR_IMPULSE_10 = 'HR Impulse / 10s'
     HR_ZONE = 'HR Zone'
     INDEX = 'Index'
@@ -150,6 +151,7 @@ class Titles(TitlesBase):
     MIN_KM_TIME_ANY = 'Min % Time'
     MIXED = 'Mixed'
     NAME = 'Name'
+    PE_CURVE = 'PE Curve'
     PERCENT_IN_Z = 'Percent in Z%d'
     PERCENT_IN_Z_ANY = 'Percent in Z%'
     POINTS = 'Points'
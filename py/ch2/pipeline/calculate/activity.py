@@ -63,6 +63,10 @@ class ActivityCalculator(LoaderMixin, OwnerInMixin, DataFrameCalculatorMixin,
                        'The highest median HR in the given interval.', values=MAX_MINUTES)
         self._provides(s, T.MAX_MEAN_PE_M, StatisticJournalType.FLOAT, U.W, S.join(S.MAX, S.MSR),
                        'The highest average power estimate in the given interval.', values=MAX_MINUTES)
+        self._provides(s, T.HR_CURVE, StatisticJournalType.TEXT, None, None,
+                       'The highest median HR for every interval (JSON, by seconds).')
+        self._provides(s, T.PE_CURVE, StatisticJournalType.TEXT, None, None,
+                       'The highest average power estimate for every interval (JSON, by seconds).')
         self._provides(s, T.TOTAL_CLIMB, StatisticJournalType.FLOAT, U.M, S.join(S.MAX, S.MSR),
                        'The total height climbed in the detected climbs (only).')
         # these are complicated :( because exact names are calculated elsewhere
@@ -87,9 +91,14 @@ class ActivityCalculator(LoaderMixin, OwnerInMixin, DataFrameCalculatorMixin,
             self._provides(s, T.RECOVERY_D % days, StatisticJournalType.FLOAT, U.S, S.join(S.MAX, S.MSR),
                            'The time before Fatigue returns to the value before the activity.')
 
+    def _shutdown(self, s):
+        # this is the last calculator to read the cache, so a good time to tidy (once, in the parent)
+        if not self.worker: self._prune_activity_cache(s)
+        super()._shutdown(s)
+
     def _read_dataframe(self, s, ajournal):
         try:
-            adf = Statistics(s, activity_journal=ajournal, with_timespan=True). \
+            adf = Statistics(s, activity_journal=ajournal, with_timespan=True, cache=self._activity_cache()). \
                 by_name(ActivityReader, N.DISTANCE, N.HEART_RATE, N.SPHERICAL_MERCATOR_X, N.SPHERICAL_MERCATOR_Y). \
                 by_name(ElevationCalculator, N.ELEVATION). \
                 by_name(ImpulseCalculator, N.HR_ZONE). \
@@ -126,8 +135,8 @@ class ActivityCalculator(LoaderMixin, OwnerInMixin, DataFrameCalculatorMixin,
         stats.update(self.__average_power(s, ajournal, stats[N.ACTIVE_TIME]))
         stats.update(times_for_distance(adf))
         stats.update(hrz_stats(adf))
-        stats.update(max_med_stats(adf))
-        stats.update(max_mean_stats(adf))
+        stats.update(max_med_stats(adf, curves={N.HEART_RATE: N.HR_CURVE}))
+        stats.update(max_mean_stats(adf, curves={N.POWER_ESTIMATE: N.PE_CURVE}))
         stats.update(direction_stats(adf))
         if sdf is not None:
             stats.update(response_stats(sdf, delta))
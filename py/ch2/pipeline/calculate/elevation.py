@@ -7,7 +7,6 @@ from sqlalchemy import text, select
 from .utils import ActivityJournalProcessCalculator, DataFrameCalculatorMixin
 from ..pipeline import LoaderMixin
 from ...common.geo import utm_srid
-from ...common.math import is_nan
 from ...data import Statistics
 from ...data.activity import add_delta_azimuth
 from ...data.elevation import smooth_elevation
@@ -35,7 +34,7 @@ class ElevationCalculator(LoaderMixin, DataFrameCalculatorMixin, ActivityJournal
     def _read_dataframe(self, s, ajournal):
         from ..owners import ActivityReader
         try:
-            return Statistics(s, activity_journal=ajournal, with_timespan=True). \
+            return Statistics(s, activity_journal=ajournal, with_timespan=True, cache=self._activity_cache()). \
                 by_name(ActivityReader, N.LATITUDE, N.LONGITUDE, N.DISTANCE, N.ELAPSED_TIME,
                         N.RAW_ELEVATION, N.ELEVATION, N.ALTITUDE,
                         N.SPHERICAL_MERCATOR_X, N.SPHERICAL_MERCATOR_Y).df
@@ -57,11 +56,7 @@ class ElevationCalculator(LoaderMixin, DataFrameCalculatorMixin, ActivityJournal
             return None
 
     def _copy_results(self, s, ajournal, loader, df):
-        for time, row in df.iterrows():
-            if N.ELEVATION in row and not is_nan(row[N.ELEVATION]):
-                loader.add_data(N.ELEVATION, ajournal, row[N.ELEVATION], time)
-            if N.GRADE in row and not is_nan(row[N.GRADE]):
-                loader.add_data(N.GRADE, ajournal, row[N.GRADE], time)
+        loader.add_frame(df, [N.ELEVATION, N.GRADE], ajournal)
         self.__create_postgis(s, ajournal, df)
 
     def __create_postgis(self, s, ajournal, df):
@@ -4,7 +4,9 @@ from itertools import groupby
 from logging import getLogger
 from random import uniform
 
-from sqlalchemy import inspect, select, alias, and_, distinct, func, not_
+import numpy as np
+from scipy.sparse import csr_matrix
+from sqlalchemy import inspect, select, alias, and_, func, not_
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql.functions import count
 
@@ -15,11 +17,13 @@ from ...lib.dbscan import DBSCAN
 from ...lib.optimizn import expand_max
 from ...names import N
 from ...rtree import MatchType
+from ...rtree.grid import overlap_counts
 from ...rtree.spherical import SQRTree
 from ...sql import ActivityJournal, ActivityGroup, ActivitySimilarity, ActivityNearby, StatisticName, \
     StatisticJournal, StatisticJournalFloat, Timestamp
 
 log = getLogger(__name__)
+RTREE, GRID = 'rtree', 'grid'
 Nearby = namedtuple('Nearby', 'constraint, activity_group, border, start, finish, '
                               'latitude, longitude, height, width, fraction')
 
@@ -37,24 +41,34 @@ class SimilarityCalculator(RerunWhenNewActivitiesMixin, ProcessCalculator):
      order by st_distance(lo.centre, hi.centre)
 
     (caching st_transform(lo.route::geometry, lo.utm_srid) as utm_route doesn't help)
+
+    engine selects how nearby points are found: rtree (the default) adds points one at a time
+    to an SQRTree; grid bins all points into cells and counts overlaps with numpy, which is much
+    faster when adding new activities to a large archive (use -Kengine=grid).
     '''
 
-    def __init__(self, *args, fraction=0.01, border=150, **kargs):
+    def __init__(self, *args, fraction=0.01, border=150, engine=RTREE, **kargs):
         self.fraction = fraction
         self.border = border
+        self.engine = self._assert('engine', engine)
+        if self.engine not in (RTREE, GRID):
+            raise Exception(f'Unknown engine {self.engine} (use {RTREE} or {GRID})')
         super().__init__(*args, **kargs)
 
     def startup(self):
-        log.info(f'Reducing to {int(0.5 + 100 * self.fraction):d}%')
+        log.info(f'Reducing to {int(0.5 + 100 * self.fraction):d}% ({self.engine})')
         super().startup()
 
     def _run_one(self, missed):
         with self._config.db.session_context() as s:
-            rtree = SQRTree(default_match=MatchType.OVERLAP, default_border=self.border)
             n_points = defaultdict(lambda: 0)
-            self._prepare(s, rtree, n_points, 30000)
             n_overlaps = defaultdict(lambda: defaultdict(lambda: 0))
-            new_ids, affected_ids = self._count_overlaps(s, rtree, n_points, n_overlaps, 10000)
+            if self.engine == GRID:
+                new_ids, affected_ids = self._grid_overlaps(s, n_points, n_overlaps)
+            else:
+                rtree = SQRTree(default_match=MatchType.OVERLAP, default_border=self.border)
+                self._prepare(s, rtree, n_points, 30000)
+                new_ids, affected_ids = self._count_overlaps(s, rtree, n_points, n_overlaps, 10000)
             # this clears itself beforehand
             # use explicit class to distinguish from subclasses (which compare against this)
             with Timestamp(owner=self.owner_out).on_success(s):
@@ -99,6 +113,31 @@ class SimilarityCalculator(RerunWhenNewActivitiesMixin, ProcessCalculator):
             log.info(f'Measured {n} points')
         return new_aj_ids, affected_aj_ids
 
+    def _grid_overlaps(self, s, n_points, n_overlaps):
+        '''
+        Equivalent to _prepare and _count_overlaps, but with all points loaded at once and matched
+        on a grid (boxes of size border around each point overlap when within 2 * border).
+        '''
+        old = list(self._filter(self._aj_lon_lat(s, new=False)))
+        new = list(self._filter(self._aj_lon_lat(s, new=True)))
+        log.info(f'Loaded {len(old)} existing and {len(new)} new points')
+        new_ids = list(dict.fromkeys(aj_id for aj_id, _, _ in new))
+        rank = dict((aj_id, i + 1) for i, aj_id in enumerate(new_ids))
+        points = old + new
+        for aj_id in (aj_id for aj_id, _, _ in points):
+            n_points[aj_id] += 1
+        ids = np.array([aj_id for aj_id, _, _ in points], dtype=np.int64)
+        ranks = np.array([rank.get(aj_id, 0) for aj_id, _, _ in points], dtype=np.int64)
+        counts = overlap_counts([lon for _, lon, _ in points], [lat for _, _, lat in points],
+                                ids, ranks, 2 * self.border)
+        affected_ids = set(new_ids)
+        for (aj_id_in, aj_id_out), n in counts.items():
+            lo, hi = min(aj_id_in, aj_id_out), max(aj_id_in, aj_id_out)  # ordered pair
+            n_overlaps[lo][hi] += n
+            affected_ids.add(aj_id_out)
+        log.info(f'Measured {len(new)} points')
+        return new_ids, affected_ids
+
     def _filter(self, lon_lats):
         # todo - why random?  would sequential be better?
         for lon_lat in lon_lats:
@@ -178,46 +217,61 @@ class SimilarityCalculator(RerunWhenNewActivitiesMixin, ProcessCalculator):
             log.info(f'Saved {n}')
 
 
-class NearbySimilarityDBSCAN(DBSCAN):
+class SimilarityGraph:
 
-    def __init__(self, s, activity_group, epsilon, minpts):
-        super().__init__(epsilon, minpts)
-        self.__s = s
-        self.__activity_group = activity_group
+    '''
+    The similarities between activities in a single group, loaded once and held as a (symmetric)
+    sparse matrix so that DBSCAN can query neighbourhoods (for many epsilon values) in memory.
+
+    Values are normalised by the maximum similarity, so a neighbour within epsilon has a value
+    greater than 1 - epsilon.
+    '''
+
+    def __init__(self, rows):
+        '''
+        rows are (activity_journal_lo_id, activity_journal_hi_id, similarity).
+        '''
+        lo, hi, similarity = (np.array(column) for column in zip(*rows)) if rows else ([], [], [])
+        if not len(similarity) or not np.max(similarity): raise Exception('All activities unconnected')
+        self.ids, index = np.unique(np.concatenate([lo, hi]), return_inverse=True)
+        lo, hi = index[:len(lo)], index[len(lo):]
+        similarity = np.asarray(similarity, dtype=float) / np.max(similarity)
+        n = len(self.ids)
+        self.__matrix = csr_matrix((np.concatenate([similarity, similarity]),
+                                    (np.concatenate([lo, hi]), np.concatenate([hi, lo]))), shape=(n, n))
+        self.__index = dict((id, i) for i, id in enumerate(self.ids.tolist()))
+        log.debug(f'Loaded {len(rows)} similarities between {n} activities')
+
+    @classmethod
+    def from_group(cls, s, activity_group):
         ajlo = aliased(ActivityJournal)
         ajhi = aliased(ActivityJournal)
-        self.__max_similarity = self.__s.query(func.max(ActivitySimilarity.similarity)). \
-            join(ajlo, ActivitySimilarity.activity_journal_lo_id == ajlo.id). \
-            join(ajhi, ActivitySimilarity.activity_journal_hi_id == ajhi.id). \
-            filter(ajlo.activity_group == activity_group,
-                   ajhi.activity_group == activity_group).scalar()
-        if not self.__max_similarity: raise Exception('All activities unconnected')
+        return cls(s.query(ActivitySimilarity.activity_journal_lo_id, ActivitySimilarity.activity_journal_hi_id,
+                           ActivitySimilarity.similarity).
+                   join(ajlo, ActivitySimilarity.activity_journal_lo_id == ajlo.id).
+                   join(ajhi, ActivitySimilarity.activity_journal_hi_id == ajhi.id).
+                   filter(ajlo.activity_group == activity_group,
+                          ajhi.activity_group == activity_group).all())
+
+    def neighbourhood(self, candidate, epsilon):
+        i = self.__index[candidate]
+        start, finish = self.__matrix.indptr[i], self.__matrix.indptr[i+1]
+        columns = self.__matrix.indices[start:finish]
+        return self.ids[columns[self.__matrix.data[start:finish] > 1 - epsilon]].tolist()
+
+
+class NearbySimilarityDBSCAN(DBSCAN):
+
+    def __init__(self, graph, epsilon, minpts):
+        super().__init__(epsilon, minpts)
+        self.__graph = graph
 
     def run(self):
-        candidates = set(x[0] for x in
-                         self.__s.query(distinct(ActivitySimilarity.activity_journal_lo_id)).
-                         join(ActivityJournal, ActivityJournal.id == ActivitySimilarity.activity_journal_lo_id).
-                         filter(ActivityJournal.activity_group == self.__activity_group).all())
-        candidates = candidates.union(set(x[0] for x in
-                         self.__s.query(distinct(ActivitySimilarity.activity_journal_hi_id)).
-                         join(ActivityJournal, ActivityJournal.id == ActivitySimilarity.activity_journal_hi_id).
-                         filter(ActivityJournal.activity_group == self.__activity_group).all()))
-        candidates = sorted(candidates)
         # shuffle(candidates)  # skip for repeatability
-        return super().run(candidates)
+        return super().run(self.__graph.ids.tolist())
 
     def neighbourhood(self, candidate, epsilon):
-        qlo = self.__s.query(ActivitySimilarity.activity_journal_lo_id). \
-            join(ActivityJournal, ActivityJournal.id == ActivitySimilarity.activity_journal_lo_id). \
-            filter(ActivityJournal.activity_group == self.__activity_group,
-                   ActivitySimilarity.activity_journal_hi_id == candidate,
-                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
-        qhi = self.__s.query(ActivitySimilarity.activity_journal_hi_id). \
-            join(ActivityJournal, ActivityJournal.id == ActivitySimilarity.activity_journal_hi_id). \
-            filter(ActivityJournal.activity_group == self.__activity_group,
-                   ActivitySimilarity.activity_journal_lo_id == candidate,
-                   (self.__max_similarity - ActivitySimilarity.similarity) / self.__max_similarity < epsilon)
-        return [x[0] for x in qlo.all()] + [x[0] for x in qhi.all()]
+        return self.__graph.neighbourhood(candidate, epsilon)
 
 
 class NearbyCalculator(OwnerInMixin, ProcessCalculator):
@@ -241,15 +295,16 @@ class NearbyCalculator(OwnerInMixin, ProcessCalculator):
             with Timestamp(owner=self.owner_out).on_success(s):
                 for activity_group in s.query(ActivityGroup).all():
                     try:
-                        d_min, n = expand_max(0, 1, 5, lambda d: len(self.dbscan(s, d, activity_group)))
+                        graph = SimilarityGraph.from_group(s, activity_group)
+                        d_min, n = expand_max(0, 1, 5, lambda d: len(self.dbscan(graph, d)))
                         log.info(f'{n} groups at d={d_min}')
-                        self.save(s, self.dbscan(s, d_min, activity_group), activity_group)
+                        self.save(s, self.dbscan(graph, d_min), activity_group)
                     except Exception as e:
                         log.warning(f'Failed to find nearby activities for {activity_group.name}: {e}')
                         log_current_exception(traceback=False)
 
-    def dbscan(self, s, d, activity_group):
-        return NearbySimilarityDBSCAN(s, activity_group, d, 3).run()
+    def dbscan(self, graph, d):
+        return NearbySimilarityDBSCAN(graph, d, 3).run()
 
     def save(self, s, groups, activity_group):
         for i, group in enumerate(groups):
@@ -3,9 +3,10 @@ from collections import namedtuple
 from json import loads
 from logging import getLogger
 
+import pandas as pd
 import pytz
 from math import log10
-from sqlalchemy import distinct
+from sqlalchemy import distinct, func
 from sqlalchemy.sql.functions import count
 
 from .utils import ProcessCalculator
@@ -15,10 +16,10 @@ from ...common.date import round_hour, to_time, now, format_timeq
 from ...common.math import is_nan
 from ...common.names import TIME_ZERO
 from ...data import Statistics, present
-from ...data.response import sum_to_hour, calc_response
+from ...data.response import sum_to_hour, calc_response, sum_to_hour_from, continue_response
 from ...names import Names as N, SPACE
 from ...sql import StatisticJournal, Composite, StatisticName, Source, Constant, CompositeComponent, \
-    StatisticJournalType
+    StatisticJournalType, StatisticJournalFloat
 from ...sql.tables.source import SourceType
 from ...sql.utils import add
 
@@ -31,22 +32,26 @@ SCALED = 'scaled'
 
 class ResponseCalculator(LoaderMixin, OwnerInMixin, ProcessCalculator):
     '''
-    this is hard to do correctly, incrementally.
-
-    for now, we do all or nothing.
-
     first, we check if the current solution is complete:
     * all sources used (no need to check for gaps - composite chaining should do that)
-    * within 3 hours of the current time (if not, we regenerate, padding with zeroes)
+    * within 3 hours of the current time (if not, we extend, padding with zeroes)
+
+    if not complete, we find a checkpoint - the last hour (common to all responses) before any
+    unused impulse data.  the decay only depends on the previous value, so we can delete everything
+    after the checkpoint (values and the tail of the composite chain) and extend from there.
 
-    if not complete, we regenerate the whole damn thing.
+    if there is no checkpoint (or incremental=False) we regenerate the whole damn thing.
     '''
 
-    def __init__(self, *args, response_constants=None, prefix=None, **kargs):
+    def __init__(self, *args, response_constants=None, prefix=None, incremental=True, **kargs):
         self.response_constant_names = self._assert('response_constants', response_constants)
         self.prefix = self._assert('prefix', prefix)
+        self.incremental = incremental
         super().__init__(*args, **kargs)
 
+    def __names(self):
+        return [self.prefix + SPACE + constant.short_name for constant in self.response_constants]
+
     def _startup(self, s):
         self.response_constants = [Constant.from_name(s, name) for name in self.response_constant_names]
         self.responses = [Response(**loads(constant.at(s).value)) for constant in self.response_constants]
@@ -84,12 +89,80 @@ class ResponseCalculator(LoaderMixin, OwnerInMixin, ProcessCalculator):
         if missing_recent or missing_sources:
             if missing_recent: log.info('Incomplete coverage (so will re-calculate)')
             if missing_sources: log.info('Additional sources (so will re-calculate)')
-            self._delete(s)
-            start = round_hour(self.__start(s), up=False)
-            return [format_timeq(start)]
+            checkpoint = self.__checkpoint(s) if self.incremental else None
+            if checkpoint:
+                log.info(f'Extending from {checkpoint}')
+                self.__delete_after(s, checkpoint)
+                return [format_timeq(checkpoint)]
+            else:
+                self._delete(s)
+                start = round_hour(self.__start(s), up=False)
+                return [format_timeq(start)]
         else:
             return []
 
+    def __statistic_name_ids(self, s):
+        return s.query(StatisticName.id). \
+            filter(StatisticName.name.in_(self.__names()),
+                   StatisticName.owner == self.owner_out)
+
+    def __used_sources(self, s):
+        return s.query(CompositeComponent.input_source_id). \
+            join(StatisticJournal, StatisticJournal.source_id == CompositeComponent.output_source_id). \
+            filter(StatisticJournal.statistic_name_id.in_(self.__statistic_name_ids(s)))
+
+    def __checkpoint(self, s):
+        # the last time before any unused impulse data where all responses have a value
+        unused = s.query(func.min(StatisticJournal.time)). \
+            join(StatisticName). \
+            filter(StatisticName.name == self.prefix + SPACE + N.HR_IMPULSE_10,
+                   StatisticJournal.source_id.notin_(self.__used_sources(s))).scalar()
+        checkpoint = None
+        for name in self.__names():
+            q = s.query(func.max(StatisticJournal.time)). \
+                join(StatisticName). \
+                filter(StatisticName.name == name,
+                       StatisticName.owner == self.owner_out)
+            if unused: q = q.filter(StatisticJournal.time < unused)
+            last = q.scalar()
+            if last is None: return None
+            checkpoint = last if checkpoint is None else min(checkpoint, last)
+        if len(self.__read_checkpoint(s, checkpoint)) != len(self.__names()):
+            log.warning(f'Inconsistent responses at {checkpoint}')
+            return None
+        return checkpoint
+
+    def __read_checkpoint(self, s, time):
+        # name: (value, source) at the given time
+        return {name: (value, source_id)
+                for name, value, source_id in
+                s.query(StatisticName.name, StatisticJournalFloat.value, StatisticJournalFloat.source_id).
+                    join(StatisticName).
+                    filter(StatisticJournalFloat.statistic_name_id.in_(self.__statistic_name_ids(s)),
+                           StatisticJournalFloat.time == time).all()}
+
+    def __delete_after(self, s, checkpoint):
+        # the composite in use at the checkpoint is kept, and extended; everything later is discarded.
+        # that includes the whole chain after the current composite, since some links carry no values
+        # (when several sources start within the same hour).
+        later = s.query(StatisticJournal). \
+            filter(StatisticJournal.statistic_name_id.in_(self.__statistic_name_ids(s)),
+                   StatisticJournal.time > checkpoint)
+        current = s.query(StatisticJournal.source_id). \
+            filter(StatisticJournal.statistic_name_id.in_(self.__statistic_name_ids(s)),
+                   StatisticJournal.time == checkpoint)
+        chain = s.query(CompositeComponent.output_source_id.label('id')). \
+            filter(CompositeComponent.input_source_id.in_(current)).cte(recursive=True)
+        chain = chain.union_all(s.query(CompositeComponent.output_source_id).
+                                join(chain, CompositeComponent.input_source_id == chain.c.id))
+        tail = [row[0] for row in s.query(chain.c.id).all()]
+        log.info(f'Deleting {later.count()} values and {len(tail)} Composite sources after {checkpoint}')
+        later.delete(synchronize_session=False)
+        if tail:
+            s.query(Source).filter(Source.id.in_(tail)).delete(synchronize_session=False)
+        s.commit()
+        Composite.clean(s)
+
     def __missing_recent(self, s, constant, now):
         log.debug('Searching for missing recent')
         finish = s.query(StatisticJournal.time). \
@@ -132,56 +205,89 @@ class ResponseCalculator(LoaderMixin, OwnerInMixin, ProcessCalculator):
 
     def _run_one(self, missed):
         with self._config.db.session_context() as s:
-            data = self.__read_data(s)
-            if N.HR_IMPULSE_10 in data.columns and N.COVERAGE in data.columns:
-                # coverage is calculated by the loader and seems to reflect records that have location data but not
-                # HR data.  so i guess it makes sense to scale.
-                # i don't remember why / when i added this - it might have been when using an optical monitor?
-                # it seems like a relatively small effect in most cases.
-                data.loc[now()] = {N.HR_IMPULSE_10: 0.0, N._src(N.HR_IMPULSE_10): None, N.COVERAGE: 100}
-                data[SCALED] = data[N.HR_IMPULSE_10] * 100 / data[N.COVERAGE]
-                all_sources = list(self.__make_sources(s, data))
-                for constant, response in zip(self.response_constants, self.responses):
-                    name = self.prefix + SPACE + constant.short_name
-                    log.info(f'Creating values for {response.title} ({name})')
-                    imp3600 = sum_to_hour(data, SCALED)
-                    params = (log10(response.tau_days * 24),
-                              log10(response.start) if response.start > 0 else 1)
-                    result = calc_response(imp3600, params) * response.scale
-                    loader = self._get_loader(s, add_serial=False)
-                    source, sources = None, list(all_sources)
-                    for time, value in result.iteritems():
-                        # the sources are much more spread out than the response, which is calculated every hour so
-                        # that it is smooth.  so we only increment the source when necessary.
-                        skipped = 0
-                        while sources and time >= sources[0][0]:
-                            source = sources.pop(0)[1]
-                            skipped += 1
-                            if skipped > 1:
-                                log.warning(f'Skipping multiple sources at {time}')
-                        loader.add_data(name, source, value, time)
-                    loader.load()
-
-    def __read_data(self, s):
+            start = to_time(missed)
+            checkpoint = self.__read_checkpoint(s, start) if self.incremental else {}
+            if checkpoint:
+                self.__extend(s, start, checkpoint)
+            else:
+                self.__calculate_all(s)
+
+    def __extend(self, s, start, checkpoint):
+        data = self.__read_data(s, start=start)
+        columns = [N.HR_IMPULSE_10, N._src(N.HR_IMPULSE_10), N.COVERAGE]
+        if all(column in data.columns for column in columns):
+            data = data.loc[data.index >= start, columns].copy()
+        else:
+            data = pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], tz=pytz.UTC))
+        data.loc[now()] = {N.HR_IMPULSE_10: 0.0, N._src(N.HR_IMPULSE_10): None, N.COVERAGE: 100}
+        data[SCALED] = data[N.HR_IMPULSE_10].astype(float) * 100 / data[N.COVERAGE].astype(float)
+        imp3600 = sum_to_hour_from(data, SCALED, start)
+        _, source_id = next(iter(checkpoint.values()))
+        prev = s.query(Composite).filter(Composite.id == source_id).one()
+        all_sources = list(self.__make_sources(s, data, prev=prev, start=start))
+        for constant, response in zip(self.response_constants, self.responses):
+            name = self.prefix + SPACE + constant.short_name
+            log.info(f'Extending values for {response.title} ({name}) from {start}')
+            value, _ = checkpoint[name]
+            result = continue_response(imp3600, response.tau_days * 24, value / response.scale) * response.scale
+            self.__load(s, name, result.iloc[1:], all_sources)
+
+    def __load(self, s, name, result, all_sources):
+        loader = self._get_loader(s, add_serial=False)
+        source, sources = None, list(all_sources)
+        for time, value in result.iteritems():
+            # the sources are much more spread out than the response, which is calculated every hour so
+            # that it is smooth.  so we only increment the source when necessary.
+            skipped = 0
+            while sources and time >= sources[0][0]:
+                source = sources.pop(0)[1]
+                skipped += 1
+                if skipped > 1:
+                    log.warning(f'Skipping multiple sources at {time}')
+            loader.add_data(name, source, value, time)
+        loader.load()
+
+    def __calculate_all(self, s):
+        data = self.__read_data(s)
+        if N.HR_IMPULSE_10 in data.columns and N.COVERAGE in data.columns:
+            # coverage is calculated by the loader and seems to reflect records that have location data but not
+            # HR data.  so i guess it makes sense to scale.
+            # i don't remember why / when i added this - it might have been when using an optical monitor?
+            # it seems like a relatively small effect in most cases.
+            data.loc[now()] = {N.HR_IMPULSE_10: 0.0, N._src(N.HR_IMPULSE_10): None, N.COVERAGE: 100}
+            data[SCALED] = data[N.HR_IMPULSE_10] * 100 / data[N.COVERAGE]
+            all_sources = list(self.__make_sources(s, data))
+            for constant, response in zip(self.response_constants, self.responses):
+                name = self.prefix + SPACE + constant.short_name
+                log.info(f'Creating values for {response.title} ({name})')
+                imp3600 = sum_to_hour(data, SCALED)
+                params = (log10(response.tau_days * 24),
+                          log10(response.start) if response.start > 0 else 1)
+                result = calc_response(imp3600, params) * response.scale
+                self.__load(s, name, result, all_sources)
+
+    def __read_data(self, s, start=None):
         from ..owners import ImpulseCalculator
         name = self.prefix + SPACE + N.HR_IMPULSE_10
-        df = Statistics(s, with_source=True).by_name(ImpulseCalculator, name).with_. \
+        df = Statistics(s, start=start, with_source=True).by_name(ImpulseCalculator, name).with_. \
             rename({name: N.HR_IMPULSE_10, N._src(name): N._src(N.HR_IMPULSE_10)}).df
         name = N._cov(N.HEART_RATE)
-        df = Statistics(s).by_name(ActivityReader, name).with_. \
+        df = Statistics(s, start=start).by_name(ActivityReader, name).with_. \
             rename({name: N.COVERAGE}).into(df, tolerance='10s')
         if present(df, N.COVERAGE):
             df[N.COVERAGE].fillna(axis='index', method='ffill', inplace=True)
             df[N.COVERAGE].fillna(100, axis='index', inplace=True)
         return df
 
-    def __make_sources(self, s, data):
-        # this chains forwards from zero, adding a new composite for each new impulse source.
-        # in theory we could reconstruct only missing entries.
+    def __make_sources(self, s, data, prev=None, start=None):
+        # this chains forwards from zero (or an existing composite), adding a new composite for each
+        # new impulse source.
         log.info('Creating sources')
         name = N._src(N.HR_IMPULSE_10)
-        prev = add(s, Composite(n_components=0))
-        yield to_time(0.0), prev
+        if prev is None:
+            prev = add(s, Composite(n_components=0))
+            start = to_time(0.0)
+        yield start, prev
         # find times where the source changes
         changes = data.loc[data[name].ne(data[name].shift())]
         for time, row in changes.iterrows():
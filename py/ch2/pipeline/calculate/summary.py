@@ -1,4 +1,6 @@
 
+from collections import defaultdict
+from itertools import groupby
 from logging import getLogger
 from random import choice
 
@@ -9,11 +11,12 @@ from ..pipeline import LoaderMixin
 from ...common.date import local_date_to_time
 from ...data.frame import _tables
 from ...names import Summaries as S, simple_name
-from ...sql.tables.source import Interval, Source
+from ...sql.tables.source import Interval
 from ...sql.tables.statistic import StatisticJournal, StatisticName, StatisticMeasure, StatisticJournalInteger, \
     StatisticJournalFloat, TYPE_TO_JOURNAL_CLASS, STATISTIC_JOURNAL_CLASSES, STATISTIC_JOURNAL_TYPES
 
 log = getLogger(__name__)
+AGGREGATES = {S.MAX: func.max, S.MIN: func.min, S.SUM: func.sum, S.CNT: func.count, S.AVG: func.avg}
 
 
 def fuzz(n, q):
@@ -52,13 +55,12 @@ class SummaryCalculator(LoaderMixin, IntervalCalculatorMixin, ProcessCalculator)
     def _calculate_results(self, s, interval, data, loader):
         log.debug('Calculating summaries')
         start, finish = local_date_to_time(interval.start), local_date_to_time(interval.finish)
-        measures = []
+        values = self._calculate_values(s, data, start, finish, interval)
         for statistic_name in data:
-            summaries = statistic_name.summaries
-            for summary in summaries:
-                value, units = self._calculate_value(s, statistic_name, summary, S.MIN in summaries,
-                                                     start, finish, interval, measures)
+            for summary in statistic_name.summaries:
+                value = values.get((statistic_name.id, summary), None)
                 if value is not None:
+                    units = None if summary == S.CNT else statistic_name.units
                     title = self.fmt_title(statistic_name.title, summary, self.schedule)
                     # we need to infer the type
                     if summary in (S.MAX, S.MIN, S.SUM):
@@ -71,46 +73,52 @@ class SummaryCalculator(LoaderMixin, IntervalCalculatorMixin, ProcessCalculator)
                     StatisticName.add_if_missing(s, title, new_type, units, None, self.owner_out,
                                                  self._describe(statistic_name, summary, interval))
                     loader.add_data(simple_name(title), interval, value, start)
+        measures = self._calculate_measures(s, [statistic_name for statistic_name in data
+                                                if S.MSR in statistic_name.summaries],
+                                            start, finish, interval)
         # add and commit these here - what else can we do?
         log.debug(f'Adding {len(measures)} measures')
-        for measure in measures:
-            s.add(measure)
+        if measures:
+            s.connection().execute(inspect(StatisticMeasure).local_table.insert(), measures)
         s.commit()
 
-    def _calculate_value(self, s, statistic_name, summary, order_asc, start_time, finish_time, interval, measures):
+    @staticmethod
+    def _by_journal_type(statistic_names):
+        key = lambda statistic_name: statistic_name.statistic_journal_type
+        for journal_type, statistic_names in groupby(sorted(statistic_names, key=key), key=key):
+            yield inspect(STATISTIC_JOURNAL_CLASSES[journal_type]).local_table, list(statistic_names)
 
-        t = _tables()
-        sjx = inspect(STATISTIC_JOURNAL_CLASSES[statistic_name.statistic_journal_type]).local_table
-        units = statistic_name.units
+    def _in_interval(self, t, sjx, statistic_names, start_time, finish_time, interval):
         activity_group_id = interval.activity_group.id if interval.activity_group else None
-
-        if summary == S.MAX:
-            result = func.max(sjx.c.value)
-        elif summary == S.MIN:
-            result = func.min(sjx.c.value)
-        elif summary == S.SUM:
-            result = func.sum(sjx.c.value)
-        elif summary == S.CNT:
-            result = func.count(sjx.c.value)
-            units = None
-        elif summary == S.AVG:
-            result = func.avg(sjx.c.value)
-        elif summary == S.MSR:
-            self._calculate_measures(s, statistic_name, order_asc, start_time, finish_time, interval, measures)
-            return None, None
-        else:
-            raise Exception('Bad summary: %s' % summary)
-
-        stmt = select([result]). \
-            select_from(sjx).select_from(t.sj).select_from(t.src). \
-            where(and_(t.sj.c.id == sjx.c.id,
-                       t.sj.c.statistic_name_id == statistic_name.id,
-                       t.sj.c.time >= start_time,
-                       t.sj.c.time < finish_time,
-                       t.sj.c.source_id == t.src.c.id,
-                       t.src.c.activity_group_id == activity_group_id))
-
-        return next(s.connection().execute(stmt))[0], units
+        return and_(t.sj.c.id == sjx.c.id,
+                    t.sj.c.statistic_name_id.in_([statistic_name.id for statistic_name in statistic_names]),
+                    t.sj.c.time >= start_time,
+                    t.sj.c.time < finish_time,
+                    t.sj.c.source_id == t.src.c.id,
+                    t.src.c.activity_group_id == activity_group_id)
+
+    def _calculate_values(self, s, statistic_names, start_time, finish_time, interval):
+        '''
+        All the simple summaries (everything except measures) for the interval, with a single
+        grouped query for each journal type.  Returns a map from (statistic name id, summary) to value.
+        '''
+        t = _tables()
+        values = {}
+        for sjx, names in self._by_journal_type(statistic_names):
+            summaries = sorted(set(summary for statistic_name in names for summary in statistic_name.summaries
+                                   if summary != S.MSR))
+            for summary in summaries:
+                if summary not in AGGREGATES:
+                    raise Exception('Bad summary: %s' % summary)
+            if summaries:
+                stmt = select([t.sj.c.statistic_name_id] + [AGGREGATES[summary](sjx.c.value) for summary in summaries]). \
+                    select_from(sjx).select_from(t.sj).select_from(t.src). \
+                    where(self._in_interval(t, sjx, names, start_time, finish_time, interval)). \
+                    group_by(t.sj.c.statistic_name_id)
+                for row in s.connection().execute(stmt):
+                    for summary, value in zip(summaries, row[1:]):
+                        values[(row[0], summary)] = value
+        return values
 
     def _describe(self, statistic_name, summary, interval):
         adjective = {S.MAX: 'highest', S.MIN: 'lowest', S.SUM: 'total', S.CNT: 'number of', S.AVG: 'average'}[summary]
@@ -121,29 +129,38 @@ class SummaryCalculator(LoaderMixin, IntervalCalculatorMixin, ProcessCalculator)
             period = 'one ' + period
         return f'The {adjective} {statistic_name.title} over {period}.'
 
-    def _calculate_measures(self, s, statistic_name, order_asc, start_time, finish_time, interval, measures):
-        data = sorted([x for x in
-                       s.query(StatisticJournal).
-                      join(Source).
-                      filter(StatisticJournal.statistic_name == statistic_name,
-                             StatisticJournal.time >= start_time,
-                             StatisticJournal.time < finish_time,
-                             Source.activity_group == interval.activity_group).all()
-                       if x is not None and x.value is not None],
-                      key=lambda x: x.value, reverse=not order_asc)
-        n, local_measures = len(data), []
-        for rank, journal in enumerate(data, start=1):
-            if n > 1:
-                percentile = (n - rank) / (n - 1) * 100
-            else:
-                percentile = 100
-            measure = StatisticMeasure(statistic_journal=journal, source=interval, rank=rank, percentile=percentile)
-            local_measures.append(measure)
-            measures.append(measure)
-        if n > 8:  # avoid overlap in fuzzing (and also, plot individual points in this case)
-            for q in range(5):
-                local_measures[fuzz(n, q)].quartile = q
-        log.debug('Ranked %s' % statistic_name)
+    def _calculate_measures(self, s, statistic_names, start_time, finish_time, interval):
+        '''
+        Rank values (descending, unless the statistic has a MIN summary) using window functions,
+        with a single query for each journal type.  Returns rows for StatisticMeasure.
+        '''
+        t = _tables()
+        measures = []
+        for sjx, names in self._by_journal_type(statistic_names):
+            order_asc = dict((statistic_name.id, S.MIN in statistic_name.summaries) for statistic_name in names)
+            partition = t.sj.c.statistic_name_id
+            stmt = select([t.sj.c.id, t.sj.c.statistic_name_id,
+                           func.row_number().over(partition_by=partition, order_by=(sjx.c.value, t.sj.c.id)),
+                           func.row_number().over(partition_by=partition, order_by=(sjx.c.value.desc(), t.sj.c.id)),
+                           func.count().over(partition_by=partition)]). \
+                select_from(sjx).select_from(t.sj).select_from(t.src). \
+                where(and_(self._in_interval(t, sjx, names, start_time, finish_time, interval),
+                           sjx.c.value != None))
+            ranked = defaultdict(list)
+            for journal_id, statistic_name_id, rank_asc, rank_desc, n in s.connection().execute(stmt):
+                rank = rank_asc if order_asc[statistic_name_id] else rank_desc
+                percentile = (n - rank) / (n - 1) * 100 if n > 1 else 100
+                ranked[statistic_name_id].append({'statistic_journal_id': journal_id, 'source_id': interval.id,
+                                                  'rank': rank, 'percentile': percentile, 'quartile': None})
+            for statistic_name_id, local_measures in ranked.items():
+                local_measures = sorted(local_measures, key=lambda measure: measure['rank'])
+                n = len(local_measures)
+                if n > 8:  # avoid overlap in fuzzing (and also, plot individual points in this case)
+                    for q in range(5):
+                        local_measures[fuzz(n, q)]['quartile'] = q
+                measures.extend(local_measures)
+            log.debug('Ranked %s' % ', '.join(statistic_name.name for statistic_name in names))
+        return measures
 
     @classmethod
     def parse_title(cls, name):
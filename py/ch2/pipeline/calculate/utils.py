@@ -5,8 +5,10 @@ from sqlalchemy import not_
 from sqlalchemy.sql.functions import count
 
 from ..pipeline import ProcessPipeline, OwnerInMixin
+from ...commands.args import base_system_path, BASE
 from ...common.date import time_to_local_timeq, format_dateq
 from ...common.log import log_current_exception, log_query
+from ...data.cache import ActivityCache, ACTIVITY_CACHE
 from ...lib import local_time_to_time, to_date
 from ...lib.schedule import Schedule
 from ...sql import Timestamp, ActivityJournal, ActivityGroup, Interval
@@ -61,10 +63,26 @@ class ActivityGroupProcessCalculator(ActivityJournalProcessCalculator):
 
 class DataFrameCalculatorMixin:
 
-    def __init__(self, *args, add_serial=True, **kargs):
+    def __init__(self, *args, add_serial=True, cache=True, **kargs):
         self.__add_serial = add_serial
+        self.__cache = cache
         super().__init__(*args, **kargs)
 
+    def _activity_cache(self):
+        '''
+        the cache shared by calculators that read activity data (see ActivityCache), or None.
+        '''
+        if self.__cache:
+            return ActivityCache(base_system_path(self._config.args[BASE], subdir=ACTIVITY_CACHE))
+
+    def _prune_activity_cache(self, s):
+        '''
+        remove cached values for activities that no longer exist.
+        '''
+        cache = self._activity_cache()
+        if cache:
+            cache.prune(row[0] for row in s.query(ActivityJournal.id).all())
+
     def _run_one(self, missed):
         with self._config.db.session_context() as s:
             log.debug(f'Calculating for {missed}')
@@ -1,28 +1,35 @@
 from abc import ABC
 from collections import defaultdict, namedtuple
+from itertools import repeat
 from logging import getLogger
 
-from ..common.date import min_time, max_time
+import numpy as np
+
+from ..common.date import min_time, max_time, extend_range
 from ..common.math import is_nan
-from ..sql import StatisticName, Interval, Source
-from ..sql.tables.statistic import STATISTIC_JOURNAL_CLASSES
+from ..sql import StatisticName, Interval, Source, StatisticJournal, StatisticJournalInteger, StatisticJournalFloat
+from ..sql.batch import next_ids
+from ..sql.tables.statistic import STATISTIC_JOURNAL_CLASSES, STATISTIC_JOURNAL_TYPES
 
 log = getLogger(__name__)
 
 
 class Loader(ABC):
 
-    def __init__(self, s, owner, add_serial=True, clear_timestamp=True, batch=True):
+    def __init__(self, s, owner, add_serial=True, clear_timestamp=True, batch=True, bulk=False):
         self._s = s
         self._owner = owner
         self.__serial = 0 if add_serial else None
         self.__clear_timestamp = clear_timestamp
         self.__batch = batch
+        self.__bulk = bulk
 
         self.__statistic_name_cache = dict()
         self.__source_cache = dict()
         self._staging = defaultdict(list)
         self.__by_name_then_time = defaultdict(dict)
+        self.__frames = defaultdict(list)
+        self.__framed = dict()
         self.__add_serial = add_serial
         self._start = None
         self._finish = None
@@ -31,17 +38,59 @@ class Loader(ABC):
 
     def load(self):
         if self:
-            for type in self._staging:
-                log.debug(f'Adding {len(self._staging[type])} instances of {type}')
-                for instance in self._staging[type]:
-                    self._s.add(instance)
-                self._s.commit()
+            if self.__bulk:
+                self.__load_bulk()
+            else:
+                for type in self._staging:
+                    log.debug(f'Adding {len(self._staging[type])} instances of {type}')
+                    for instance in self._staging[type]:
+                        self._s.add(instance)
+                    self._s.commit()
             self._postload()
         else:
             log.warning('No data to load')
 
+    def __load_bulk(self):
+        # sources may be new, in which case they need ids before we can refer to them
+        self._s.flush()
+        connection = self._s.connection()
+        start, finish = None, None
+        for journal_class in set(self._staging) | set(self.__frames):
+            staged = [instance for instance in self._staging[journal_class] if instance.value is not None]
+            frames = self.__frames[journal_class]
+            # the session never sees these, so replicate the dirty logic in Source.before_flush
+            for instance in staged:
+                if not isinstance(instance.source, Interval):
+                    start, finish = extend_range(start, finish, instance.time)
+            for frame in frames:
+                if not isinstance(frame.source, Interval):
+                    start, finish = extend_range(start, finish, frame.times[0])
+                    start, finish = extend_range(start, finish, frame.times[-1])
+            rows = [(instance.statistic_name.id, instance.source.id, instance.time, instance.value, instance.serial)
+                    for instance in staged]
+            for frame in frames:
+                rows.extend(zip(repeat(frame.statistic_name.id), repeat(frame.source.id), frame.times,
+                                frame.values, repeat(None) if frame.serials is None else frame.serials))
+            if rows:
+                self.__insert(connection, journal_class, rows)
+        if start is not None:
+            Interval.record_dirty_times(self._s, start, finish)
+        self._s.commit()
+
+    def __insert(self, connection, journal_class, rows):
+        log.debug(f'Inserting {len(rows)} values for {journal_class}')
+        journal_type = int(STATISTIC_JOURNAL_TYPES[journal_class])
+        ids = next_ids(self._s, StatisticJournal.__table__, 'id', len(rows))
+        # with executemany_mode='values' these become multi-row inserts
+        connection.execute(StatisticJournal.__table__.insert(),
+                           [{'id': id, 'type': journal_type, 'statistic_name_id': statistic_name_id,
+                             'source_id': source_id, 'time': time, 'serial': serial}
+                            for id, (statistic_name_id, source_id, time, _, serial) in zip(ids, rows)])
+        connection.execute(journal_class.__table__.insert(),
+                           [{'id': id, 'value': row[3]} for id, row in zip(ids, rows)])
+
     def __bool__(self):
-        return bool(self._staging)
+        return bool(self._staging) or bool(self.__frames)
 
     def _postload(self):
         # manually clean out intervals because we're doing a fast load
@@ -49,12 +98,23 @@ class Loader(ABC):
             Interval.record_dirty_times(self._s, self._start, self._finish)
             self._s.commit()
 
-    def add_data(self, name, source, value, time):
-        if name in self.__statistic_name_cache:
-            statistic_name = self.__statistic_name_cache[name]
+    def __statistic_name(self, name):
+        if name not in self.__statistic_name_cache:
+            self.__statistic_name_cache[name] = StatisticName.from_name(self._s, name, self._owner)
+        return self.__statistic_name_cache[name]
+
+    def __source(self, source):
+        if isinstance(source, Source):
+            if source.id not in self.__source_cache:
+                self.__source_cache[source.id] = source
         else:
-            statistic_name = StatisticName.from_name(self._s, name, self._owner)
-            self.__statistic_name_cache[name] = statistic_name
+            if source not in self.__source_cache:
+                self.__source_cache[source] = Source.from_id(self._s, source)
+            source = self.__source_cache[source]
+        return source
+
+    def add_data(self, name, source, value, time):
+        statistic_name = self.__statistic_name(name)
 
         if is_nan(value):
             raise Exception(f'Bad value for {statistic_name.name}: {value}')
@@ -70,21 +130,22 @@ class Loader(ABC):
             elif time < self.__last_time:
                 raise Exception('Time travel - timestamp for statistic decreased')
 
-        if isinstance(source, Source):
-            if source.id not in self.__source_cache:
-                self.__source_cache[source.id] = source
-        else:
-            if source not in self.__source_cache:
-                self.__source_cache[source] = Source.from_id(self._s, source)
-            source = self.__source_cache[source]
+        source = self.__source(source)
+
+        if statistic_name.name in self.__framed and time in self.__framed[statistic_name.name]:
+            raise Exception(f'Conflict at ({time}) for {statistic_name.name} (already added from frame)')
 
         self._start = min_time(self._start, time)
         self._finish = max_time(self._finish, time)
 
-        # set statistic_name and source (as well as ids) so that we can correctly test in
-        # Source for dirty intervals
-        instance = journal_class(statistic_name=statistic_name, statistic_name_id=statistic_name.id,
-                                 source=source, source_id=source.id, value=value, time=time, serial=self.__serial)
+        if self.__bulk:
+            instance = Staged(statistic_name, source, value, time, self.__serial)
+        else:
+            # set statistic_name and source (as well as ids) so that we can correctly test in
+            # Source for dirty intervals
+            instance = journal_class(statistic_name=statistic_name, statistic_name_id=statistic_name.id,
+                                     source=source, source_id=source.id, value=value, time=time,
+                                     serial=self.__serial)
 
         if instance.time in self.__by_name_then_time[statistic_name.name]:
             previous = self.__by_name_then_time[statistic_name.name][instance.time]
@@ -100,6 +161,71 @@ class Loader(ABC):
         self._staging[journal_class].append(instance)
         self.__counts[statistic_name.name] += 1
 
+    def add_frame(self, df, columns, source):
+        '''
+        Add values from a dataframe indexed by time.  Columns is a list of names or a map from column
+        to statistic name.  Missing (NaN) values are skipped.
+
+        With bulk loading, numeric columns are staged as arrays (rather than individual values),
+        which is much faster than calling add_data for each row.
+        '''
+        if not isinstance(columns, dict):
+            columns = {column: column for column in columns}
+        # columns with no values are never resolved (as with add_data, which never sees them)
+        columns = {column: self.__statistic_name(name) for column, name in columns.items()
+                   if column in df.columns and df[column].notna().any()}
+        if not columns or df.empty: return
+        source = self.__source(source)
+        if self.__bulk and self.__can_stage_frame(df, columns):
+            self.__stage_frame(df, columns, source)
+        else:
+            for time, row in df[list(columns)].iterrows():
+                for column, statistic_name in columns.items():
+                    if not is_nan(row[column]):
+                        self.add_data(statistic_name.name, source, row[column], time)
+
+    def __can_stage_frame(self, df, columns):
+        # anything unusual (duplicates, non-numeric data) goes via add_data
+        if not (df.index.is_monotonic_increasing and df.index.is_unique): return False
+        for statistic_name in columns.values():
+            if STATISTIC_JOURNAL_CLASSES[statistic_name.statistic_journal_type] \
+                    not in (StatisticJournalInteger, StatisticJournalFloat):
+                return False
+            if statistic_name.name in self.__by_name_then_time or statistic_name.name in self.__framed:
+                return False
+        return True
+
+    def __stage_frame(self, df, columns, source):
+        valid = df[list(columns)].notna().values
+        rows = valid.any(axis=1)
+        if not rows.any(): return
+        index, valid = df.index[rows], valid[rows]
+        serials = self.__frame_serials(index)
+        times = np.array(index.to_pydatetime())
+        for (column, statistic_name), mask in zip(columns.items(), valid.T):
+            if not mask.any(): continue
+            journal_class = STATISTIC_JOURNAL_CLASSES[statistic_name.statistic_journal_type]
+            values = df[column].values[rows][mask]
+            values = values.astype(np.int64 if journal_class == StatisticJournalInteger else np.float64)
+            frame = Frame(statistic_name, source, times[mask], values.tolist(),
+                          None if serials is None else serials[mask].tolist())
+            self.__frames[journal_class].append(frame)
+            self.__framed[statistic_name.name] = index[mask]
+            self.__counts[statistic_name.name] += len(frame.times)
+        self._start = min_time(self._start, times[0])
+        self._finish = max_time(self._finish, times[-1])
+
+    def __frame_serials(self, index):
+        # the same as calling add_data for each row, in order
+        if not self.__add_serial: return None
+        if self.__last_time is not None and index[0] < self.__last_time:
+            raise Exception('Time travel - timestamp for statistic decreased')
+        increments = np.ones(len(index), dtype=np.int64)
+        increments[0] = 0 if self.__last_time is None or index[0] == self.__last_time else 1
+        serials = self.__serial + np.cumsum(increments)
+        self.__serial, self.__last_time = int(serials[-1]), index[-1].to_pydatetime()
+        return serials
+
     def _resolve_duplicate(self, name, instance, prev):
         raise Exception(f'Conflict at ({instance.time}) for {name} '
                         f'(values {instance.value}/{prev.value})')
@@ -122,6 +248,24 @@ class Loader(ABC):
             yield name, 100 * count / total
 
 
+Frame = namedtuple('Frame', 'statistic_name, source, times, values, serials')
+
+
+class Staged:
+    '''
+    A statistic waiting to be bulk loaded (the same attributes as a StatisticJournal, but not in the ORM).
+    '''
+
+    __slots__ = ('statistic_name', 'source', 'value', 'time', 'serial')
+
+    def __init__(self, statistic_name, source, value, time, serial):
+        self.statistic_name = statistic_name
+        self.source = source
+        self.value = value
+        self.time = time
+        self.serial = serial
+
+
 def make_waypoint(names, extra=None):
     names = list(names)
     if extra:
@@ -5,7 +5,7 @@ from logging import getLogger
 from sqlalchemy.sql.functions import count
 
 from .loader import Loader
-from ..commands.args import LOG, WORKER, DEV, PROCESS, CPROFILE
+from ..commands.args import LOG, WORKER, DEV, PROCESS, CPROFILE, KARG
 from ..common.args import mm
 from ..common.global_ import global_dev
 from ..common.names import BASE, UNDEF
@@ -120,23 +120,28 @@ class ProcessPipeline(BasePipeline):
             missing = self.__args
         else:
             missing = [missed.strip('"') for missed in self.missing()]
+        self.run_missing(missing)
+        self.shutdown()
+
+    def run_missing(self, missing):
         for missed in missing:
             self._run_one(missed)
-        self.shutdown()
 
     def _run_one(self, missed):
         # this should accept strings
         raise NotImplementedError('_run_one(missed)')
 
-    def command_for_missing(self, pipeline, missing, log_name):
+    def command_for_missing(self, pipeline, missing, log_name, kargs=None):
         from .process import fmt_cmd
         cprofile = ''
         if self.cprofile:
             cprofile = ' ' + mm(CPROFILE)
             if self.cprofile[0]:
                 cprofile = ' ' + self.cprofile[0]
+        # kargs from the command line (-K) are passed on so that workers are configured like the parent
+        kargs = ''.join(f' {mm(KARG)} "{name}={value}"' for name, value in (kargs or {}).items())
         cmd = self.__ch2 + f'{cprofile} {mm(LOG)} {log_name} {mm(URI)} {self._config.args._format(URI)} ' \
-                           f'{PROCESS} {mm(WORKER)} {pipeline.id} {" ".join(missing)}'
+                           f'{PROCESS} {mm(WORKER)} {pipeline.id}{kargs} {" ".join(missing)}'
         log.debug(fmt_cmd(cmd))
         return cmd
 
@@ -157,9 +162,10 @@ class ProcessPipeline(BasePipeline):
 
 class LoaderMixin:
 
-    def __init__(self, config, *args, batch=True, **kargs):
+    def __init__(self, config, *args, batch=True, bulk=True, **kargs):
         super().__init__(config, *args, **kargs)
         self.__batch = batch
+        self.__bulk = bulk
 
     def _get_loader(self, s, add_serial=None, cls=Loader, **kargs):
         if 'owner' not in kargs:
@@ -171,6 +177,8 @@ class LoaderMixin:
         if 'batch' not in kargs:
             kargs['batch'] = self.__batch
             self.__batch = False  # only set once or we get multiple callbacks
+        if 'bulk' not in kargs:
+            kargs['bulk'] = self.__bulk
         return cls(s, **kargs)
 
 
@@ -1,18 +1,29 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from logging import getLogger
-from multiprocessing import cpu_count
+from multiprocessing import cpu_count, get_context
+from multiprocessing.connection import wait
+from os import getpid
 from os.path import join, exists
 from time import sleep
 
+import numpy as np
+from math import ceil
 from psutil import NoSuchProcess
 
-from ..commands.args import LOG, LOG_DIR
+from ..commands.args import LOG, LOG_DIR, CPROFILE
+from ..common.args import mm
 from ..common.date import now, format_seconds, time_to_local_time
+from ..common.log import log_current_exception, redirect_log
 from ..sql import PipelineType, Interval, Pipeline
 from ..sql.tables.pipeline import sort_pipelines
 
 log = getLogger(__name__)
 
+POOL = 'pool'
+# assumed fixed cost (s) of a batch, before it can be measured
+COMMAND_STARTUP = 2.0
+POOL_STARTUP = 0.01
+
 
 def run_pipeline(config, type, *args, like=tuple(), worker=None, **extra_kargs):
     if type == PipelineType.PROCESS:
@@ -40,14 +51,16 @@ def instantiate_pipeline(pipeline, config, *args, **kargs):
 
 class ProcessRunner:
 
-    def __init__(self, config, pipelines, *args, worker=None, n_cpu=cpu_count(), load=1, **kargs):
+    def __init__(self, config, pipelines, *args, worker=None, n_cpu=cpu_count(), load=1, pool=False, **kargs):
         if worker and len(pipelines) > 1: raise Exception('Worker with multiple pipelines')
         if not pipelines: raise Exception('No pipelines')
+        if pool and kargs.get(CPROFILE): raise Exception(f'{mm(CPROFILE)} cannot be used with pool')
         self.__config = config
         self.__pipelines = pipelines
         self.__worker = worker
         self.__n_cpu = n_cpu
         self.__load = load
+        self.__pool = pool
         self.__args = args
         self.__kargs = kargs
         self.__max_wait = 0
@@ -59,7 +72,16 @@ class ProcessRunner:
             for pipeline in self.__pipelines:
                 self.__run_local(pipeline)
         else:
-            self.__run_commands(DependencyQueue(self.__config, self.__pipelines, self.__kargs))
+            # pooled workers are already running, so a batch costs little more than its items
+            queue = DependencyQueue(self.__config, self.__pipelines, self.__kargs, capacity=self.__capacity(),
+                                    startup=POOL_STARTUP if self.__pool else COMMAND_STARTUP)
+            if self.__pool:
+                self.__run_pool(queue)
+            else:
+                self.__run_commands(queue)
+
+    def __capacity(self):
+        return max(1, int(self.__n_cpu * self.__load))
 
     def __run_local(self, pipeline):
         log.info(f'Running pipeline {pipeline} locally with {self.__kargs}')
@@ -68,11 +90,12 @@ class ProcessRunner:
 
     def __run_commands(self, queue):
         log.info('Scheduling worker pipelines')
-        capacity = max(1, int(self.__n_cpu * self.__load))
+        capacity = self.__capacity()
         pipelines, popens = {}, []
         while True:
             try:
-                pipeline, cmd, log_index = queue.pop()
+                pipeline, missing, log_index = queue.pop()
+                cmd = queue.command_for_missing(pipeline, missing, log_index)
                 popen = self.__config.run_process(pipeline.cls, cmd, log_name(pipeline, log_index),
                                                   constraint=pipeline.id)
                 pipelines[popen] = (pipeline, log_index)
@@ -86,10 +109,58 @@ class ProcessRunner:
                 else:
                     log.debug('Done')
                     queue.shutdown()
-                    log.info(f'Maximum wait {format_seconds(self.__max_wait)} for {self.__max_wait_proc} '
-                             f'with {self.__max_wait_procs} processes')
+                    self.__log_max_wait()
                     return
 
+    def __log_max_wait(self):
+        log.info(f'Maximum wait {format_seconds(self.__max_wait)} for {self.__max_wait_proc} '
+                 f'with {self.__max_wait_procs} processes')
+
+    def __record_wait(self, start, pipeline, n_procs):
+        duration = (now() - start).total_seconds()
+        log.debug(f'Waited {format_seconds(duration)}')
+        if duration > self.__max_wait:
+            self.__max_wait = duration
+            self.__max_wait_procs = n_procs
+            self.__max_wait_proc = str(pipeline)
+
+    def __run_pool(self, queue):
+        log.info('Scheduling pooled workers')
+        pool = WorkerPool(self.__config, self.__capacity(), queue.worker_kargs)
+        try:
+            while True:
+                try:
+                    pipeline, missing, log_index = queue.pop()
+                    pool.submit(pipeline, missing, log_index)
+                    if pool.full:
+                        self.__wait_for_pool(pool, queue)
+                except EmptyException:
+                    if pool.busy:
+                        log.debug('Nothing new to add')
+                        self.__wait_for_pool(pool, queue)
+                    else:
+                        log.debug('Done')
+                        queue.shutdown()
+                        self.__log_max_wait()
+                        return
+        finally:
+            pool.close()
+
+    def __wait_for_pool(self, pool, queue):
+        queue.log()
+        start = now()
+        log.debug('Waiting for a worker to complete')
+        pipeline, log_index, error, worker_log = pool.next_complete()
+        self.__record_wait(start, pipeline, pool.busy + 1)
+        queue.complete(pipeline, log_index)
+        if error:
+            msg = f'Worker for {pipeline} failed: {error} see {worker_log} for more info'
+            log.warning(msg)
+            self._copy_log(worker_log)
+            raise Exception(msg)
+        if queue.is_complete(pipeline):
+            pool.stop(pipeline)
+
     def _run_til_next(self, pipelines, popens, queue):
         queue.log()
         start = now()
@@ -100,13 +171,8 @@ class ProcessRunner:
                 process = self.__config.get_process(pipelines[popen][0].cls, popen.pid)
                 if popen.returncode is not None:
                     del popens[i]
-                    duration = (now() - start).total_seconds()
-                    log.debug(f'Waited {format_seconds(duration)}')
                     pipeline, log_index = pipelines.pop(popen)
-                    if duration > self.__max_wait:
-                        self.__max_wait = duration
-                        self.__max_wait_procs = len(pipelines) + 1
-                        self.__max_wait_proc = str(pipeline)
+                    self.__record_wait(start, pipeline, len(pipelines) + 1)
                     self.__config.delete_process(pipeline.cls, popen.pid)
                     queue.complete(pipeline, log_index)
                     if popen.returncode:
@@ -149,9 +215,149 @@ class ProcessRunner:
 class EmptyException(Exception): pass
 
 
+Worker = namedtuple('Worker', 'pipeline, process, connection, log')
+
+
+class WorkerPool:
+    '''
+    Long-lived worker processes, as an alternative to starting a new ch2 command for each batch.
+
+    Each worker is forked for a single pipeline, instantiates it once (with its own database connection)
+    and then runs batches of missing values sent over a pipe, replying when each is done.
+    Workers are started on demand (up to capacity), re-used for later batches of the same pipeline,
+    and stopped when the pipeline completes (or the slot is needed by another pipeline).
+    Workers are recorded in the process table, like commands, and each logs to its own file.
+    '''
+
+    def __init__(self, config, capacity, kargs=None):
+        self.__config = config
+        self.__kargs = kargs or {}
+        self.__capacity = capacity
+        self.__context = get_context('fork')
+        self.__idle = defaultdict(list)  # pipeline: [worker]
+        self.__busy = {}  # connection: (worker, log_index)
+        self.__n_started = 0
+
+    @property
+    def busy(self):
+        return len(self.__busy)
+
+    @property
+    def full(self):
+        return self.busy >= self.__capacity
+
+    def __size(self):
+        return self.busy + sum(len(workers) for workers in self.__idle.values())
+
+    def submit(self, pipeline, missing, log_index):
+        if self.__idle[pipeline]:
+            worker = self.__idle[pipeline].pop()
+        else:
+            if self.__size() >= self.__capacity:
+                self.__stop_idle()
+            worker = self.__start(pipeline)
+        log.debug(f'{pipeline}: sending batch {log_index} to worker {worker.process.pid}')
+        worker.connection.send(missing)
+        self.__busy[worker.connection] = (worker, log_index)
+
+    def __start(self, pipeline):
+        # close pooled database connections so that they are not shared with the child
+        self.__config.db.engine.dispose()
+        connection, child = self.__context.Pipe()
+        self.__n_started += 1
+        worker_log = log_name(pipeline, f'{POOL}-{self.__n_started}')
+        process = self.__context.Process(target=run_worker,
+                                         args=(self.__config, pipeline, child, self.__kargs, worker_log),
+                                         name=str(pipeline), daemon=True)
+        process.start()
+        child.close()
+        log.debug(f'Started worker {process.pid} for {pipeline} (logging to {worker_log})')
+        self.__config.add_process(pipeline.cls, process.pid, f'pool worker for {pipeline}',
+                                  worker_log, constraint=pipeline.id)
+        return Worker(pipeline, process, connection, worker_log)
+
+    def __stop_idle(self):
+        for pipeline, workers in self.__idle.items():
+            if workers:
+                self.__stop(workers.pop())
+                return
+        raise Exception('No idle worker to stop')
+
+    def __stop(self, worker):
+        log.debug(f'Stopping worker {worker.process.pid} for {worker.pipeline}')
+        try:
+            worker.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        worker.process.join(10)
+        worker.connection.close()
+        self.__config.delete_process(worker.pipeline.cls, worker.process.pid)
+
+    def stop(self, pipeline):
+        for worker in self.__idle.pop(pipeline, []):
+            self.__stop(worker)
+
+    def next_complete(self):
+        '''
+        Block until a worker finishes a batch (or dies) and return (pipeline, log_index, error, log name).
+        '''
+        sentinels = {worker.process.sentinel: connection for connection, (worker, _) in self.__busy.items()}
+        ready = wait(list(self.__busy) + list(sentinels))[0]
+        connection = sentinels.get(ready, ready)
+        worker, log_index = self.__busy.pop(connection)
+        try:
+            error = connection.recv()
+            self.__idle[worker.pipeline].append(worker)
+        except EOFError:
+            worker.process.join()
+            error = f'worker {worker.process.pid} exited with code {worker.process.exitcode}'
+            self.__config.delete_process(worker.pipeline.cls, worker.process.pid)
+        return worker.pipeline, log_index, error, worker.log
+
+    def close(self):
+        for pipeline in list(self.__idle):
+            self.stop(pipeline)
+        for worker, _ in self.__busy.values():
+            log.warning(f'Killing worker {worker.process.pid} for {worker.pipeline}')
+            worker.process.kill()
+            worker.process.join()
+            self.__config.delete_process(worker.pipeline.cls, worker.process.pid)
+        self.__busy = {}
+
+
+def run_worker(config, pipeline, connection, kargs, worker_log):
+    # forked, so don't share the parent's database connections or log file
+    config.reset()
+    redirect_log(join(config.args._format_path(LOG_DIR), worker_log))
+    instance = instantiate_pipeline(pipeline, config, id=pipeline.id, worker=True, **kargs)
+    instance.startup()
+    log.debug(f'Worker {getpid()} ready for {pipeline}')
+    while True:
+        missing = connection.recv()
+        if missing is None: break
+        try:
+            instance.run_missing([missed.strip('"') for missed in missing])
+            connection.send(None)
+        except Exception as e:
+            log_current_exception()
+            connection.send(str(e))
+    instance.shutdown()
+
+
 class DependencyQueue:
 
-    def __init__(self, config, pipelines, kargs, min_missing=1, max_missing=20, gamma=0.4):
+    '''
+    Orders pipelines by their dependencies and divides their missing values into batches.
+
+    Batch size is chosen from the measured cost of earlier batches for the same pipeline, fitted as
+    a fixed (startup) cost plus a cost per item.  Batches are large enough that startup is a small
+    fraction (overhead) of the total, but no more than a fair share of what remains (so that work is
+    not left to one worker at the end), and expected to take no longer than max_time seconds (which
+    limits the work lost if a batch fails).  Before any batch has completed, total ** gamma is used.
+    '''
+
+    def __init__(self, config, pipelines, kargs, capacity=1, min_missing=1, max_time=600, gamma=0.4,
+                 overhead=0.1, startup=COMMAND_STARTUP):
         self.__clean_pipelines(pipelines)
         self.__config = config
         self.__blocked = [pipeline for pipeline in pipelines if pipeline.blocked_by]
@@ -161,9 +367,12 @@ class DependencyQueue:
         self.__stats = {}  # pipeline: Stats
         self.__order = []
         self.__kargs = kargs
-        self.__max_missing = max_missing
+        self.__max_time = max_time
         self.__min_missing = min_missing
         self.__gamma = gamma
+        self.__capacity = capacity
+        self.__overhead = overhead
+        self.__startup = startup
         self.__active_log_indices = defaultdict(lambda: set())
         self.__start = now()
         # clear out any junk from previous errors?
@@ -227,18 +436,32 @@ class DependencyQueue:
             if missing:
                 log_index = self.__unused_log_index(pipeline)
                 missing_args, missing = self.__split_missing(pipeline, missing)
-                cmd = instance.command_for_missing(pipeline, missing_args, log_name(pipeline, log_index))
                 self.__active[pipeline] = instance, missing
                 self.__order.append(pipeline)
                 log.debug(f'{pipeline}: starting batch of {len(missing_args)} missing values')
                 self.__stats[pipeline].start(log_index, len(missing_args))
-                return pipeline, cmd, log_index
+                return pipeline, missing_args, log_index
             else:
                 log.debug(f'{pipeline} exhausted')
                 self.__active[pipeline] = instance, None
                 self.__order.append(pipeline)
         raise EmptyException()
 
+    @property
+    def worker_kargs(self):
+        '''
+        kargs (from the command line) that are passed on to workers (cprofile is handled separately).
+        '''
+        return {name: value for name, value in self.__kargs.items() if name != CPROFILE}
+
+    def command_for_missing(self, pipeline, missing, log_index):
+        instance, _ = self.__active[pipeline]
+        return instance.command_for_missing(pipeline, missing, log_name(pipeline, log_index),
+                                            kargs=self.worker_kargs)
+
+    def is_complete(self, pipeline):
+        return pipeline in self.__complete
+
     def __unused_log_index(self, pipeline):
         index = 0
         while index in self.__active_log_indices[pipeline]: index += 1
@@ -258,15 +481,25 @@ class DependencyQueue:
         for pipeline in self.__stats:
             process_time += self.__stats[pipeline].duration_individual
         speedup = process_time / clock_time
+        utilisation = 100 * speedup / self.__capacity
         log.info(f'Clock time: {format_seconds(clock_time)}; Process time: {format_seconds(process_time)}; '
-                 f'Speedup: x{speedup:.1f}')
-        log.info(f'Missing args: min {self.__min_missing}; max {self.__max_missing}; gamma {self.__gamma}')
+                 f'Speedup: x{speedup:.1f}; Utilisation: {utilisation:.0f}% of {self.__capacity} workers')
+        log.info(f'Missing args: min {self.__min_missing}; max time {self.__max_time}s; gamma {self.__gamma}; '
+                 f'overhead {self.__overhead}; startup {self.__startup}s')
+        for pipeline in self.__stats:
+            self.__stats[pipeline].log_schedule(self.__startup)
 
     def __split_missing(self, pipeline, missing):
-        # this (min, min) is a bit weird but makes sense, i think
-        n = min(len(missing),
-                max(self.__min_missing,
-                    min(self.__max_missing, int(pow(self.__stats[pipeline].total, self.__gamma)))))
+        stats = self.__stats[pipeline]
+        estimate = stats.estimate(self.__startup)
+        if estimate:
+            fixed, per_item = estimate
+            n = ceil(fixed / (self.__overhead * per_item))
+            n = min(n, int(max(self.__max_time - fixed, 0) / per_item))
+        else:
+            n = int(pow(stats.total, self.__gamma))
+        n = min(n, ceil(len(missing) / self.__capacity))
+        n = min(len(missing), max(self.__min_missing, n))
         return missing[:n], missing[n:]
 
     def shutdown(self):
@@ -293,6 +526,7 @@ class Stats:
         self.__start_overall = now()
         self.__start_individual = {}
         self.__size = {}
+        self.__batches = []  # (size, duration)
 
     def start(self, index, n):
         self.__start_individual[index] = now()
@@ -303,10 +537,34 @@ class Stats:
         log.info(f'{self.__pipeline}: {self.__size[index]} completed')
         self.active -= 1
         self.done += self.__size[index]
-        self.duration_individual += (now() - self.__start_individual[index]).total_seconds()
+        duration = (now() - self.__start_individual[index]).total_seconds()
+        self.duration_individual += duration
+        self.__batches.append((self.__size[index], duration))
         if self:
             self.duration_overall = (now() - self.__start_overall).total_seconds()
 
+    def estimate(self, startup):
+        '''
+        Fixed and per-item costs (seconds) from the completed batches.
+        If a linear fit isn't possible (or isn't sensible), assume startup as the fixed cost (if not
+        larger than the batches themselves).
+        '''
+        if not self.__batches: return None
+        sizes, durations = np.array(self.__batches, dtype=float).T
+        if len(set(sizes)) > 1:
+            per_item, fixed = np.polyfit(sizes, durations, 1)
+            if per_item > 0 and fixed >= 0:
+                return fixed, per_item
+        fixed = min(startup, 0.5 * durations.min())
+        per_item = max(durations.sum() - fixed * len(durations), 1e-3) / sizes.sum()
+        return fixed, per_item
+
+    def log_schedule(self, startup):
+        if self.__batches:
+            fixed, per_item = self.estimate(startup)
+            log.info(f'{self.__pipeline}: batches {[size for size, _ in self.__batches]}; '
+                     f'fixed {fixed:.2f}s; per item {per_item:.2f}s')
+
     def __bar(self, width):
         solid = int(width * self.done / self.total) if self.total else width
         blank = width - solid
@@ -198,6 +198,8 @@ class ActivityReader(LoaderMixin, ProcessFitReader):
         self._save_name(s, ajournal, file_scan)
         self.__ajournal = ajournal
 
+        elevations = self.__raw_elevations(records)
+
         if not have_timespan:
             first_timestamp = only_records[0].timestamp
             log.warning('Experimental handling of data without timespans')
@@ -240,7 +242,7 @@ class ActivityReader(LoaderMixin, ProcessFitReader):
                         loader.add_data(N.SPHERICAL_MERCATOR_X, ajournal, x, timestamp)
                         loader.add_data(N.SPHERICAL_MERCATOR_Y, ajournal, y, timestamp)
                         if self.add_elevation:
-                            elevation = self.__oracle.elevation(lat, lon)
+                            elevation = elevations.get(timestamp, None)
                             if elevation:
                                 loader.add_data(N.RAW_ELEVATION, ajournal, elevation, timestamp)
                 else:
@@ -262,6 +264,26 @@ class ActivityReader(LoaderMixin, ProcessFitReader):
             log.warning('Cleaning up dangling timespan')
             timespan.finish = final_timestamp
 
+    def __raw_elevations(self, records):
+        '''
+        Elevations for all positions in the records, looked up together (keyed by timestamp).
+        '''
+        fields = dict((title, field) for field, title, units, type in self.record_to_db)
+        if not self.add_elevation or T.LATITUDE not in fields or T.LONGITUDE not in fields: return {}
+        timestamps, lats, lons, last_timestamp = [], [], [], to_time(0.0)
+        for record in records:
+            if record.name == 'record':
+                if record.value.timestamp > last_timestamp:
+                    lat, lon = (record.data.get(fields[title], None) for title in (T.LATITUDE, T.LONGITUDE))
+                    if lat is not None and lon is not None and \
+                            lat[0][0] is not None and lon[0][0] is not None:
+                        timestamps.append(record.value.timestamp)
+                        lats.append(lat[0][0])
+                        lons.append(lon[0][0])
+                last_timestamp = record.value.timestamp
+        elevations = self.__oracle.elevation_many(lats, lons)
+        return {} if elevations is None else dict(zip(timestamps, elevations.tolist()))
+
     def _read(self, s, path):
         loader = super()._read(s, path)
         for title, percent in loader.coverage_percentages():
@@ -25,8 +25,9 @@ class AbortImportButMarkScanned(AbortImport):
 
 class ProcessFitReader(ProcessPipeline):
 
-    def __init__(self, config, *args, sub_dir=None, **kargs):
+    def __init__(self, config, *args, sub_dir=None, hash_all=False, **kargs):
         self.sub_dir = sub_dir
+        self.hash_all = hash_all  # if false, only hash files whose size or modification time have changed
         super().__init__(config, *args, **kargs)
 
     def _all_paths(self):
@@ -39,7 +40,8 @@ class ProcessFitReader(ProcessPipeline):
         return iglob(join(data_dir, '**/*' + DOT_FIT), recursive=True)
 
     def _missing(self, s):
-        return [file_scan.path for file_scan in modified_file_scans(s, self._all_paths(), self.owner_out)]
+        return [file_scan.path for file_scan in modified_file_scans(s, self._all_paths(), self.owner_out,
+                                                                     hash_all=self.hash_all)]
 
     def _run_one(self, missed):
         with self._config.db.session_context() as s:
@@ -1,3 +1,3 @@
 
-from .tree import CLRTree, CQRTree, CERTree, LLRTree, LQRTree, LERTree, MatchType
+from .tree import CLRTree, CQRTree, CERTree, LLRTree, LQRTree, LERTree, CPRTree, LPRTree, MatchType
 
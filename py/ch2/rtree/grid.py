@@ -0,0 +1,121 @@
+from logging import getLogger
+
+import numpy as np
+
+from .spherical import RADIUS, RADIAN
+
+log = getLogger(__name__)
+
+
+'''
+A fixed-size grid (a hash of cells) for finding all close pairs of points in one pass.
+
+This is an alternative to the trees when all the points are known in advance and we only
+need to know which are near each other - each point is binned into a cell the size of the
+search distance, so candidates are in the same or an adjacent cell, and the work is done
+with numpy sorts and searches rather than point-by-point in Python.
+'''
+
+
+def to_xy(lon, lat, lon0=None, lat0=None):
+    '''
+    Convert arrays of (lon, lat) to (x, y) in m, using a local tangent at (lon0, lat0)
+    (by default, the first longitude and mean latitude).
+    '''
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    lon0 = lon[0] if lon0 is None else lon0
+    lat0 = np.mean(lat) if lat0 is None else lat0
+    dlon = (lon - lon0 + 180) % 360 - 180
+    return RADIUS * RADIAN * dlon * np.cos(lat0 * RADIAN), RADIUS * RADIAN * (lat - lat0)
+
+
+def close_pairs(x, y, distance):
+    '''
+    All (ordered) pairs of indices (i, j), i != j, where the points are within `distance` in
+    both x and y (ie where boxes of half-width distance / 2 around each point overlap).
+    '''
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if not len(x):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    ix, iy = np.floor(x / distance).astype(np.int64), np.floor(y / distance).astype(np.int64)
+    ix, iy = ix - ix.min() + 1, iy - iy.min() + 1  # leave room for neighbours below
+    width = iy.max() + 2
+    keys = ix * width + iy
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    all_i, all_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            target = keys + dx * width + dy
+            lo = np.searchsorted(sorted_keys, target, side='left')
+            hi = np.searchsorted(sorted_keys, target, side='right')
+            counts = hi - lo
+            total = counts.sum()
+            if total:
+                i = np.repeat(np.arange(len(keys)), counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                j = order[np.repeat(lo, counts) + offsets]
+                all_i.append(i)
+                all_j.append(j)
+    i, j = np.concatenate(all_i), np.concatenate(all_j)
+    keep = (i != j) & (np.abs(x[i] - x[j]) <= distance) & (np.abs(y[i] - y[j]) <= distance)
+    return i[keep], j[keep]
+
+
+def close_lon_lat_pairs(lon, lat, distance, band=1.0):
+    '''
+    As close_pairs, but for points given as (lon, lat) in degrees (distance in m).
+
+    A single tangent plane distorts the x scale away from its latitude, so points are projected
+    separately for each band of latitude (plus a margin so that neighbours in other bands are seen).
+    Each projection uses the band's highest latitude, where a degree of longitude is shortest, so
+    every close pair is a candidate; candidates are then checked with the scale at the pair itself.
+    '''
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    if not len(lon):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    margin = distance / (RADIUS * RADIAN)  # in degrees of latitude
+    bands = np.floor(lat / band).astype(np.int64)
+    all_i, all_j = [], []
+    for b in np.unique(bands):
+        lo, hi = b * band - margin, (b + 1) * band + margin
+        nearby = np.nonzero((lat >= lo) & (lat <= hi))[0]
+        x, y = to_xy(lon[nearby], lat[nearby], lon0=lon[nearby[0]], lat0=min(89.0, max(abs(lo), abs(hi))))
+        i, j = close_pairs(x, y, distance)
+        i, j = nearby[i], nearby[j]
+        core = bands[i] == b  # each pair is found from the band of its first point
+        all_i.append(i[core])
+        all_j.append(j[core])
+    i, j = np.concatenate(all_i), np.concatenate(all_j)
+    dlon = (lon[i] - lon[j] + 180) % 360 - 180
+    dx = RADIUS * RADIAN * dlon * np.cos(0.5 * (lat[i] + lat[j]) * RADIAN)
+    dy = RADIUS * RADIAN * (lat[i] - lat[j])
+    keep = (np.abs(dx) <= distance) & (np.abs(dy) <= distance)
+    return i[keep], j[keep]
+
+
+def overlap_counts(lon, lat, ids, ranks, distance):
+    '''
+    For points labelled by `ids` (eg activity), each with a `rank` (the order in which they were
+    added, with existing data having the lowest rank), count how many distinct positions with lower
+    rank are close to some point of each id.
+
+    As when querying an rtree, a position is counted once per id however many points (of however
+    many earlier ids) are there, and is credited to the first of those points.
+
+    Returns a dict from (id, earlier id) to count.
+    '''
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    ids, ranks = np.asarray(ids), np.asarray(ranks)
+    i, j = close_lon_lat_pairs(lon, lat, distance)
+    later = ranks[i] > ranks[j]
+    i, j = i[later], j[later]
+    if not len(i):
+        return {}
+    order = np.argsort(j, kind='stable')
+    i, j = i[order], j[order]
+    _, first = np.unique(np.stack([ids[i].astype(float), lon[j], lat[j]], axis=1), axis=0, return_index=True)
+    i, j = i[first], j[first]
+    pairs, counts = np.unique(np.stack([ids[i], ids[j]], axis=1), axis=0, return_counts=True)
+    log.debug(f'Found {len(i)} close positions between {len(pairs)} pairs')
+    return dict(((a, b), n) for (a, b), n in zip(pairs.tolist(), counts.tolist()))
@@ -2,7 +2,7 @@ from logging import getLogger
 
 from math import pi, cos
 
-from .tree import LinearMixin, BaseTree, QuadraticMixin, ExponentialMixin, CartesianMixin
+from .tree import LinearMixin, BaseTree, QuadraticMixin, ExponentialMixin, CartesianMixin, PackedTree
 
 log = getLogger(__name__)
 
@@ -63,6 +63,9 @@ class SQRTree(QuadraticMixin, SphericalMixin, BaseTree): pass
 class SERTree(ExponentialMixin, SphericalMixin, BaseTree): pass
 
 
+class SPRTree(SphericalMixin, PackedTree): pass
+
+
 class Global:
     '''
     Tile a globe.
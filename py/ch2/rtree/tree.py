@@ -1,6 +1,9 @@
 
 from abc import ABC, abstractmethod
 from enum import IntEnum
+from math import ceil, sqrt
+
+import numpy as np
 
 
 class MatchType(IntEnum):
@@ -185,11 +188,37 @@ class BaseTree(ABC):
         '''
         Add a sequence of (point, value) pairs.
 
+        If the tree is empty the items are bulk loaded (Sort-Tile-Recursive), which is much faster
+        than adding them one at a time and gives a well-packed tree.
+
         `border` is added to the MBR (eg to account for errors).
         '''
         if items:
-            for points, value in items:
-                self.add(points, value, border=border)
+            if self.__size:
+                for points, value in items:
+                    self.add(points, value, border=border)
+            else:
+                self.__bulk_load(items, border)
+
+    def __bulk_load(self, items, border):
+        '''
+        Internal add of all items to an empty tree, building nodes bottom-up.
+        '''
+        border = self.__default_border if border is None else border
+        entries = []
+        for points, value in items:
+            self._check_points(points)
+            points = self._normalize_points(points)
+            content = (points, value)
+            entries.append((self._mbr_of_points(points, border=border), content))
+            self.__update_state(1, content)
+        height = 0
+        while len(entries) > self.__max_entries:
+            xs, ys = zip(*(self._centre_of_mbr(mbr) for mbr, _ in entries))
+            groups = [[entries[i] for i in group] for group in sort_tile_recursive(xs, ys, self.__max_entries)]
+            entries = [(self._mbr_of_entries(*group), (height, group)) for group in groups]
+            height += 1
+        self.__root = (height, entries)
 
     def __update_state(self, delta, content):
         '''
@@ -564,6 +593,10 @@ class BaseTree(ABC):
     def _area_of_mbr(self, mbr):
         raise NotImplementedError()
 
+    @abstractmethod
+    def _centre_of_mbr(self, mbr):
+        raise NotImplementedError()
+
     # allow different split algorithms
 
     @abstractmethod
@@ -579,6 +612,26 @@ class BaseTree(ABC):
         raise NotImplementedError()
 
 
+def sort_tile_recursive(xs, ys, max_entries):
+    '''
+    Group entries (with centres xs, ys) into nodes for Sort-Tile-Recursive packing.
+
+    Entries are sorted by x and cut into vertical slices, then each slice is sorted by y and cut
+    into nodes.  Cuts are as even as possible so that (for more than max_entries entries) every
+    node has at least max_entries // 2 children.
+
+    Returns a list of index arrays, one per node.
+    '''
+    xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+    n = len(xs)
+    n_slices = max(1, min(ceil(sqrt(ceil(n / max_entries))), n // max_entries))
+    groups = []
+    for slice in np.array_split(np.argsort(xs, kind='stable'), n_slices):
+        slice = slice[np.argsort(ys[slice], kind='stable')]
+        groups.extend(np.array_split(slice, ceil(len(slice) / max_entries)))
+    return groups
+
+
 class CartesianMixin:
     '''
     Basic support for (x,y) points.
@@ -627,6 +680,13 @@ class CartesianMixin:
         x1, y1, x2, y2 = mbr
         return (x2 - x1) * (y2 - y1)
 
+    def _centre_of_mbr(self, mbr):
+        '''
+        Centre of the MBR (used to sort when bulk loading).
+        '''
+        x1, y1, x2, y2 = mbr
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
     def __extremes(self, entries):
         '''
         Internal routine for linear seeds.
@@ -866,6 +926,187 @@ class ExponentialMixin:
         return [(mbrs_pair[0], (height, entries_pair[0])), (mbrs_pair[1], (height, entries_pair[1]))]
 
 
+class PackedTree(ABC):
+    '''
+    A read-only tree, bulk loaded (Sort-Tile-Recursive) from all items at once.
+
+    Rather than nested tuples, each level is a contiguous numpy array of MBRs (x1, y1, x2, y2),
+    with the children of a node occupying a contiguous range of the level below.  So a search
+    tests all the candidate children at a level in a single vectorised comparison.
+
+    This supports the query part of the BaseTree API (get, get_items, items, etc).
+    Building an index over hundreds of thousands of points takes a second or two.
+    '''
+
+    def __init__(self, items, *, max_entries=16, default_match=MatchType.EQUALS, default_border=0):
+        if max_entries < 2:
+            raise Exception('Max number of entries in a node is too low')
+        self.__max_entries = max_entries
+        self.__default_match = default_match
+        self.__default_border = default_border
+        self.__contents, mbrs = [], []
+        for points, value in items or []:
+            self._check_points(points)
+            points = self._normalize_points(points)
+            self.__contents.append((points, value))
+            mbrs.append(self._mbr_of_points(points, border=default_border))
+        self.__levels = self.__pack(np.array(mbrs, dtype=float).reshape(-1, 4))
+
+    def __pack(self, mbrs):
+        '''
+        Sort the leaves into packed order and build the levels above (returned from the top down).
+
+        Each level is (mbrs, first, count) where first and count give the range of children.
+        '''
+        order = np.arange(len(mbrs))
+        levels = []
+        while len(mbrs) > self.__max_entries:
+            groups = sort_tile_recursive((mbrs[:, 0] + mbrs[:, 2]) / 2, (mbrs[:, 1] + mbrs[:, 3]) / 2,
+                                         self.__max_entries)
+            permutation = np.concatenate(groups)
+            mbrs = mbrs[permutation]
+            if levels:
+                # reorder the level below to match (child ranges move with their parents)
+                _, first, count = levels[-1]
+                levels[-1] = (mbrs, first[permutation], count[permutation])
+            else:
+                order = order[permutation]
+                levels.append((mbrs, None, None))
+            count = np.array([len(group) for group in groups])
+            first = np.cumsum(count) - count
+            mbrs = np.stack([np.minimum.reduceat(mbrs[:, 0], first), np.minimum.reduceat(mbrs[:, 1], first),
+                             np.maximum.reduceat(mbrs[:, 2], first), np.maximum.reduceat(mbrs[:, 3], first)],
+                            axis=1)
+            levels.append((mbrs, first, count))
+        if not levels:
+            levels.append((mbrs, None, None))
+        self.__contents = [self.__contents[i] for i in order]
+        return list(reversed(levels))
+
+    @property
+    def global_mbr(self):
+        mbrs = self.__levels[0][0]
+        if len(mbrs):
+            x1, y1 = self._denormalize_point((mbrs[:, 0].min(), mbrs[:, 1].min()))
+            x2, y2 = self._denormalize_point((mbrs[:, 2].max(), mbrs[:, 3].max()))
+            return x1, y1, x2, y2
+        else:
+            return None
+
+    @property
+    def max_entries(self):
+        return self.__max_entries
+
+    @property
+    def height(self):
+        return len(self.__levels) - 1
+
+    def _check_points(self, points):
+        try:
+            _ = points[0][0]
+        except Exception:
+            raise Exception('The `points` argument is a sequence of (x, y) points. ' +
+                            'You may have entered a single (x, y) point.')
+
+    def get(self, points, value=None, match=None, border=None):
+        '''
+        An iterator over values of nodes that match the MBR for the given points.
+
+        Arguments as for BaseTree.get().
+        '''
+        for points_entry, value_entry in self.__get_leaf_contents(points, value, match, border):
+            yield value_entry
+
+    def get_items(self, points, value=None, match=None, border=None):
+        '''
+        An iterator over (MBR, value) of nodes that match the MBR for the given points.
+
+        Arguments as for BaseTree.get_items().
+        '''
+        for points_entry, value_entry in self.__get_leaf_contents(points, value, match, border):
+            yield self._denormalize_points(points_entry), value_entry
+
+    def __get_leaf_contents(self, points, value, match, border):
+        '''
+        Internal search, level by level, keeping only children that match.
+        '''
+        self._check_points(points)
+        match = self.__default_match if match is None else match
+        border = self.__default_border if border is None else border
+        points = self._normalize_points(points)
+        x1, y1, x2, y2 = self._mbr_of_points(points, border=border)
+        indices = np.arange(len(self.__levels[0][0]))
+        for mbrs, first, count in self.__levels:
+            x1s, y1s, x2s, y2s = mbrs[indices].T
+            if match == MatchType.OVERLAP or (first is not None and match == MatchType.CONTAINS):
+                keep = (x1s <= x2) & (x2s >= x1) & (y1s <= y2) & (y2s >= y1)
+            elif match == MatchType.CONTAINS:
+                keep = (x1 <= x1s) & (x2 >= x2s) & (y1 <= y1s) & (y2 >= y2s)
+            else:  # EQUALS or CONTAINED, so the entry contains the request
+                keep = (x1s <= x1) & (x2s >= x2) & (y1s <= y1) & (y2s >= y2)
+            indices = indices[keep]
+            if first is not None:
+                # expand to the (contiguous) children of the matching nodes
+                first, count = first[indices], count[indices]
+                offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+                indices = np.repeat(first, count) + offsets
+        for index in indices.tolist():
+            points_entry, value_entry = self.__contents[index]
+            if (value is None or value == value_entry) and (match != MatchType.EQUALS or points == points_entry):
+                yield points_entry, value_entry
+
+    # standard container API
+
+    def __len__(self):
+        return len(self.__contents)
+
+    def keys(self):
+        for points, value in self.__contents:
+            yield self._denormalize_points(points)
+
+    def values(self):
+        for points, value in self.__contents:
+            yield value
+
+    def items(self):
+        yield from self.__contents
+
+    def __contains__(self, points):
+        try:
+            next(self.get(points))
+            return True
+        except StopIteration:
+            return False
+
+    def __iter__(self):
+        return self.keys()
+
+    def __getitem__(self, points):
+        return self.get(points)
+
+    def __str__(self):
+        return 'Packed RTree (%s leaves, %d height, %d entries)' % (len(self), self.height, self.max_entries)
+
+    # coordinate systems as BaseTree
+
+    def _normalize_points(self, points):
+        return tuple(self._normalize_point(p) for p in points)
+
+    @abstractmethod
+    def _normalize_point(self, point):
+        raise NotImplementedError()
+
+    def _denormalize_points(self, points):
+        return tuple(self._denormalize_point(p) for p in points)
+
+    def _denormalize_point(self, point):
+        return point
+
+    @abstractmethod
+    def _mbr_of_points(self, points, border=0):
+        raise NotImplementedError()
+
+
 class CLRTree(LinearMixin, CartesianMixin, BaseTree): pass
 
 
@@ -884,3 +1125,7 @@ class LQRTree(QuadraticMixin, LatLonMixin, BaseTree): pass
 class LERTree(ExponentialMixin, LatLonMixin, BaseTree): pass
 
 
+class CPRTree(CartesianMixin, PackedTree): pass
+
+
+class LPRTree(LatLonMixin, PackedTree): pass
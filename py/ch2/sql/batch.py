@@ -9,6 +9,17 @@ from sqlalchemy.event import listen
 log = getLogger(__name__)
 
 
+def next_ids(session, table, column, n):
+    '''
+    Reserve n values from the sequence that backs the given (integer, autoincrement) column.
+    '''
+    id_seq_name = f'{table.name}_{column}_seq'
+    sequence = Sequence(id_seq_name, schema=table.metadata.schema)
+    return [int(row[0]) for row in session.connection().execute(
+        select([sequence.next_value()]).select_from(text("generate_series(1, :num_values)")),
+        num_values=n)]
+
+
 class BatchLoader:
 
     def __init__(self, enabled=True, max_msg_cnt=10):
@@ -60,18 +71,9 @@ class BatchLoader:
             self.warning(f'Composite primary key for {mapper}')
         return False
 
-    @staticmethod
-    def __ids(session, mapper, column, n):
-        id_seq_name = f'{mapper.entity.__tablename__}_{column}_seq'
-        schema = mapper.entity.__table__.metadata.schema
-        sequence = Sequence(id_seq_name, schema=schema)
-        return [int(row[0]) for row in session.connection().execute(
-            select([sequence.next_value()]).select_from(text("generate_series(1, :num_values)")),
-            num_values=n)]
-
     def __set_ids(self, session, mapper, column, missing):
         n = len(missing)
-        for id, instance in zip(self.__ids(session, mapper, column, n), missing):
+        for id, instance in zip(next_ids(session, mapper.entity.__table__, column, n), missing):
             setattr(instance, column, id)
         self.rows += 1
 
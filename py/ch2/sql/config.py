@@ -45,6 +45,10 @@ class Config(BaseConfig):
         with self.db.session_context() as s:
             return Process.run(s, owner, cmd, log_name, constraint=constraint)  # todo change order
 
+    def add_process(self, owner, pid, cmd, log_name, constraint=None):
+        with self.db.session_context() as s:
+            Process.add(s, owner, pid, cmd, log_name, constraint=constraint)
+
     def delete_process(self, owner, pid, delta_seconds=3):
         with self.db.session_context() as s:
             Process.delete(s, owner, pid, delta_seconds=delta_seconds)
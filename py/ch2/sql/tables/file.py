@@ -35,6 +35,9 @@ class FileScan(Base):
     path = Column(Text, nullable=False)
     owner = Column(ShortCls, nullable=False)
     last_scan = Column(UTC, nullable=False)
+    # size and modification time when the hash was last calculated (if unchanged, no need to hash again)
+    size = Column(Integer)
+    modified = Column(UTC)
     file_hash_id = Column(Integer, ForeignKey('file_hash.id'), nullable=False)
     file_hash = relationship('FileHash', backref=backref('file_scan', cascade='all, delete-orphan',
                                                          passive_deletes=True, uselist=False))
@@ -200,7 +200,8 @@ class Interval(Source):
     @classmethod
     def missing_starts(cls, s, expected, schedule, interval_owner, exclude_owners=None):
         '''
-        Previous approach was way too complicated and not thread-safe.  Instead, just enumerate intervals and test.
+        Enumerate the frames of the schedule in Python and compare against the number of existing
+        intervals at each start, all read in a single (grouped) query.
         '''
         try:
             stats_start_time, stats_finish_time = cls._raw_statistics_time_range(s, exclude_owners=exclude_owners)
@@ -209,14 +210,20 @@ class Interval(Source):
             log.debug('Statistics (in general) exist %s - %s' % (start, finish))
             start = schedule.start_of_frame(start)
             finish = schedule.next_frame(finish)
+            starts = []
             while start < finish:
-                existing = s.query(Interval). \
-                    filter(Interval.start == start,
-                           Interval.schedule == schedule,
-                           Interval.owner == interval_owner).count()
-                if existing != expected:
-                    yield start
+                starts.append(start)
                 start = schedule.next_frame(start)
+            if starts:
+                existing = dict(s.query(Interval.start, count(Interval.id)).
+                                filter(Interval.start >= starts[0],
+                                       Interval.start <= starts[-1],
+                                       Interval.schedule == schedule,
+                                       Interval.owner == interval_owner).
+                                group_by(Interval.start).all())
+                for start in starts:
+                    if existing.get(start, 0) != expected:
+                        yield start
         except NoStatistics:
             log.warning('No data available')
 
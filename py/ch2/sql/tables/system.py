@@ -75,12 +75,16 @@ class Process(Base):
         from ...pipeline.process import fmt_cmd
         popen = ps.Popen(args=cmd, shell=True)
         log.debug(f'Adding command [{fmt_cmd(cmd)}]; pid {popen.pid}')
-        s.query(Process).filter(Process.pid == popen.pid).delete(synchronize_session=False)
-        s.add(Process(command=cmd, owner=owner, pid=popen.pid, log=log_name,
-                      constraint=str_or_none(constraint)))
-        s.commit()
+        cls.add(s, owner, popen.pid, cmd, log_name, constraint=constraint)
         return popen
 
+    @classmethod
+    def add(cls, s, owner, pid, cmd, log_name, constraint=None):
+        # record a process that was started elsewhere (eg a pooled worker)
+        s.query(Process).filter(Process.pid == pid).delete(synchronize_session=False)
+        s.add(Process(command=cmd, owner=owner, pid=pid, log=log_name, constraint=str_or_none(constraint)))
+        s.commit()
+
     @classmethod
     def delete(cls, s, owner, pid, delta_seconds=3):
         # ignore constraint here because we have pid
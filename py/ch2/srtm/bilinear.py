@@ -3,7 +3,8 @@ from .file import SRTM1_DIR_CNAME, SAMPLES, ElevationSupport, elevation_from_con
 
 
 def bilinear_elevation_from_constant(s, dir_name=SRTM1_DIR_CNAME):
-    return elevation_from_constant(s, BilinearElevation, dir_name=dir_name)
+    return elevation_from_constant(s, lambda dir, cache_size: BilinearElevation(dir, cache_size=cache_size),
+                                   dir_name=dir_name)
 
 
 class BilinearElevation(ElevationSupport):
@@ -41,3 +42,13 @@ class BilinearElevation(ElevationSupport):
             return h0 * (1-k) + h1 * k
         else:
             return None
+
+    def _interpolate_many(self, lats, lons, flat, flon, h):
+        x = (lons - flon) * (SAMPLES - 1)
+        y = (lats - flat) * (SAMPLES - 1)
+        i, j = x.astype(int), y.astype(int)
+        k = y - j
+        h0 = h[j, i] * (1-k) + h[j+1, i] * k
+        h1 = h[j, i+1] * (1-k) + h[j+1, i+1] * k
+        k = x - i
+        return h0 * (1-k) + h1 * k
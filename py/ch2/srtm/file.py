@@ -4,7 +4,9 @@ from genericpath import exists
 from logging import getLogger
 
 from math import floor
-from os.path import join
+from os import makedirs, listdir, remove, replace, utime, getpid
+from os.path import join, getmtime, dirname, splitext
+from shutil import copyfileobj
 from zipfile import ZipFile
 
 import numpy as np
@@ -17,6 +19,10 @@ log = getLogger(__name__)
 
 
 SRTM1_DIR_CNAME = 'srtm1-dir'
+SRTM1_CACHE_CNAME = 'srtm1-cache'
+CACHE = 'cache'
+TMP = '.tmp'
+DEFAULT_CACHE_SIZE = 20
 SAMPLES = 3601
 # from view-source:http://dwtkns.com/srtm30m/
 BASE_URL = 'http://e4ftl01.cr.usgs.gov/MEASURES/SRTMGL1.003/2000.02.11/'
@@ -27,46 +33,136 @@ EXTN = '.SRTMGL1.hgt.zip'
 # (although that has bugs...)
 
 
-@lru_cache(4)  # 4 means our tests are quick (and should tile a local patch)
-def cached_file_reader(dir, flat, flon):
+def tile_root(flat, flon):
     # https://wiki.openstreetmap.org/wiki/SRTM
     # The official 3-arc-second and 1-arc-second data for versions 2.1 and 3.0 are divided into 1°×1° data tiles.
     # The tiles are distributed as zip files containing HGT files labeled with the coordinate of the southwest cell.
     # For example, the file N20E100.hgt contains data from 20°N to 21°N and from 100°E to 101°E inclusive.
-    root = '%s%02d%s%03d' % ('S' if flat < 0 else 'N', abs(flat), 'W' if flon < 0 else 'E', abs(flon))
+    return '%s%02d%s%03d' % ('S' if flat < 0 else 'N', abs(flat), 'W' if flon < 0 else 'E', abs(flon))
+
+
+def cache_path(dir, file):
+    '''
+    The path to a file in the cache (a sub-directory of the SRTM1 directory).
+    '''
+    cache_dir = join(dir, CACHE)
+    makedirs(cache_dir, exist_ok=True)
+    return join(cache_dir, file)
+
+
+def use_cached(path, cache_size):
+    '''
+    Mark a file in the cache as recently used (via the modification time), deleting the least
+    recently used files of the same type (extension) so that the cache holds at most cache_size of them.
+
+    Other processes share the cache, so files may disappear at any time.  Returns False if path itself
+    has gone.
+    '''
+    try:
+        utime(path)
+        present = True
+    except FileNotFoundError:
+        present = False
+    cache_dir, extn = dirname(path), splitext(path)[1]
+    paths = []
+    for name in listdir(cache_dir):
+        if splitext(name)[1] == extn:
+            try:
+                paths.append((getmtime(join(cache_dir, name)), join(cache_dir, name)))
+            except FileNotFoundError:
+                pass
+    for _, old in sorted(paths, reverse=True)[cache_size:]:
+        if old != path:
+            log.debug(f'Removing {old} from cache')
+            try:
+                remove(old)
+            except FileNotFoundError:
+                pass
+    return present
+
+
+def tile_path(dir, flat, flon, cache_size=DEFAULT_CACHE_SIZE):
+    '''
+    The path to an uncompressed tile, decompressing into the cache if necessary.
+    '''
+    root = tile_root(flat, flon)
     hgt_file = root + '.hgt'
     hgt_path = join(dir, hgt_file)
     zip_path = join(dir, root + EXTN)
     if exists(hgt_path):
-        log.debug(f'Reading {hgt_path}')
-        with open(hgt_path, 'rb') as input:
-            data = input.read()
+        return hgt_path
     elif exists(zip_path):
-        log.debug(f'Reading {zip_path}')
-        with open(zip_path, 'rb') as input:
-            zip = ZipFile(input)
-            log.debug(f'Found {zip.filelist}')
-            data = zip.open(hgt_file).read()
+        path = cache_path(dir, hgt_file)
+        # if another process evicts the file before we mark it as used then it is decompressed again
+        if not (exists(path) and use_cached(path, cache_size)):
+            log.debug(f'Decompressing {zip_path}')
+            with open(zip_path, 'rb') as input:
+                zip = ZipFile(input)
+                log.debug(f'Found {zip.filelist}')
+                # write under another name so that a partial file (or one from another process) is not used
+                tmp_path = f'{path}.{getpid()}{TMP}'
+                with zip.open(hgt_file) as data, open(tmp_path, 'wb') as output:
+                    copyfileobj(data, output)
+                replace(tmp_path, path)
+            use_cached(path, cache_size)
+        return path
     else:
         # i tried automating download, but couldn't get ouath2 to work
         log.warning(f'Download {BASE_URL + root + EXTN}')
         raise Exception(f'Missing {hgt_file}')
-    return np.flip(np.frombuffer(data, np.dtype('>i2'), SAMPLES * SAMPLES).reshape((SAMPLES, SAMPLES)), 0)
+
+
+def make_cached_file_reader(cache_size=DEFAULT_CACHE_SIZE):
+
+    # tiles are memory mapped, so holding many open is cheap (only pages used are read)
+    @lru_cache(cache_size)
+    def cached_file_reader(dir, flat, flon):
+        path = tile_path(dir, flat, flon, cache_size=cache_size)
+        log.debug(f'Mapping {path}')
+        return np.flip(np.memmap(path, np.dtype('>i2'), mode='r', shape=(SAMPLES, SAMPLES)), 0)
+
+    return cached_file_reader
+
+
+cached_file_reader = make_cached_file_reader()
 
 
 class ElevationSupport:
 
-    def __init__(self, dir, reader=cached_file_reader):
+    def __init__(self, dir, reader=None, cache_size=DEFAULT_CACHE_SIZE):
         self._dir = dir
-        self._reader = reader
+        self._reader = reader or make_cached_file_reader(cache_size)
 
     def _lookup(self, lat, lon):
         flat, flon = floor(lat), floor(lon)
         # construct the path in the reader so it's skipped if we hit the cache
         return flat, flon, self._reader(self._dir, flat, flon)
 
-
-def elevation_from_constant(s, interp, dir_name=SRTM1_DIR_CNAME):
+    def _lookup_many(self, lats, lons):
+        '''
+        Group points by tile, generating (indices, flat, flon, data) for each tile.
+        '''
+        tiles, inverse = np.unique(np.stack([np.floor(lats), np.floor(lons)], axis=1).astype(int),
+                                   axis=0, return_inverse=True)
+        for tile, (flat, flon) in enumerate(tiles.tolist()):
+            yield np.nonzero(inverse.ravel() == tile)[0], flat, flon, self._reader(self._dir, flat, flon)
+
+    def elevation_many(self, lats, lons):
+        '''
+        As elevation(), but for arrays of points.  Returns an array (or None if there is no data).
+        '''
+        if self._dir:
+            lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+            elevations = np.empty(len(lats))
+            if len(lats):
+                for indices, flat, flon, data in self._lookup_many(lats, lons):
+                    elevations[indices] = self._interpolate_many(lats[indices], lons[indices], flat, flon, data)
+            return elevations
+        else:
+            return None
+
+
+def elevation_from_constant(s, interp, dir_name=SRTM1_DIR_CNAME, cache_name=SRTM1_CACHE_CNAME):
     try:
         dir = clean_path(Constant.from_name(s, dir_name).at(s).value)
         if not exists(dir): raise Exception(f'SRTM1 directory {dir} missing')
@@ -74,4 +170,5 @@ def elevation_from_constant(s, interp, dir_name=SRTM1_DIR_CNAME):
         log_current_exception(traceback=False)
         log.warning(f'SRTM1 config - define {dir_name} in constants for elevation data')
         dir = None
-    return interp(dir)
+    cache_size = Constant.get_single(s, cache_name, none=True) or DEFAULT_CACHE_SIZE
+    return interp(dir, cache_size)
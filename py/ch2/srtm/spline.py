@@ -1,20 +1,35 @@
 
 from functools import lru_cache
+from logging import getLogger
+from os import getpid, replace
+from os.path import exists
+from pickle import dump, load
 
 import numpy as np
+from scipy import __version__ as scipy_version
 from scipy.interpolate import RectBivariateSpline
 
-from .file import SRTM1_DIR_CNAME, SAMPLES, ElevationSupport, elevation_from_constant, cached_file_reader
+from .file import SRTM1_DIR_CNAME, SAMPLES, DEFAULT_CACHE_SIZE, ElevationSupport, elevation_from_constant, \
+    make_cached_file_reader, cache_path, use_cached, tile_root, TMP
 
+log = getLogger(__name__)
 
-def spline_elevation_from_constant(s, dir_name=SRTM1_DIR_CNAME, smooth=0):
-    return elevation_from_constant(s, lambda dir: SplineElevation(dir, smooth), dir_name=dir_name)
+# a pickled spline holds a float64 coefficient per sample (about 104MB, vs 25MB for a tile), so fewer are kept
+SPLINE_CACHE_SIZE = 4
+
+
+def spline_elevation_from_constant(s, dir_name=SRTM1_DIR_CNAME, smooth=0, persist=False):
+    return elevation_from_constant(s, lambda dir, cache_size: SplineElevation(dir, smooth, cache_size=cache_size,
+                                                                              persist=persist),
+                                   dir_name=dir_name)
 
 
 class SplineElevation(ElevationSupport):
 
-    def __init__(self, dir, smooth=0):
-        super().__init__(dir, make_cached_spline_builder(smooth))
+    def __init__(self, dir, smooth=0, cache_size=DEFAULT_CACHE_SIZE, persist=False,
+                 spline_cache_size=SPLINE_CACHE_SIZE):
+        super().__init__(dir, make_cached_spline_builder(smooth, cache_size=cache_size, persist=persist,
+                                                         spline_cache_size=spline_cache_size))
 
     def elevation(self, lat, lon):
         if self._dir:
@@ -23,15 +38,49 @@ class SplineElevation(ElevationSupport):
         else:
             return None
 
+    def _interpolate_many(self, lats, lons, flat, flon, spline):
+        return spline.ev(lats, lons)  # pointwise, unlike the call above
 
-def make_cached_spline_builder(smooth):
 
-    @lru_cache(4)  # 4 means our tests are quick (and should tile a local patch)
-    def cached_spline_builder(dir, flat, flon):
-        h = cached_file_reader(dir, flat, flon)
+def make_cached_spline_builder(smooth, cache_size=DEFAULT_CACHE_SIZE, persist=False,
+                               spline_cache_size=SPLINE_CACHE_SIZE):
+    '''
+    If persist is true then splines are also saved in the (on-disk) tile cache.  They are counted
+    separately from tiles (at most spline_cache_size are kept) and keyed by scipy version (pickles
+    are not portable between versions).
+    '''
+
+    file_reader = make_cached_file_reader(cache_size)
+
+    def spline_builder(dir, flat, flon):
+        h = file_reader(dir, flat, flon)
         x, y = np.linspace(flat, flat+1, SAMPLES), np.linspace(flon, flon+1, SAMPLES)
         # not 100% sure on the scaling of s but it seems to be related to sum of errors at all points
         # however, a scaling of SAMPLES * SAMPLES means that smooth=1 gives a numerical error, so add 10
         return RectBivariateSpline(x, y, h, s=smooth * SAMPLES * SAMPLES * 10)
 
+    @lru_cache(4)  # 4 means our tests are quick (and should tile a local patch)
+    def cached_spline_builder(dir, flat, flon):
+        if persist:
+            path = cache_path(dir, f'{tile_root(flat, flon)}-{smooth}-{scipy_version}.spline')
+            spline = None
+            if exists(path):
+                log.debug(f'Reading {path}')
+                try:
+                    with open(path, 'rb') as input:
+                        spline = load(input)
+                except FileNotFoundError:
+                    log.debug(f'{path} removed by another process')
+            if spline is None:
+                spline = spline_builder(dir, flat, flon)
+                log.debug(f'Writing {path}')
+                tmp_path = f'{path}.{getpid()}{TMP}'
+                with open(tmp_path, 'wb') as output:
+                    dump(spline, output)
+                replace(tmp_path, path)
+            use_cached(path, spline_cache_size)
+            return spline
+        else:
+            return spline_builder(dir, flat, flon)
+
     return cached_spline_builder
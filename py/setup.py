@@ -3,7 +3,7 @@ import setuptools
 
 setuptools.setup(name='choochoo',
                  packages=setuptools.find_packages(),
-                 version='0.38.2',
+                 version='0.39.0',
                  author='andrew cooke',
                  author_email='andrew@acooke.org',
                  description='Data Science for Training',
@@ -53,7 +53,7 @@ Source and screenshots on [github](https://github.com/andrewcooke/choochoo).
                      ],
                  },
                  classifiers=(
-                     "Programming Language :: Python :: 3.8",
+                     "Programming Language :: Python :: 3.9",
                      "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
                      "Operating System :: OS Independent",
                      "Development Status :: 4 - Beta",
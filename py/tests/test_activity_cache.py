@@ -0,0 +1,47 @@
+
+from glob import glob
+from os.path import join
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.common.date import to_time
+from ch2.data.cache import ActivityCache
+
+
+class TestActivityCache(LogTestCase):
+
+    def test_cache(self):
+        with TemporaryDirectory() as dir:
+            cache = ActivityCache(dir)
+            first, second = to_time('2020-03-01 10:00:00'), to_time('2020-03-01 11:00:00')
+            times = pd.date_range('2020-03-01 09:00', periods=10, freq='s', tz='UTC')
+            self.assertIsNone(cache.read(1, 2, first))
+            cache.write(1, 2, first, times, np.arange(10))
+            cached_times, values = cache.read(1, 2, first)
+            self.assertEqual(list(cached_times), list(times))
+            self.assertTrue(np.array_equal(values, np.arange(10)))
+            # a new timestamp replaces the old data
+            self.assertIsNone(cache.read(1, 2, second))
+            cache.write(1, 2, second, times, np.arange(10) / 2)
+            self.assertIsNone(cache.read(1, 2, first))
+            self.assertTrue(np.array_equal(cache.read(1, 2, second)[1], np.arange(10) / 2))
+            self.assertEqual(len(glob(join(dir, '*'))), 1)
+            # text is not cached
+            cache.write(1, 3, first, times[:1], np.array(['a'], dtype=object))
+            self.assertIsNone(cache.read(1, 3, first))
+
+    def test_prune(self):
+        with TemporaryDirectory() as dir:
+            cache = ActivityCache(dir)
+            time = to_time('2020-03-01 10:00:00')
+            times = pd.date_range('2020-03-01 09:00', periods=10, freq='s', tz='UTC')
+            for activity_journal_id in (1, 2, 12):
+                cache.write(activity_journal_id, 2, time, times, np.arange(10))
+            cache.prune([2])
+            self.assertIsNone(cache.read(1, 2, time))
+            self.assertIsNotNone(cache.read(2, 2, time))
+            self.assertIsNone(cache.read(12, 2, time))
+            self.assertEqual(len(glob(join(dir, '*'))), 1)
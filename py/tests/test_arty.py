@@ -4,8 +4,8 @@ from random import uniform, gauss, seed, randrange
 from time import time
 from tests import LogTestCase
 
-from ch2.rtree.spherical import Global
-from ch2.rtree.tree import CLRTree, MatchType, CQRTree, CERTree, LQRTree
+from ch2.rtree.spherical import Global, SPRTree
+from ch2.rtree.tree import CLRTree, MatchType, CQRTree, CERTree, LQRTree, CPRTree
 
 
 class TestArty(LogTestCase):
@@ -199,6 +199,34 @@ class TestArty(LogTestCase):
                     print('n_data %d' % n_data)
                     self.stress(type, n_children, n_data)
 
+    def test_bulk(self):
+        seed(2)
+        data = [(box, value) for value, box in self.gen_random(500)]
+        for size in 2, 3, 4, 16:
+            added = CQRTree(max_entries=size)
+            for box, value in data:
+                added.add(box, value)
+            bulk = CQRTree(data, max_entries=size)
+            bulk.assert_consistent()
+            self.assertEqual(added, bulk)
+            packed = CPRTree(data, max_entries=size)
+            self.assertEqual(len(packed), len(data))
+            for _ in range(50):
+                request = self.random_box(10, 100)
+                for match in MatchType:
+                    expected = sorted(added.get(request, match=match))
+                    self.assertEqual(sorted(bulk.get(request, match=match)), expected)
+                    self.assertEqual(sorted(packed.get(request, match=match)), expected)
+            for box, value in data[:20]:
+                self.assertTrue(value in list(packed[box]))
+
+    def test_packed_spherical(self):
+        tree = SPRTree([([(-70.6, -33.4)], 'santiago'), ([(-70.61, -33.4)], 'nearby')],
+                       default_match=MatchType.OVERLAP, default_border=500)
+        self.assertEqual(sorted(tree[[(-70.6, -33.4)]]), ['nearby', 'santiago'])
+        self.assertEqual(list(tree.get([(-70.59, -33.4)], border=1)), ['santiago'])
+        self.assertFalse([(-70.5, -33.4)] in tree)
+
     def test_latlon(self):
         tree = LQRTree()
         for lon in -180, 180:
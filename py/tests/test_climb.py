@@ -0,0 +1,38 @@
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.data.climb import find_climbs, biggest_reversal, search, Climb
+from ch2.names import N
+
+
+class TestClimb(LogTestCase):
+
+    def test_reversal(self):
+        df = pd.DataFrame({N.ELEVATION: [0, 10, 5, 12, 2, 8, 1]}, index=np.arange(7))
+        self.assertEqual(biggest_reversal(df), (11, 6, 3))
+        # ties go to the shortest, then earliest, reversal
+        df = pd.DataFrame({N.ELEVATION: [9, 10, 0, 12, 2, 8, 3]}, index=np.arange(7))
+        self.assertEqual(biggest_reversal(df), (10, 2, 1))
+        df = pd.DataFrame({N.ELEVATION: [0, 1, 2, 3]}, index=np.arange(4))
+        self.assertEqual(biggest_reversal(df), (0, None, None))
+
+    def test_search(self):
+        # 100m climb over 1km between two flat sections (result is stepped inwards by one point)
+        elevation = np.concatenate([np.zeros(10), np.linspace(0, 100, 11), np.full(10, 100)])
+        df = pd.DataFrame({N.ELEVATION: elevation}, index=np.arange(31) * 0.1)
+        score, lo, hi = search(df, params=Climb(min_elevation=50))
+        self.assertGreater(score, 0)
+        self.assertAlmostEqual(lo, 1.1)
+        self.assertAlmostEqual(hi, 1.9)
+
+    def test_find_climbs(self):
+        distance = np.arange(301) * 0.01
+        elevation = np.interp(distance, [0, 1, 2, 3], [100, 100, 200, 200])
+        df = pd.DataFrame({N.DISTANCE: distance, N.ELEVATION: elevation},
+                          index=pd.to_datetime(np.arange(301) * 2, unit='s'))
+        climbs = list(find_climbs(df))
+        self.assertEqual(len(climbs), 1)
+        self.assertAlmostEqual(climbs[0][N.CLIMB_ELEVATION], 100, delta=5)
+        self.assertEqual(climbs[0][N.CLIMB_CATEGORY], '4')
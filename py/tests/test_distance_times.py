@@ -0,0 +1,26 @@
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.data.activity import best_times_for_distance, times_for_distance, MIN, MED
+from ch2.names import N
+
+
+class TestDistanceTimes(LogTestCase):
+
+    def test_times(self):
+        # 10m/s for 10km, then 5m/s for 10km, with a pause (repeated distance) in the middle
+        times = pd.date_range('2020-03-01 10:00', periods=3002, freq='s', tz='UTC')
+        distance = np.concatenate([np.arange(1001) / 100, [10.0], 10 + np.arange(1, 2001) / 200])
+        df = pd.DataFrame({N.DISTANCE: distance}, index=times)
+        best = best_times_for_distance(df, targets=[5, 10, 15, 25])
+        self.assertEqual(list(best.index), [5, 10, 15])
+        self.assertAlmostEqual(best.loc[5, MIN], 500)
+        self.assertAlmostEqual(best.loc[10, MIN], 1001)  # the pause counts
+        self.assertAlmostEqual(best.loc[15, MIN], 2001)
+        self.assertLess(best.loc[5, N.FINISH], times[1001])
+        self.assertAlmostEqual((best.loc[15, N.FINISH] - best.loc[15, N.START]).total_seconds(), 2001)
+        stats = times_for_distance(df)
+        self.assertAlmostEqual(stats[N.MIN_KM_TIME % 10], 1001)
+        self.assertAlmostEqual(stats[N.MED_KM_TIME % 20], best_times_for_distance(df, targets=[20]).loc[20, MED])
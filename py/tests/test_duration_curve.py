@@ -0,0 +1,58 @@
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.data.activity import max_mean_curve, max_med_curve, max_med_stats, max_mean_stats, text_to_curve, \
+    curve_lengths
+from ch2.names import N
+
+
+class TestDurationCurve(LogTestCase):
+
+    def test_mean(self):
+        values = np.random.random(100)
+        values[40] = np.nan
+        lengths = list(range(1, 100))
+        best = max_mean_curve(values, lengths)
+        for n, value in zip(lengths, best):
+            # as pandas cumsum().diff(n): missing values count as zero except at either end
+            means = [np.nansum(values[i - n + 1:i + 1]) / n for i in range(n, 100)
+                     if not np.isnan(values[i - n]) and not np.isnan(values[i])]
+            if means:
+                self.assertAlmostEqual(value, max(means))
+            else:
+                self.assertTrue(np.isnan(value))
+
+    def test_median(self):
+        values = np.random.random(100)
+        pauses = np.zeros(100)
+        pauses[50:55] = 60
+        best = max_med_curve(values, pauses, [10, 10, 60], [30, 90, 90])
+        self.assertEqual(best[0], max(pd.Series(values[:50]).rolling(10).median().max(),
+                                      pd.Series(values[55:]).rolling(10).median().max()))
+        self.assertEqual(best[1], pd.Series(values).rolling(10).median().max())
+        self.assertEqual(best[2], pd.Series(values).rolling(60).median().max())
+
+    def test_lengths(self):
+        self.assertEqual(curve_lengths(0), [])
+        self.assertEqual(curve_lengths(5), [1, 2, 3, 4, 5])
+        lengths = curve_lengths(8 * 360)
+        self.assertEqual(lengths[-1], 8 * 360)
+        self.assertTrue(all(a < b for a, b in zip(lengths, lengths[1:])))
+        self.assertLess(len(lengths), 100)
+
+    def test_stats(self):
+        times = pd.date_range('2020-03-01 10:00', periods=3600, freq='s', tz='UTC')
+        df = pd.DataFrame({N.HEART_RATE: np.arange(3600) / 10, N.POWER_ESTIMATE: 200.0, N.TIMESPAN_ID: 1.0},
+                          index=times)
+        stats = max_med_stats(df, mins=(5,), curves={N.HEART_RATE: N.HR_CURVE})
+        curve = text_to_curve(stats[N.HR_CURVE])
+        # resampled every 10s to 359.0, so the median of n samples is 359 - (n-1)/2
+        self.assertAlmostEqual(stats[N.MAX_MED_HR_M % 5], 359 - 29 / 2)
+        self.assertEqual(list(curve.index), [10 * length for length in curve_lengths(360)])
+        self.assertAlmostEqual(curve[320], 359 - 31 / 2)
+        stats = max_mean_stats(df, curves={N.POWER_ESTIMATE: N.PE_CURVE})
+        curve = text_to_curve(stats[N.PE_CURVE])
+        self.assertAlmostEqual(stats[N.MAX_MEAN_PE_M % 30], 200)
+        self.assertTrue(np.allclose(curve.values, 200))
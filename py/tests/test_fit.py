@@ -1,6 +1,7 @@
 from glob import glob
 from logging import getLogger
 from os.path import basename, join, exists
+from time import time
 
 from ch2.commands.args import FIELDS, TABLES, GREP
 from ch2.fit.format.read import filtered_records
@@ -169,3 +170,53 @@ class TestFit(LogTestCase, OutputMixin):
 
         self.assertAlmostEqual(positions[0][0], -33.42, places=1)
         self.assertAlmostEqual(positions[0][1], -70.61, places=1)
+
+    def test_throughput(self):
+        from ch2.fit.profile.profile import read_profile
+        from ch2.fit.format.read import parse_data
+        from ch2.fit.format.tokens import State, FileHeader, token_factory
+
+        types, messages = read_profile(profile_path=self.profile_path)
+        n_bytes, n_tokens, t_tokens, t_records = 0, 0, 0, 0
+        for fit_file in sorted(glob(join(self.test_dir, 'source/personal/*.fit'))):
+            data = read_fit(fit_file)
+            n_bytes += len(data)
+            start = time()
+            state, tokens = parse_data(data, types, messages, no_validate=True)
+            offsets = [offset for offset, token in tokens]
+            t_tokens += time() - start
+            n_tokens += len(offsets)
+            start = time()
+            state, tokens = parse_data(data, types, messages, no_validate=True)
+            for offset, token in tokens:
+                token.parse_token().force()
+            t_records += time() - start
+            # the old approach, copying the remaining data for each token, should give identical offsets
+            state, offset = State(types, messages), len(FileHeader(data))
+            while len(data) - offset > 2:
+                self.assertIn(offset, offsets)
+                offset += len(token_factory(data[offset:], state))
+        mb = n_bytes / 1e6
+        log.info('Tokenized %d tokens (%.2fMB) in %.2fs: %.2fMB/s' % (n_tokens, mb, t_tokens, mb / t_tokens))
+        log.info('Parsed %d records (%.2fMB) in %.2fs: %.2fMB/s' % (n_tokens, mb, t_records, mb / t_records))
+
+    def test_probe(self):
+        # the probe should agree with the readers, which parse all records and sort by time
+        from ch2.fit.probe import probe_fit
+        from ch2.pipeline.read.utils import ProcessFitReader
+        for path in sorted(glob(join(self.test_dir, 'source/personal/*.fit'))):
+            with self.subTest(path=path):
+                data = read_fit(path)
+                probe = probe_fit(data)
+                records = ProcessFitReader.read_fit_file(data)
+                first = {}
+                for record in records:
+                    first.setdefault('record' if record.name == 'event' else record.name, record)
+                self.assertEqual(probe.is_monitor, 'monitoring_info' in first)
+                if probe.is_monitor:
+                    self.assertEqual(probe.monitor_time, first['monitoring_info'].timestamp)
+                else:
+                    self.assertEqual(probe.activity_time, first['record'].timestamp)
+                    sport = first.get('sport', first.get('session'))
+                    self.assertEqual(probe.sport, sport.data['sport'][0][0] if sport else None)
+
@@ -0,0 +1,67 @@
+
+from logging import getLogger
+from os import environ
+from time import time
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.common.date import to_time
+from ch2.data.heart_rate import BC_ZONES
+from ch2.data.impulse import hr_zone
+from ch2.names import N
+
+log = getLogger(__name__)
+
+
+def reference_hr_zone(heart_rate_df, fthr_df, pc_fthr_zones=BC_ZONES, heart_rate=N.HEART_RATE, hr_zone=N.HR_ZONE):
+    # the original, mask-per-zone implementation
+    fthrs = sorted([(time, row[N.FTHR]) for time, row in fthr_df.dropna().iterrows()], reverse=True)
+    fthrs = fthrs + [(to_time('2100'), None)]
+    fthrs = [(a[0], b[0], a[1]) for a, b in zip(fthrs, fthrs[1:])]
+    heart_rate_df[hr_zone] = np.nan
+    for start, finish, fthr in fthrs:
+        start, finish = pd.to_datetime(start, utc=True), pd.to_datetime(finish, utc=True)
+        zones = [x * fthr / 100.0 for x in pc_fthr_zones]
+        for zone, upper in enumerate(zones + [None], start=1):
+            in_period = (heart_rate_df.index >= start) & (heart_rate_df.index < finish)
+            if zone == 1:
+                heart_rate_df.loc[in_period & (heart_rate_df[heart_rate] <= upper), [hr_zone]] = zone
+            elif not upper:
+                heart_rate_df.loc[in_period & (heart_rate_df[heart_rate] > lower), [hr_zone]] = zone
+            else:
+                selected = in_period & (heart_rate_df[heart_rate] > lower) & (heart_rate_df[heart_rate] <= upper)
+                hrz = ((heart_rate_df.loc[selected, [heart_rate]] - lower) / (upper - lower)) + zone
+                heart_rate_df.loc[selected, [hr_zone]] = hrz.values
+            lower = upper
+
+
+class TestImpulse(LogTestCase):
+
+    def assert_same(self, heart_rate_df, fthr_df):
+        expected, actual = heart_rate_df.copy(), heart_rate_df.copy()
+        start = time()
+        reference_hr_zone(expected, fthr_df)
+        middle = time()
+        hr_zone(actual, fthr_df)
+        log.info(f'{len(heart_rate_df)} rows: reference {middle - start:.2f}s, vectorised {time() - middle:.2f}s')
+        self.assertTrue(np.array_equal(expected[N.HR_ZONE].values, actual[N.HR_ZONE].values, equal_nan=True))
+
+    def test_zones(self):
+        times = pd.date_range('2020-01-01', periods=200, freq='1min', tz='UTC')
+        heart_rate = np.arange(200) + 40.0
+        heart_rate[[3, 50]] = np.nan
+        heart_rate[100] = 154 * 0.94  # on a boundary
+        fthr_df = pd.DataFrame({N.FTHR: [154]}, index=pd.DatetimeIndex([times[10]]))
+        self.assert_same(pd.DataFrame({N.HEART_RATE: heart_rate}, index=times), fthr_df)
+
+    def test_benchmark(self):
+        # several years of data, with a few changes in FTHR
+        # (sampled every 2 minutes, like monitor data, only if CH2_BENCHMARK is set, since the reference is slow)
+        freq = '2min' if environ.get('CH2_BENCHMARK') else '2H'
+        times = pd.date_range('2017-01-01', '2020-01-01', freq=freq, tz='UTC')
+        heart_rate = np.random.default_rng(42).integers(40, 200, len(times))
+        fthr_df = pd.DataFrame({N.FTHR: [150, 155, 160, 158]},
+                               index=pd.DatetimeIndex(['2016-06-01', '2017-07-01', '2018-03-01', '2019-01-01'], tz='UTC'))
+        self.assert_same(pd.DataFrame({N.HEART_RATE: heart_rate}, index=times), fthr_df)
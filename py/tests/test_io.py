@@ -0,0 +1,29 @@
+
+from os import stat
+from os.path import join
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+from tests import LogTestCase
+
+from ch2.common.date import to_time
+from ch2.common.io import file_hash
+from ch2.lib.io import hash_changed
+
+
+class TestIO(LogTestCase):
+
+    def test_hash_changed(self):
+        with TemporaryDirectory() as dir:
+            paths = [join(dir, f'{i}.fit') for i in range(4)]
+            for i, path in enumerate(paths):
+                with open(path, 'w') as out:
+                    out.write(str(i) * (i + 1))
+            stats = dict((path, stat(path)) for path in paths)
+            scan = lambda path, size: SimpleNamespace(size=size, modified=to_time(stats[path].st_mtime))
+            # 0 is unchanged, 1 has a different size, 2 has no size (old scan), 3 is new
+            by_path = {paths[0]: scan(paths[0], 1), paths[1]: scan(paths[1], 1), paths[2]: scan(paths[2], None)}
+            hashes = hash_changed(stats, by_path, n_threads=2)
+            self.assertEqual(sorted(hashes), paths[1:])
+            self.assertEqual(hashes[paths[3]], file_hash(paths[3]))
+            self.assertEqual(sorted(hash_changed(stats, by_path, hash_all=True)), paths)
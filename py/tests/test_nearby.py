@@ -0,0 +1,101 @@
+
+from collections import defaultdict
+from random import seed, uniform
+
+import numpy as np
+from tests import LogTestCase
+
+from ch2.pipeline.calculate.nearby import SimilarityGraph, NearbySimilarityDBSCAN
+from ch2.rtree.grid import overlap_counts, to_xy
+from ch2.rtree.spherical import SQRTree, RADIAN
+from ch2.rtree.tree import MatchType
+
+
+class TestNearby(LogTestCase):
+
+    def test_neighbourhood(self):
+        seed(42)
+        rows = [(lo, hi, uniform(0, 1)) for lo in range(1, 30) for hi in range(lo + 1, 30) if uniform(0, 1) < 0.3]
+        max_similarity = max(row[2] for row in rows)
+        graph = SimilarityGraph(rows)
+        for epsilon in (0.1, 0.5, 0.9):
+            for candidate in graph.ids.tolist():
+                expected = sorted([lo for lo, hi, similarity in rows if hi == candidate and
+                                   (max_similarity - similarity) / max_similarity < epsilon] +
+                                  [hi for lo, hi, similarity in rows if lo == candidate and
+                                   (max_similarity - similarity) / max_similarity < epsilon])
+                self.assertEqual(sorted(graph.neighbourhood(candidate, epsilon)), expected)
+
+    def test_dbscan(self):
+        # two cliques joined by a weak link
+        rows = [(lo, hi, 1.0) for lo in range(1, 5) for hi in range(lo + 1, 5)] + \
+               [(lo, hi, 0.9) for lo in range(10, 14) for hi in range(lo + 1, 14)] + [(4, 10, 0.1)]
+        graph = SimilarityGraph(rows)
+        self.assertEqual(sorted(map(sorted, NearbySimilarityDBSCAN(graph, 0.2, 3).run())),
+                         [[1, 2, 3, 4], [10, 11, 12, 13]])
+        self.assertEqual(len(NearbySimilarityDBSCAN(graph, 0.95, 3).run()), 1)
+
+    def test_unconnected(self):
+        with self.assertRaisesRegex(Exception, 'unconnected'):
+            SimilarityGraph([])
+
+    def test_grid(self):
+        seed(42)
+        n = 500
+        for lon0, lat0 in ((-70.6, -33.4), (25.0, 68.5), (179.98, 0.99)):
+            lon = np.array([lon0 + uniform(0, 0.05) for _ in range(n)])
+            lat = np.array([lat0 + uniform(0, 0.05) for _ in range(n)])
+            ids = np.array([i % 7 for i in range(n)])
+            ranks = np.array([max(0, i % 7 - 3) for i in range(n)])
+            counts = overlap_counts(lon, lat, ids, ranks, 300)
+            expected = {}
+            for id in set(ids.tolist()):
+                close = set()
+                for i in np.where(ids == id)[0]:
+                    # tangent plane at each pair
+                    x, y = to_xy(lon[i] - lon, lat[i] - lat, lon0=0, lat0=0)
+                    x *= np.cos(0.5 * (lat[i] + lat) * RADIAN)
+                    close.update(np.where((ranks < ranks[i]) & (np.abs(x) <= 300) & (np.abs(y) <= 300))[0].tolist())
+                for j in close:
+                    key = (id, int(ids[j]))
+                    expected[key] = expected.get(key, 0) + 1
+            self.assertTrue(expected)
+            self.assertEqual(counts, expected)
+
+    def test_grid_rtree(self):
+        # the same counts as SimilarityCalculator._count_overlaps, which uses an rtree.
+        # the rtree's tangent plane is correct only near the equator, so compare there.
+        seed(42)
+        border, activities = 150, []
+        for id in range(1, 9):
+            lon, lat = uniform(0, 0.02), uniform(-0.01, 0.01)
+            points = []
+            for _ in range(40):
+                lon, lat = lon + uniform(-0.002, 0.002), lat + uniform(-0.002, 0.002)
+                points.append((id, lon, lat))
+                if uniform(0, 1) < 0.2:
+                    points.append((id, lon, lat))  # stationary (repeated positions)
+            activities.append(points)
+        activities[0][0] = (1, 0.0, 0.0)  # the rtree's tangent plane
+        old, new = activities[:3], activities[3:]
+        rtree = SQRTree(default_match=MatchType.OVERLAP, default_border=border)
+        for points in old:
+            for id, lon, lat in points:
+                rtree[[(lon, lat)]] = id
+        expected = defaultdict(lambda: 0)
+        for points in new:
+            seen = set()
+            for id, lon, lat in points:
+                for other, other_id in rtree.get_items([(lon, lat)]):
+                    if other not in seen:
+                        expected[(id, other_id)] += 1
+                        seen.add(other)
+            for id, lon, lat in points:
+                rtree[[(lon, lat)]] = id
+        points = [point for points in activities for point in points]
+        rank = dict((points[0][0], i + 1) for i, points in enumerate(new))
+        counts = overlap_counts([lon for _, lon, _ in points], [lat for _, _, lat in points],
+                                np.array([id for id, _, _ in points]),
+                                np.array([rank.get(id, 0) for id, _, _ in points]), 2 * border)
+        self.assertTrue(expected)
+        self.assertEqual(counts, dict(expected))
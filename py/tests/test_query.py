@@ -0,0 +1,28 @@
+
+import numpy as np
+import pandas as pd
+from tests import LogTestCase
+
+from ch2.data.query import pivot, timespan_ids
+
+
+class TestQuery(LogTestCase):
+
+    def test_pivot(self):
+        times = pd.date_range('2020-03-01 10:00', periods=5, freq='s', tz='UTC')
+        df = pivot([('a', times, np.arange(5)),
+                    ('b', times[[1, 3]].to_pydatetime(), np.array([1.5, 2.5])),
+                    ('c', times[[4]], np.array(['x'], dtype=object))])
+        self.assertEqual(list(df.index), list(times))
+        self.assertEqual(df['a'].dtype, np.int64)
+        self.assertTrue(np.array_equal(df['b'].values, [np.nan, 1.5, np.nan, 2.5, np.nan], equal_nan=True))
+        self.assertEqual(df['c'].iloc[4], 'x')
+        self.assertEqual(list(pivot([('a', [], np.array([]))]).columns), ['a'])
+        # a repeated time does not fill every row, so the column is not integer
+        df = pivot([('a', times[:3], np.arange(3.0)), ('b', times[[0, 0, 1]], np.array([7, 8, 9]))])
+        self.assertTrue(np.array_equal(df['b'].values, [8, 9, np.nan], equal_nan=True))
+
+    def test_timespan_ids(self):
+        times = pd.date_range('2020-03-01 10:00', periods=6, freq='s', tz='UTC')
+        ids = timespan_ids(times, [times[0], times[3]], [times[1], times[4]], [7, 8])
+        self.assertTrue(np.array_equal(ids, [7, 7, np.nan, 8, 8, np.nan], equal_nan=True))
@@ -0,0 +1,33 @@
+
+import numpy as np
+import pandas as pd
+from math import log10
+from tests import LogTestCase
+
+from ch2.data.response import sum_to_hour, calc_response, sum_to_hour_from, continue_response
+
+
+class TestResponse(LogTestCase):
+
+    def test_continue(self):
+        # extending from a checkpoint should give the same values as a full calculation
+        index = pd.date_range('2020-01-01 00:00:10', periods=5000, freq='7min', tz='UTC')
+        data = pd.DataFrame({'impulse': np.random.random(5000)}, index=index)
+        full = calc_response(sum_to_hour(data, 'impulse'), (log10(42 * 24), log10(5)))
+        checkpoint = full.index[300]
+        hourly = sum_to_hour_from(data.loc[data.index > checkpoint], 'impulse', checkpoint)
+        extended = continue_response(hourly, 42 * 24, full[checkpoint])
+        self.assertTrue((full.loc[checkpoint:].index == extended.index).all())
+        self.assertTrue(np.allclose(full.loc[checkpoint:], extended))
+
+    def test_continue_on_hour(self):
+        # a value exactly at the checkpoint is in the following hour, so must be included when extending
+        index = pd.date_range('2020-01-01 00:00', periods=5000, freq='10min', tz='UTC')
+        data = pd.DataFrame({'impulse': np.random.random(5000)}, index=index)
+        full = calc_response(sum_to_hour(data, 'impulse'), (log10(42 * 24), log10(5)))
+        checkpoint = full.index[300]
+        self.assertTrue(checkpoint in data.index)
+        hourly = sum_to_hour_from(data, 'impulse', checkpoint)
+        extended = continue_response(hourly, 42 * 24, full[checkpoint])
+        self.assertTrue((full.loc[checkpoint:].index == extended.index).all())
+        self.assertTrue(np.allclose(full.loc[checkpoint:], extended))
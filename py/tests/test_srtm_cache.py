@@ -0,0 +1,56 @@
+
+from os import listdir
+from os.path import join
+from tempfile import TemporaryDirectory
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import numpy as np
+from scipy import __version__ as scipy_version
+from tests import LogTestCase
+
+from ch2.srtm.bilinear import BilinearElevation
+from ch2.srtm.file import SAMPLES, EXTN, CACHE, tile_root, cache_path, use_cached
+from ch2.srtm.spline import SplineElevation
+
+
+class TestSrtmCache(LogTestCase):
+
+    def write_zip(self, dir, flat, flon, height):
+        root = tile_root(flat, flon)
+        data = np.full((SAMPLES, SAMPLES), height, dtype='>i2').tobytes()
+        with ZipFile(join(dir, root + EXTN), 'w', compression=ZIP_DEFLATED) as zip:
+            zip.writestr(root + '.hgt', data)
+
+    def test_cache(self):
+        with TemporaryDirectory() as dir:
+            for flon, height in ((-71, 100), (-70, 200), (-69, 300)):
+                self.write_zip(dir, -34, flon, height)
+            oracle = BilinearElevation(dir, cache_size=2)
+            self.assertAlmostEqual(oracle.elevation(-33.5, -69.5), 200)
+            self.assertTrue(isinstance(oracle._reader(dir, -34, -70).base, np.memmap))
+            self.assertEqual(list(oracle.elevation_many([-33.5, -33.5, -33.5], [-69.5, -68.5, -69.1])),
+                             [200, 300, 200])
+            self.assertEqual(sorted(listdir(join(dir, CACHE))), ['S34W069.hgt', 'S34W070.hgt'])
+            self.assertAlmostEqual(oracle.elevation(-33.5, -70.5), 100)
+            self.assertEqual(sorted(listdir(join(dir, CACHE))), ['S34W069.hgt', 'S34W071.hgt'])
+
+    def test_persist(self):
+        with TemporaryDirectory() as dir:
+            self.write_zip(dir, -34, -71, 100)
+            oracle = SplineElevation(dir, persist=True)
+            self.assertAlmostEqual(oracle.elevation(-33.5, -70.5), 100, places=3)
+            self.assertEqual(sorted(listdir(join(dir, CACHE))), [f'S34W071-0-{scipy_version}.spline', 'S34W071.hgt'])
+            oracle = SplineElevation(dir, persist=True)
+            self.assertAlmostEqual(oracle.elevation(-33.5, -70.5), 100, places=3)
+
+    def test_separate(self):
+        # tiles and splines are counted separately, and missing files are ignored
+        with TemporaryDirectory() as dir:
+            for name in ('a.hgt', 'b.hgt', 'c.spline', 'd.spline', 'e.spline'):
+                with open(cache_path(dir, name), 'w') as output:
+                    output.write(name)
+            self.assertTrue(use_cached(cache_path(dir, 'b.hgt'), 2))
+            self.assertEqual(sorted(listdir(join(dir, CACHE))), ['a.hgt', 'b.hgt', 'c.spline', 'd.spline', 'e.spline'])
+            self.assertTrue(use_cached(cache_path(dir, 'e.spline'), 1))
+            self.assertEqual(sorted(listdir(join(dir, CACHE))), ['a.hgt', 'b.hgt', 'e.spline'])
+            self.assertFalse(use_cached(cache_path(dir, 'f.spline'), 1))
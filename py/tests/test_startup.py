@@ -0,0 +1,47 @@
+from logging import getLogger
+from os import environ, pathsep
+from os.path import dirname, abspath
+from subprocess import run, PIPE
+from sys import executable
+from time import time
+
+from tests import LogTestCase
+
+log = getLogger(__name__)
+
+# the package root, so that ch2 can be imported from a checkout
+ROOT = dirname(dirname(abspath(__file__)))
+
+
+class TestStartup(LogTestCase):
+
+    def time_python(self, code, n=3):
+        best = None
+        env = dict(environ)
+        env['PYTHONPATH'] = pathsep.join(path for path in (ROOT, environ.get('PYTHONPATH')) if path)
+        for _ in range(n):
+            start = time()
+            result = run([executable, '-c', code], stdout=PIPE, check=True, universal_newlines=True, env=env)
+            elapsed = time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result.stdout.strip()
+
+    def test_worker_imports(self):
+        # a worker only needs the pipeline (not the web server, jupyter, etc)
+        elapsed, modules = self.time_python(
+            'import sys; import ch2; import ch2.commands.process; '
+            'print(" ".join(name for name in sys.modules if name.startswith("ch2.")))')
+        log.info(f'Worker imports in {elapsed:.2f}s')
+        for name in 'ch2.commands.web', 'ch2.web.server', 'ch2.jupyter.load', 'ch2.commands.sparkline':
+            self.assertNotIn(name, modules.split())
+
+    def test_profile(self):
+        elapsed, output = self.time_python(
+            'from time import time; from ch2.fit.profile.profile import read_profile; '
+            'start = time(); types, messages = read_profile(); elapsed = time() - start; '
+            'print(elapsed, messages.profile_to_message("record").name, '
+            'types.profile_to_type("carry_exercise_name").profile_to_internal("farmers_walk"))')
+        loaded, record, farmers_walk = output.split()
+        log.info(f'Imported and read profile in {elapsed:.2f}s (read in {float(loaded):.3f}s)')
+        self.assertEqual(record, 'record')
+        self.assertEqual(farmers_walk, '1')